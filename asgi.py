@@ -0,0 +1,7 @@
+import os
+
+from file_upload_endpoint import create_app
+from file_upload_endpoint.asgi import ASGIApplication
+
+# ASGI servers (e.g. `uvicorn asgi:app`) load the application from this module
+app = ASGIApplication(create_app(os.getenv('FLASK_ENV') or 'default'))
@@ -3,7 +3,6 @@ import logging
 from logging import StreamHandler
 # noinspection PyPackageRequirements
 from dotenv import load_dotenv
-from sentry_sdk.integrations.flask import FlaskIntegration
 from str2bool import str2bool
 
 
@@ -18,18 +17,179 @@ class Config(object):
     APP_ENABLE_SENTRY = str2bool(os.environ.get('APP_ENABLE_SENTRY')) or True
     APP_ENABLE_CORS = str2bool(os.environ.get('APP_ENABLE_CORS')) or True
     APP_ENABLE_REQUEST_ID = str2bool(os.environ.get('APP_ENABLE_REQUEST_ID')) or True
+    APP_ENABLE_STREAMING_UPLOADS = str2bool(os.environ.get('APP_ENABLE_STREAMING_UPLOADS', 'true'))
+    APP_ENABLE_MIME_TYPE_SNIFFING = str2bool(os.environ.get('APP_ENABLE_MIME_TYPE_SNIFFING', 'false'))
+    APP_ENABLE_FAST_VALIDATION = str2bool(os.environ.get('APP_ENABLE_FAST_VALIDATION', 'false'))
+    APP_ENABLE_QUEUED_LOGGING = str2bool(os.environ.get('APP_ENABLE_QUEUED_LOGGING', 'true'))
+    APP_ENABLE_LOG_RATE_LIMITS = str2bool(os.environ.get('APP_ENABLE_LOG_RATE_LIMITS', 'true'))
+    APP_ENABLE_METRICS = str2bool(os.environ.get('APP_ENABLE_METRICS', 'false'))
+    APP_ENABLE_SERVER_TIMING = str2bool(os.environ.get('APP_ENABLE_SERVER_TIMING', 'true'))
+    APP_ENABLE_FAST_PREFLIGHT = str2bool(os.environ.get('APP_ENABLE_FAST_PREFLIGHT', 'true'))
+    APP_ENABLE_FAST_CANARY = str2bool(os.environ.get('APP_ENABLE_FAST_CANARY', 'true'))
+    APP_ENABLE_RESUMABLE_UPLOADS = str2bool(os.environ.get('APP_ENABLE_RESUMABLE_UPLOADS', 'true'))
+    APP_ENABLE_ADMISSION_CONTROL = str2bool(os.environ.get('APP_ENABLE_ADMISSION_CONTROL', 'true'))
+    APP_ENABLE_RATE_LIMITS = str2bool(os.environ.get('APP_ENABLE_RATE_LIMITS', 'false'))
 
     LOGGING_LEVEL = logging.WARNING
+    # Format for log records, either 'text' or 'json' (a JSON document per line)
+    LOGGING_FORMAT = os.environ.get('APP_LOGGING_FORMAT', 'text')
+    # Log records are handled in a background thread, with records dropped (or waited on) if the queue is full
+    LOGGING_QUEUE_CONFIG = {
+        'queue_size': int(os.environ.get('APP_LOGGING_QUEUE_SIZE', 10000)),
+        'overflow': os.environ.get('APP_LOGGING_QUEUE_OVERFLOW', 'drop'),
+        'batch_size': 100
+    }
+    # Repeated log records (by message template and route) are limited to a burst, then a steady rate (per second),
+    # with the number of records suppressed logged once per summary interval (in seconds)
+    LOGGING_RATE_LIMIT_CONFIG = {
+        'rate': float(os.environ.get('APP_LOGGING_RATE_LIMIT', 1.0)),
+        'burst': int(os.environ.get('APP_LOGGING_RATE_LIMIT_BURST', 10)),
+        'summary_interval': int(os.environ.get('APP_LOGGING_RATE_LIMIT_SUMMARY_INTERVAL', 60)),
+        'max_level': logging.WARNING
+    }
+
+    # Generator for Request IDs, either 'uuid4' (random) or 'time-ordered' (see `RequestID` middleware)
+    REQUEST_ID_GENERATOR = os.environ.get('APP_REQUEST_ID_GENERATOR', 'uuid4')
 
     MAX_CONTENT_LENGTH = int(os.environ.get('APP_MAX_UPLOAD_BYTES', 10 * 1024 * 1024))  # default: 10MB
+    # Maximum content lengths for specific routes, these must be less than MAX_CONTENT_LENGTH
+    UPLOAD_ROUTE_MAX_CONTENT_LENGTHS = {
+        '/upload-single-restricted-size': 40 * 1024  # 40KB
+    }
+    # MIME types allowed for routes restricting the types of file that can be uploaded
+    UPLOAD_RESTRICTED_MIME_TYPES = frozenset(['image/jpeg'])
+    UPLOAD_STREAM_CHUNK_SIZE = int(os.environ.get('APP_UPLOAD_STREAM_CHUNK_BYTES', 64 * 1024))  # default: 64KB
+    # Limits on the structure of multipart/form-data request bodies, checked as each part is streamed (or by Werkzeug,
+    # where streaming uploads are disabled), which bound the work needed to parse a request regardless of its size: the
+    # number of parts, the size of each part's headers and of each form field (in bytes), and the length of filenames
+    MULTIPART_LIMITS = {
+        'max_parts': int(os.environ.get('APP_MULTIPART_MAX_PARTS', 100)),
+        'max_part_header_size': int(os.environ.get('APP_MULTIPART_MAX_PART_HEADER_BYTES', 16 * 1024)),
+        'max_field_size': int(os.environ.get('APP_MULTIPART_MAX_FIELD_BYTES', 64 * 1024)),
+        'max_filename_length': int(os.environ.get('APP_MULTIPART_MAX_FILENAME_LENGTH', 255))
+    }
+    # Limits for the '/upload-multiple' route, checked as each file is received: the number of files, and the size of
+    # each file and of all files in total (in bytes)
+    UPLOAD_MULTIPLE_LIMITS = {
+        'max_files': int(os.environ.get('APP_UPLOAD_MULTIPLE_MAX_FILES', 20)),
+        'max_file_size': int(os.environ.get('APP_UPLOAD_MULTIPLE_MAX_FILE_BYTES', MAX_CONTENT_LENGTH)),
+        'max_total_size': int(os.environ.get('APP_UPLOAD_MULTIPLE_MAX_TOTAL_BYTES', MAX_CONTENT_LENGTH))
+    }
+    # Uploaded files parsed into `FileStorage` objects (i.e. when streaming uploads are disabled) are held in memory up
+    # to `max_memory_size` bytes each, then spooled to a temporary file in `directory` (e.g. a tmpfs mount, defaulting
+    # to the system temporary directory). Files spooled to disk by all worker processes are limited to `max_disk_size`
+    # bytes in total.
+    UPLOAD_SPOOL_CONFIG = {
+        'max_memory_size': int(os.environ.get('APP_UPLOAD_SPOOL_MAX_MEMORY_BYTES', 500 * 1024)),
+        'directory': os.environ.get('APP_UPLOAD_SPOOL_DIRECTORY'),
+        'max_disk_size': int(os.environ.get('APP_UPLOAD_SPOOL_MAX_DISK_BYTES', 1024 * 1024 * 1024))  # default: 1GB
+    }
 
+    # The Sentry Flask integration is added when Sentry is enabled, so that Sentry is only imported if needed
     SENTRY_CONFIG = {
-        'integrations': [FlaskIntegration()],
         'environment': os.getenv('FLASK_ENV') or 'default'
     }
     if 'APP_RELEASE' in os.environ:
         SENTRY_CONFIG['release'] = os.environ.get('APP_RELEASE')
 
+    # Errors handled by this application are reported to Sentry in aggregate, once per window (in seconds)
+    SENTRY_HANDLED_ERRORS_CONFIG = {
+        'window': int(os.environ.get('APP_SENTRY_HANDLED_ERRORS_WINDOW', 60)),
+        'queue_size': 1000,
+        'sample_rates': {
+            'no_file': 1.0,
+            'no_file_selection': 1.0,
+            'wrong_mime_type': 1.0,
+            'too_large': 1.0
+        }
+    }
+
+    # Request metrics, exposed at '/meta/metrics' (which isn't authenticated, so should only be enabled where access to
+    # this route is restricted, e.g. by a router or firewall). To include metrics from all worker processes, set a
+    # directory shared by all workers, which metrics are written to once per interval (in seconds).
+    METRICS_CONFIG = {
+        'buckets': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+        'directory': os.environ.get('APP_METRICS_DIRECTORY'),
+        'interval': 10
+    }
+
+    # Request phase timings, returned in a 'Server-Timing' header and logged (for requests with a body) at this level
+    SERVER_TIMING_CONFIG = {
+        'log_level': getattr(logging, os.environ.get('APP_SERVER_TIMING_LOG_LEVEL', 'DEBUG').upper())
+    }
+
+    # Production web server (Waitress) options, used by the `serve` Flask CLI command. Workers are separate processes
+    # (defaulting to Heroku's `WEB_CONCURRENCY` setting), each with a number of threads. Request bodies larger than
+    # `inbuf_overflow` bytes are buffered to temporary files.
+    SERVER_CONFIG = {
+        'workers': int(os.environ.get('APP_SERVER_WORKERS', os.environ.get('WEB_CONCURRENCY', 1))),
+        'reuse_port': str2bool(os.environ.get('APP_SERVER_REUSE_PORT', 'true')),
+        'threads': int(os.environ.get('APP_SERVER_THREADS', 8)),
+        'backlog': int(os.environ.get('APP_SERVER_BACKLOG', 2048)),
+        'recv_bytes': int(os.environ.get('APP_SERVER_RECV_BYTES', 64 * 1024)),
+        'inbuf_overflow': int(os.environ.get('APP_SERVER_INBUF_OVERFLOW', 1024 * 1024)),
+        'connection_limit': int(os.environ.get('APP_SERVER_CONNECTION_LIMIT', 500)),
+        # poll() isn't limited to 1024 file descriptors, unlike select()
+        'asyncore_use_poll': True
+    }
+
+    # Resumable uploads are limited to `max_length` bytes, with up to `max_uploads` in progress, each kept for `ttl`
+    # seconds after it was last continued. Progress is stored in memory for each process, or in shared memory for all
+    # worker processes (the default when using multiple workers).
+    RESUMABLE_UPLOADS_CONFIG = {
+        'store': os.environ.get(
+            'APP_RESUMABLE_UPLOADS_STORE',
+            'shared' if SERVER_CONFIG['workers'] > 1 else 'memory'
+        ),
+        'max_uploads': int(os.environ.get('APP_RESUMABLE_UPLOADS_MAX_UPLOADS', 1024)),
+        'ttl': int(os.environ.get('APP_RESUMABLE_UPLOADS_TTL', 3600)),
+        'max_length': int(os.environ.get('APP_RESUMABLE_UPLOADS_MAX_LENGTH', 10 * 1024 * 1024 * 1024))
+    }
+
+    # The readiness health check fails when all threads are busy, or request bodies being handled or queued exceed
+    # `max_inflight_bytes`, or more than `max_queue_depth` requests are waiting for a thread
+    HEALTH_CHECKS_CONFIG = {
+        'max_inflight_bytes': int(os.environ.get('APP_READINESS_MAX_INFLIGHT_BYTES', 256 * 1024 * 1024)),
+        'max_queue_depth': int(os.environ.get('APP_READINESS_MAX_QUEUE_DEPTH', 16))
+    }
+
+    # Uploads are refused (with a 'Retry-After' header) when `max_uploads` are being handled, or request bodies being
+    # handled or queued would exceed `max_inflight_bytes`. By default, one server thread is kept free for other requests
+    # (e.g. health checks). Requests to meta routes are never refused.
+    ADMISSION_CONTROL_CONFIG = {
+        'max_uploads': int(os.environ.get('APP_ADMISSION_MAX_UPLOADS', max(SERVER_CONFIG['threads'] - 1, 1))),
+        'max_inflight_bytes': int(os.environ.get('APP_ADMISSION_MAX_INFLIGHT_BYTES', 512 * 1024 * 1024)),
+        'exempt_paths': ('/meta/',),
+        'max_retry_after': int(os.environ.get('APP_ADMISSION_MAX_RETRY_AFTER', 60))
+    }
+
+    # Requests are limited for each client, identified by their IP address ('client-ip'), by a budget (rate per second,
+    # burst) for each path prefix. Behind proxies (e.g. the Heroku router), `trusted_proxies` must be set so client IPs
+    # are read from 'X-Forwarded-For', otherwise all clients share one budget, so rate limits are disabled by default.
+    # Buckets are shared between worker processes in a table of `slots`.
+    RATE_LIMITS_CONFIG = {
+        'key': os.environ.get('APP_RATE_LIMITS_KEY', 'client-ip'),
+        'trusted_proxies': int(os.environ.get('APP_RATE_LIMITS_TRUSTED_PROXIES', 0)),
+        'slots': 65536,
+        'budgets': {
+            '/upload-': (
+                float(os.environ.get('APP_RATE_LIMITS_UPLOAD_RATE', 5)),
+                int(os.environ.get('APP_RATE_LIMITS_UPLOAD_BURST', 50))
+            ),
+            # resumable uploads are sent in multiple requests
+            '/uploads': (
+                float(os.environ.get('APP_RATE_LIMITS_RESUMABLE_UPLOAD_RATE', 20)),
+                int(os.environ.get('APP_RATE_LIMITS_RESUMABLE_UPLOAD_BURST', 200))
+            ),
+            '/meta/': (
+                float(os.environ.get('APP_RATE_LIMITS_META_RATE', 10)),
+                int(os.environ.get('APP_RATE_LIMITS_META_BURST', 100))
+            )
+        },
+        'exempt_paths': ('/meta/health/',)
+    }
+
+    # Browsers may cache preflight responses for `max_age` seconds (Chrome limits this to 2 hours, Firefox to 1 day)
     CORS_CONFIG = {
         'origins': [
             'http://localhost:9000',
@@ -39,13 +199,23 @@ class Config(object):
         ],
         'methods': [
             'OPTIONS',
+            'HEAD',
             'GET',
-            'POST'
+            'POST',
+            'PATCH',
+            'DELETE'
         ],
         'allowed_headers': [
             'cache-control',
             'x-requested-with'
-        ]
+        ],
+        'expose_headers': [
+            'location',
+            'upload-offset',
+            'upload-length',
+            'upload-checksum'
+        ],
+        'max_age': int(os.environ.get('APP_CORS_MAX_AGE', 7200))
     }
 
     @staticmethod
@@ -62,6 +232,10 @@ class TestConfig(Config):
     DEBUG = True
     TESTING = True
     APP_ENABLE_SENTRY = str2bool(os.environ.get('APP_ENABLE_SENTRY')) or False
+    # the canary health check is used as a stable endpoint in tests, so is handled by the application
+    APP_ENABLE_FAST_CANARY = str2bool(os.environ.get('APP_ENABLE_FAST_CANARY', 'false'))
+    APP_ENABLE_METRICS = str2bool(os.environ.get('APP_ENABLE_METRICS', 'true'))
+    APP_ENABLE_RATE_LIMITS = str2bool(os.environ.get('APP_ENABLE_RATE_LIMITS', 'true'))
 
     LOGGING_LEVEL = logging.DEBUG
 
@@ -1,17 +1,23 @@
-import logging
-
-import sentry_sdk
-
-from flask import Flask, request, has_request_context
+from flask import Flask
 from flask.logging import default_handler
-from flask_cors import CORS
 
 from config import config
+from file_upload_endpoint.logs import BatchStreamHandler, JSONFormatter, LogRateLimiter, QueuedLogging, \
+    RequestFormatter
 from file_upload_endpoint.meta import meta as meta_blueprint
 from file_upload_endpoint.main import main as main_blueprint
 from file_upload_endpoint.meta.errors import error_handler_generic_bad_request, error_handler_generic_not_found, \
-    error_handler_request_entity_too_large, error_handler_generic_internal_server_error
-from file_upload_endpoint.middleware.request_id import RequestID
+    error_handler_request_entity_too_large, error_handler_generic_internal_server_error, register_error_templates
+from file_upload_endpoint.meta.responses import ResponseTemplates
+from file_upload_endpoint.metrics import Metrics
+from file_upload_endpoint.middleware.admission import AdmissionControl
+from file_upload_endpoint.middleware.cors import CORSPreflight
+from file_upload_endpoint.middleware.health import HealthChecks
+from file_upload_endpoint.middleware.rate_limit import RateLimit
+from file_upload_endpoint.middleware.request_id import REQUEST_ID_GENERATORS, RequestID
+from file_upload_endpoint.reporting import HandledErrorReporter
+from file_upload_endpoint.resumable import resumable as resumable_blueprint
+from file_upload_endpoint.timings import ServerTiming
 
 
 def create_app(config_name):
@@ -22,30 +28,79 @@ def create_app(config_name):
     config[config_name].init_app(app)
 
     # Middleware / Wrappers
+    # Optional dependencies (Sentry, CORS) are only imported when their feature is enabled, to reduce start up time
+    if app.config['APP_ENABLE_SERVER_TIMING']:
+        # Created first, so that timings include other middleware responding to requests
+        ServerTiming(app, **app.config['SERVER_TIMING_CONFIG'])
     if app.config['APP_ENABLE_SENTRY']:
-        sentry_sdk.init(**app.config['SENTRY_CONFIG'])
+        import sentry_sdk
+        from sentry_sdk.integrations.flask import FlaskIntegration
+
+        sentry_sdk.init(integrations=[FlaskIntegration()], **app.config['SENTRY_CONFIG'])
+        HandledErrorReporter(app, **app.config['SENTRY_HANDLED_ERRORS_CONFIG'])
     if app.config['APP_ENABLE_CORS']:
+        from flask_cors import CORS
+
         CORS(app, **app.config['CORS_CONFIG'])
+    if app.config['APP_ENABLE_CORS'] and app.config['APP_ENABLE_FAST_PREFLIGHT']:
+        # Wraps the WSGI application after other middleware, so preflight requests are answered before reaching them
+        CORSPreflight(
+            app,
+            origins=app.config['CORS_CONFIG']['origins'],
+            methods=app.config['CORS_CONFIG']['methods'],
+            max_age=app.config['CORS_CONFIG'].get('max_age')
+        )
+    if app.config['APP_ENABLE_ADMISSION_CONTROL']:
+        # Wraps the WSGI application after other middleware, so refused uploads are answered before reaching them
+        AdmissionControl(
+            app,
+            origins=app.config['CORS_CONFIG']['origins'] if app.config['APP_ENABLE_CORS'] else (),
+            **app.config['ADMISSION_CONTROL_CONFIG']
+        )
+    if app.config['APP_ENABLE_RATE_LIMITS']:
+        # Wraps the WSGI application after admission control, so limited requests aren't counted as uploads in progress
+        RateLimit(
+            app,
+            origins=app.config['CORS_CONFIG']['origins'] if app.config['APP_ENABLE_CORS'] else (),
+            **app.config['RATE_LIMITS_CONFIG']
+        )
+    # Wraps the WSGI application after other middleware, so health checks are answered before reaching them
+    HealthChecks(app, fast_canary=app.config['APP_ENABLE_FAST_CANARY'], **app.config['HEALTH_CHECKS_CONFIG'])
     if app.config['APP_ENABLE_REQUEST_ID']:
-        RequestID(app)
+        # Wraps the WSGI application outside of all other middleware, so every response includes a Request ID
+        RequestID(app, generator=REQUEST_ID_GENERATORS[app.config['REQUEST_ID_GENERATOR']]())
+    if app.config['APP_ENABLE_METRICS']:
+        Metrics(app, **app.config['METRICS_CONFIG'])
 
     # Logging
-    class RequestFormatter(logging.Formatter):
-        def format(self, record):
-            record.url = 'NA'
-            record.request_id = 'NA'
-
-            if has_request_context():
-                record.url = request.url
-                if app.config['APP_ENABLE_REQUEST_ID']:
-                    record.request_id = request.environ.get("HTTP_X_REQUEST_ID")
-
-            return super().format(record)
-    formatter = RequestFormatter(
-        '[%(asctime)s] [%(levelname)s] [%(request_id)s] [%(url)s] %(module)s: %(message)s'
-    )
-    default_handler.setFormatter(formatter)
-    default_handler.setLevel(app.config['LOGGING_LEVEL'])
+    if app.config['LOGGING_FORMAT'] == 'json':
+        formatter = JSONFormatter(request_ids=app.config['APP_ENABLE_REQUEST_ID'])
+    else:
+        formatter = RequestFormatter(
+            '[%(asctime)s] [%(levelname)s] [%(request_id)s] [%(url)s] %(module)s: %(message)s',
+            request_ids=app.config['APP_ENABLE_REQUEST_ID']
+        )
+    if app.config['APP_ENABLE_QUEUED_LOGGING']:
+        # Log records are written to stderr in batches, behind a queue, rather than by Flask's default handler
+        app.logger.removeHandler(default_handler)
+        stream_handler = BatchStreamHandler(batch_size=app.config['LOGGING_QUEUE_CONFIG']['batch_size'])
+        stream_handler.setFormatter(formatter)
+        stream_handler.setLevel(app.config['LOGGING_LEVEL'])
+        QueuedLogging(
+            app,
+            handlers=[stream_handler],
+            queue_size=app.config['LOGGING_QUEUE_CONFIG']['queue_size'],
+            overflow=app.config['LOGGING_QUEUE_CONFIG']['overflow']
+        )
+    else:
+        default_handler.setFormatter(formatter)
+        default_handler.setLevel(app.config['LOGGING_LEVEL'])
+    if app.config['APP_ENABLE_LOG_RATE_LIMITS']:
+        LogRateLimiter(app, **app.config['LOGGING_RATE_LIMIT_CONFIG'])
+
+    # Responses
+    templates = ResponseTemplates(app)
+    register_error_templates(templates)
 
     # Error handlers
     app.register_error_handler(400, error_handler_generic_bad_request)
@@ -56,5 +111,7 @@ def create_app(config_name):
     # App
     app.register_blueprint(meta_blueprint)
     app.register_blueprint(main_blueprint)
+    if app.config['APP_ENABLE_RESUMABLE_UPLOADS']:
+        app.register_blueprint(resumable_blueprint)
 
     return app
@@ -0,0 +1,216 @@
+import asyncio
+import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from flask import Flask as App
+
+from file_upload_endpoint.main.spooling import SPOOL_FULL_ENVIRON_KEY, UploadSpoolFullError
+from file_upload_endpoint.middleware.health import get_content_length
+from file_upload_endpoint.timings import RECEIVE_ENVIRON_KEY
+
+# Extensions which refuse requests in WSGI middleware, asked whether to accept a request before its body is received (in
+# the order their middleware is called)
+ADMISSION_EXTENSIONS = ('rate_limit', 'admission_control')
+
+
+class ASGIApplication(object):
+    """
+    ASGI application, serving the (WSGI) Flask application on an event loop
+
+    Request bodies are received incrementally on the event loop, as they arrive, and spooled using the application's
+    `UploadSpool` extension (in memory, or to a temporary file for bodies larger than its maximum memory size, counted
+    against its budget for files spooled to disk). Writing to a temporary file blocks, so is done in the thread pool,
+    rather than stalling the event loop. If the budget would be exceeded, the rest of the request body isn't received
+    and the application answers the request with an error. Only once a request body has been received is the request
+    dispatched to the Flask application, in a thread pool. This means slow uploads don't hold a thread while they are
+    sent, so many concurrent uploads can be handled in one process. If the client disconnects before its request body
+    has been received, the request is abandoned without being dispatched.
+
+    As requests are handled by the same Flask application, responses and errors are the same as when it is served
+    using WSGI.
+
+    To limit the amount of a request body received, at most one byte more than the maximum content length for a route
+    is received. The application then rejects the request as too large, as it would were the whole body available.
+    Requests with a declared content length greater than the maximum content length are dispatched without receiving
+    their body, as they are rejected by the application based on their headers. Similarly, extensions refusing requests
+    in middleware (e.g. `RateLimit` and `AdmissionControl`) decide whether to accept a request before its body is
+    received, so that refused requests are dispatched, and answered by the middleware, without receiving their body.
+
+    To use: `uvicorn asgi:app`
+    """
+
+    def __init__(self, app: App, max_workers: Optional[int] = None):
+        self.app = app
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='asgi')
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f"ASGI scope type [{ scope['type'] }] is not supported")
+
+        environ = self.get_environ(scope)
+        loop = asyncio.get_running_loop()
+        environ['wsgi.input'] = self.app.extensions['upload_spool'].create_file()
+        try:
+            if self.admit(environ) and not await self._receive_body(environ, receive):
+                # the client disconnected, so a truncated request body isn't passed to the application
+                admission_control = self.app.extensions.get('admission_control')
+                if admission_control is not None:
+                    admission_control.release(environ)
+                return
+            status, headers, body = await loop.run_in_executor(self.executor, self._run_wsgi_app, environ)
+        finally:
+            environ['wsgi.input'].close()
+
+        await send({
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    def get_environ(scope: dict) -> dict:
+        """
+        Creates a WSGI environment for an ASGI HTTP connection scope, without a request body (input)
+
+        :type scope: dict
+        :param scope: ASGI connection scope
+
+        :rtype: dict
+        :return: WSGI environment
+        """
+        server = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{ scope.get('http_version', '1.1') }",
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+            # The request body is complete (or truncated at the maximum content length) when passed to the application
+            'wsgi.input_terminated': True
+        }
+        if scope.get('client'):
+            environ['REMOTE_ADDR'] = scope['client'][0]
+            environ['REMOTE_PORT'] = str(scope['client'][1])
+
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = f"HTTP_{ name }"
+            value = value.decode('latin-1')
+            # repeated headers are combined as per RFC 2616
+            environ[name] = f"{ environ[name] },{ value }" if name in environ else value
+
+        return environ
+
+    def admit(self, environ: dict) -> bool:
+        """
+        Decides whether to accept a request from its headers, before its body is received
+
+        Each of the `ADMISSION_EXTENSIONS` used by the application is asked in turn. Their decisions are kept in the
+        WSGI environment, for their middleware to answer refused requests.
+
+        :type environ: dict
+        :param environ: WSGI environment
+
+        :rtype: bool
+        :return: whether the request is accepted
+        """
+        for name in ADMISSION_EXTENSIONS:
+            extension = self.app.extensions.get(name)
+            if extension is not None and not extension.admit(environ):
+                return False
+        return True
+
+    def get_body_limit(self, environ: dict) -> Optional[int]:
+        """
+        Gets the amount of a request body to receive, or None if the body doesn't need to be received
+
+        :type environ: dict
+        :param environ: WSGI environment
+
+        :rtype: Optional[int]
+        :return: maximum number of bytes to receive
+        """
+        limit = self.app.config['MAX_CONTENT_LENGTH']
+        if get_content_length(environ) > limit:
+            return None
+
+        limit = self.app.config['UPLOAD_ROUTE_MAX_CONTENT_LENGTHS'].get(environ['PATH_INFO'], limit)
+        return limit + 1
+
+    async def _receive_body(self, environ: dict, receive: Callable) -> bool:
+        body = environ['wsgi.input']
+        loop = asyncio.get_running_loop()
+        limit = self.get_body_limit(environ)
+
+        started_at = time.perf_counter()
+        received = 0
+        more_body = limit is not None
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return False
+
+            chunk = message.get('body', b'')
+            if received + len(chunk) > limit:
+                chunk = chunk[:limit - received]
+            try:
+                if received + len(chunk) > body.spool.max_memory_size:
+                    # rolling over to, or writing to, a temporary file
+                    await loop.run_in_executor(self.executor, body.write, chunk)
+                else:
+                    body.write(chunk)
+            except UploadSpoolFullError as e:
+                # the rest of the request body isn't received, the application answers with an error instead
+                environ[SPOOL_FULL_ENVIRON_KEY] = e.max_disk_size
+                break
+            received += len(chunk)
+            more_body = message.get('more_body', False) and received < limit
+
+        # the time taken to receive the body is included in request timings, as the application can't measure it
+        environ[RECEIVE_ENVIRON_KEY] = (time.perf_counter() - started_at, received)
+        body.seek(0)
+        return True
+
+    def _run_wsgi_app(self, environ: dict) -> Tuple[str, List[Tuple[str, str]], bytes]:
+        response = {}
+        body: List[bytes] = []
+
+        def start_response(status, response_headers, exc_info=None):
+            response['status'] = status
+            response['headers'] = response_headers
+            return body.append
+
+        iterable = self.app(environ, start_response)
+        try:
+            body.extend(iterable)
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+        return response['status'], response['headers'], b''.join(body)
+
+    async def _lifespan(self, receive: Callable, send: Callable) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
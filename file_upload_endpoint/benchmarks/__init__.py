@@ -0,0 +1,35 @@
+import timeit
+
+from typing import Callable
+
+# Load benchmark scenarios (see `load`), defined here so they can be listed without importing the load benchmark
+SCENARIOS = [
+    'canary',
+    'preflight',
+    'upload-single',
+    'upload-multiple',
+    'upload-single-restricted-size',
+    'upload-single-restricted-mime-types'
+]
+
+
+def time_function(function: Callable, number: int = 10000, repeat: int = 5) -> float:
+    """
+    Times how long a function takes to run
+
+    The function is ran a number of times, repeated several times, with the fastest run used to reduce noise from other
+    processes.
+
+    :type function: Callable
+    :param function: function to time, called without arguments
+
+    :type number: int
+    :param number: number of times to call the function in each run
+
+    :type repeat: int
+    :param repeat: number of runs
+
+    :rtype: float
+    :return: time per call (in microseconds)
+    """
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number * 1000000
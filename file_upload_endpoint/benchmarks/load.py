@@ -0,0 +1,429 @@
+import os
+import platform
+import socket
+import subprocess  # nosec
+import sys
+import threading
+import time
+
+from datetime import datetime, timezone
+from http.client import HTTPConnection
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flask import Flask as App
+
+from file_upload_endpoint.benchmarks import SCENARIOS
+# Origin used for CORS preflight requests, this must be an allowed origin
+PREFLIGHT_ORIGIN = 'https://style-kit.web.bas.ac.uk'
+
+JPEG_SIGNATURE = b'\xff\xd8\xff\xe0\x00\x10JFIF\x00'
+
+
+class Scenario(object):
+    """
+    A request made repeatedly during a load benchmark
+
+    :type name: str
+    :param name: name of the scenario
+
+    :type method: str
+    :param method: HTTP method
+
+    :type path: str
+    :param path: request path
+
+    :type headers: dict
+    :param headers: request headers
+
+    :type body: bytes
+    :param body: request body
+
+    :type expected_statuses: tuple
+    :param expected_statuses: HTTP status codes considered successful
+    """
+
+    def __init__(
+        self,
+        name: str,
+        method: str,
+        path: str,
+        headers: Optional[dict] = None,
+        body: bytes = b'',
+        expected_statuses: tuple = (200, 204)
+    ):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.headers = headers or {}
+        self.body = body
+        self.expected_statuses = expected_statuses
+
+
+def multipart_body(files: List[Tuple[str, str, str, bytes]], boundary: str = 'bench-boundary') -> Tuple[str, bytes]:
+    """
+    Encodes files as a multipart/form-data request body
+
+    :type files: list
+    :param files: field name, file name, content type and content of each file
+
+    :type boundary: str
+    :param boundary: multipart boundary
+
+    :rtype: tuple
+    :return: content type header value, request body
+    """
+    parts = []
+    for field, filename, content_type, content in files:
+        parts.append(
+            f"--{ boundary }\r\nContent-Disposition: form-data; name=\"{ field }\"; filename=\"{ filename }\"\r\n"
+            f"Content-Type: { content_type }\r\n\r\n".encode() + content + b'\r\n'
+        )
+    parts.append(f"--{ boundary }--\r\n".encode())
+    return f"multipart/form-data; boundary={ boundary }", b''.join(parts)
+
+
+def get_scenarios(app: App, names: List[str], payload_size: int, file_count: int) -> List[Scenario]:
+    """
+    Creates scenarios for a load benchmark
+
+    Payloads for the restricted size route are capped below the route's limit, so requests are accepted.
+
+    :type app: App
+    :param app: Flask application, used for upload limits
+
+    :type names: list
+    :param names: names of scenarios to create
+
+    :type payload_size: int
+    :param payload_size: size of each uploaded file (in bytes)
+
+    :type file_count: int
+    :param file_count: number of files uploaded to the upload multiple route
+
+    :rtype: list
+    :return: scenarios
+    """
+    payload = b'x' * payload_size
+    restricted_size = min(payload_size, app.config['UPLOAD_ROUTE_MAX_CONTENT_LENGTHS'][
+        '/upload-single-restricted-size'
+    ] // 2)
+
+    factories = {
+        'canary': lambda: Scenario('canary', 'GET', '/meta/health/canary'),
+        'preflight': lambda: Scenario('preflight', 'OPTIONS', '/upload-single', headers={
+            'Origin': PREFLIGHT_ORIGIN,
+            'Access-Control-Request-Method': 'POST'
+        }),
+        'upload-single': lambda: _upload_scenario('upload-single', '/upload-single', [
+            ('file', 'bench.bin', 'application/octet-stream', payload)
+        ]),
+        'upload-multiple': lambda: _upload_scenario('upload-multiple', '/upload-multiple', [
+            ('files[]', f"bench-{ i }.bin", 'application/octet-stream', payload) for i in range(file_count)
+        ]),
+        'upload-single-restricted-size': lambda: _upload_scenario(
+            'upload-single-restricted-size',
+            '/upload-single-restricted-size',
+            [('file', 'bench.bin', 'application/octet-stream', payload[:restricted_size])]
+        ),
+        'upload-single-restricted-mime-types': lambda: _upload_scenario(
+            'upload-single-restricted-mime-types',
+            '/upload-single-restricted-mime-types',
+            [('file', 'bench.jpg', 'image/jpeg', JPEG_SIGNATURE + payload[len(JPEG_SIGNATURE):])]
+        )
+    }
+
+    return [factories[name]() for name in names]
+
+
+def _upload_scenario(name: str, path: str, files: List[Tuple[str, str, str, bytes]]) -> Scenario:
+    content_type, body = multipart_body(files)
+    return Scenario(name, 'POST', path, headers={'Content-Type': content_type}, body=body)
+
+
+def percentile(values: List[float], percent: float) -> Optional[float]:
+    """
+    Gets a percentile of a list of values, using the nearest rank method
+
+    :type values: list
+    :param values: values, sorted in ascending order
+
+    :type percent: float
+    :param percent: percentile (0-100)
+
+    :rtype: Optional[float]
+    :return: value at percentile, or None if there are no values
+    """
+    if not values:
+        return None
+    rank = max(1, int(-(-percent * len(values) // 100)))
+    return values[rank - 1]
+
+
+def get_peak_rss(pid: int) -> Optional[int]:
+    """
+    Gets the peak resident set size of a process, where supported (Linux)
+
+    :type pid: int
+    :param pid: process ID
+
+    :rtype: Optional[int]
+    :return: peak resident set size (in bytes), or None if not available
+    """
+    try:
+        with open(f"/proc/{ pid }/status") as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def run_scenario(host: str, port: int, scenario: Scenario, requests: int, concurrency: int) -> dict:
+    """
+    Makes requests for a scenario, using a number of concurrent clients, each with a persistent connection
+
+    :type host: str
+    :param host: server host
+
+    :type port: int
+    :param port: server port
+
+    :type scenario: Scenario
+    :param scenario: scenario to run
+
+    :type requests: int
+    :param requests: total number of requests
+
+    :type concurrency: int
+    :param concurrency: number of concurrent clients
+
+    :rtype: dict
+    :return: results for scenario
+    """
+    latencies = []  # type: List[float]
+    statuses: Dict[str, int] = {}
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+
+    def client():
+        connection = HTTPConnection(host, port, timeout=30)
+        client_latencies = []
+        client_statuses = {}
+        while next(remaining, None) is not None:
+            started_at = time.perf_counter()
+            try:
+                connection.request(scenario.method, scenario.path, body=scenario.body, headers=scenario.headers)
+                response = connection.getresponse()
+                response.read()
+                status = str(response.status)
+                if response.getheader('Connection', '').lower() == 'close':
+                    connection.close()
+            except (OSError, ValueError) as e:
+                status = type(e).__name__
+                connection.close()
+            client_latencies.append(time.perf_counter() - started_at)
+            client_statuses[status] = client_statuses.get(status, 0) + 1
+        connection.close()
+
+        with lock:
+            latencies.extend(client_latencies)
+            for status, count in client_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    clients = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    started_at = time.perf_counter()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - started_at
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if status not in map(str, scenario.expected_statuses))
+    return {
+        'scenario': scenario.name,
+        'method': scenario.method,
+        'path': scenario.path,
+        'request_body_bytes': len(scenario.body),
+        'requests': len(latencies),
+        'concurrency': concurrency,
+        'seconds': elapsed,
+        'requests_per_second': len(latencies) / elapsed if elapsed else None,
+        'latency_ms': {
+            name: (value * 1000 if value is not None else None) for name, value in [
+                ('p50', percentile(latencies, 50)),
+                ('p95', percentile(latencies, 95)),
+                ('p99', percentile(latencies, 99)),
+                ('max', latencies[-1] if latencies else None)
+            ]
+        },
+        'statuses': statuses,
+        'error_rate': errors / len(latencies) if latencies else None
+    }
+
+
+def get_free_port(host: str) -> int:
+    """
+    Gets a port which is currently free on a host
+
+    :type host: str
+    :param host: host (interface) to check
+
+    :rtype: int
+    :return: port number
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def start_server(host: str, port: int, command: List[str], timeout: float = 30) -> subprocess.Popen:
+    """
+    Starts the application server in a separate process and waits for it to be ready
+
+    :type host: str
+    :param host: host the server listens on
+
+    :type port: int
+    :param port: port the server listens on
+
+    :type command: list
+    :param command: command to start the server
+
+    :type timeout: float
+    :param timeout: time to wait for the server to be ready (in seconds)
+
+    :rtype: subprocess.Popen
+    :return: server process
+    """
+    # The Flask CLI needs to know where the application is, if not already set
+    environment = dict(os.environ)
+    environment.setdefault('FLASK_APP', 'manage.py')
+    # requests are made from a single client, much faster than rate limits allow
+    environment.setdefault('APP_ENABLE_RATE_LIMITS', 'false')
+    server = subprocess.Popen(  # nosec
+        command,
+        env=environment,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code { server.returncode }")
+        try:
+            connection = HTTPConnection(host, port, timeout=1)
+            connection.request('GET', '/meta/health/canary')
+            connection.getresponse().read()
+            connection.close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+
+    server.terminate()
+    raise RuntimeError(f"Server not ready after { timeout } seconds")
+
+
+def get_commit() -> Optional[str]:
+    """
+    Gets the current Git commit of the application, if available
+
+    :rtype: Optional[str]
+    :return: commit hash
+    """
+    try:
+        return subprocess.check_output(  # nosec
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_load(
+    app: App,
+    scenarios: Optional[List[str]] = None,
+    requests: int = 1000,
+    concurrency: int = 10,
+    payload_size: int = 64 * 1024,
+    file_count: int = 3,
+    host: str = '127.0.0.1',
+    port: Optional[int] = None,
+    server_command: Optional[List[str]] = None,
+    progress: Optional[Callable[[dict], None]] = None
+) -> dict:
+    """
+    Benchmarks the application end-to-end, over HTTP, using the production server
+
+    The server is started in a separate process (using the `serve` Flask CLI command by default), so its resident
+    set size can be measured separately to the clients making requests.
+
+    :type app: App
+    :param app: Flask application, used for configuration
+
+    :type scenarios: list
+    :param scenarios: names of scenarios to run, defaults to all scenarios
+
+    :type requests: int
+    :param requests: number of requests for each scenario
+
+    :type concurrency: int
+    :param concurrency: number of concurrent clients
+
+    :type payload_size: int
+    :param payload_size: size of each uploaded file (in bytes)
+
+    :type file_count: int
+    :param file_count: number of files uploaded to the upload multiple route
+
+    :type host: str
+    :param host: interface to run the server on
+
+    :type port: int
+    :param port: port to run the server on, defaults to a free port
+
+    :type server_command: list
+    :param server_command: command to start the server, '{host}' and '{port}' are substituted
+
+    :type progress: Callable
+    :param progress: called with the results of each scenario as it completes
+
+    :rtype: dict
+    :return: benchmark results
+    """
+    port = port or get_free_port(host)
+    command = server_command or [sys.executable, '-m', 'flask', 'serve', '--host', '{host}', '--port', '{port}']
+    command = [part.format(host=host, port=port) for part in command]
+
+    results = {
+        'time': datetime.now(tz=timezone.utc).isoformat(),
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'server_command': command,
+        'options': {
+            'requests': requests,
+            'concurrency': concurrency,
+            'payload_size': payload_size,
+            'file_count': file_count
+        },
+        'scenarios': [],
+        'server_peak_rss_bytes': None
+    }
+
+    server = start_server(host, port, command)
+    try:
+        for scenario in get_scenarios(app, scenarios or SCENARIOS, payload_size, file_count):
+            result = run_scenario(host, port, scenario, requests, concurrency)
+            results['scenarios'].append(result)
+            if progress is not None:
+                progress(result)
+        results['server_peak_rss_bytes'] = get_peak_rss(server.pid)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    return results
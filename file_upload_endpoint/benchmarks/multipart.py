@@ -0,0 +1,94 @@
+from io import BytesIO
+
+from file_upload_endpoint.benchmarks import time_function
+from file_upload_endpoint.main.multipart import MultipartLimitError, MultipartReader
+
+BOUNDARY = b'----benchmark-boundary'
+
+
+def _part(headers: bytes, content: bytes) -> bytes:
+    return b'--' + BOUNDARY + b'\r\n' + headers + b'\r\n\r\n' + content + b'\r\n'
+
+
+def _repeat_parts(part: bytes, size: int) -> bytes:
+    return part * max(size // len(part), 1) + b'--' + BOUNDARY + b'--\r\n'
+
+
+def make_bodies(size: int) -> dict:
+    """
+    Creates multipart/form-data request bodies of roughly the same size, shaped to be cheap or expensive to parse
+
+    :type size: int
+    :param size: approximate size of each body (in bytes)
+
+    :rtype: dict
+    :return: request bodies, keyed by name
+    """
+    return {
+        # baseline, a single file is the cheapest body to parse per byte
+        'single-file': _repeat_parts(
+            _part(b'Content-Disposition: form-data; name="file"; filename="foo.bin"', b'x' * size),
+            size
+        ),
+        'tiny-parts': _repeat_parts(_part(b'Content-Disposition: form-data; name="f"', b'x'), size),
+        'large-headers': _repeat_parts(
+            _part(b'Content-Disposition: form-data; name="f"' + b'\r\nX-Padding: ' * 1000 + b'x', b'x'),
+            size
+        ),
+        'large-field': _repeat_parts(_part(b'Content-Disposition: form-data; name="f"', b'x' * size), size),
+        'long-filenames': _repeat_parts(
+            _part(b'Content-Disposition: form-data; name="files[]"; filename="' + b'x' * 4096 + b'"', b'x'),
+            size
+        )
+    }
+
+
+def _parse(body: bytes, chunk_size: int, limits: dict) -> MultipartReader:
+    reader = MultipartReader(BytesIO(body), BOUNDARY, chunk_size=chunk_size, **limits)
+    try:
+        for _part in reader:
+            pass
+    except MultipartLimitError:
+        pass
+    return reader
+
+
+def benchmark_multipart(limits: dict, size: int = 1024 * 1024, chunk_size: int = 64 * 1024, number: int = 5) -> list:
+    """
+    Benchmarks the cost of parsing adversarial multipart/form-data request bodies, with and without limits
+
+    Each body is parsed (with parts drained, as in upload routes) using the given limits and without them. Limits are
+    effective if the time taken to parse each body with them is bounded, regardless of the body's size or shape.
+
+    :type limits: dict
+    :param limits: multipart parser limits (see the `MULTIPART_LIMITS` config option)
+
+    :type size: int
+    :param size: approximate size of each body (in bytes)
+
+    :type chunk_size: int
+    :param chunk_size: number of bytes read from each body at a time
+
+    :type number: int
+    :param number: number of times each body is parsed per run
+
+    :rtype: list
+    :return: results for each body, with and without limits
+    """
+    unlimited = {'max_part_header_size': size}
+
+    results = []
+    for name, body in make_bodies(size).items():
+        for limits_name, parser_limits in [('limits', limits), ('no-limits', unlimited)]:
+            reader = _parse(body, chunk_size, parser_limits)
+            elapsed = time_function(lambda: _parse(body, chunk_size, parser_limits), number=number, repeat=3)
+            results.append({
+                'body': name,
+                'limits': limits_name,
+                'body_bytes': len(body),
+                'bytes_read': reader.bytes_read,
+                'parts': reader.parts_count,
+                'milliseconds_per_body': elapsed / 1000
+            })
+
+    return results
@@ -0,0 +1,55 @@
+from flask import Flask
+
+from file_upload_endpoint.benchmarks import time_function
+from file_upload_endpoint.middleware.rate_limit import RATE_LIMIT_KEYS, RateLimit
+
+# Budgets which never limit requests ('allowed'), or limit all but the first request ('limited')
+BUDGETS = {
+    'allowed': (1e9, 10 ** 9),
+    'limited': (1e-9, 1)
+}
+
+
+def _application(environ: dict, start_response):
+    start_response('204 No Content', [])
+    return []
+
+
+def _start_response(status: str, response_headers: list, exc_info=None):
+    pass
+
+
+def benchmark_rate_limit(number: int = 10000) -> list:
+    """
+    Benchmarks the overhead the rate limit middleware adds to each request
+
+    The middleware wraps a minimal WSGI application, the time taken to call this application directly is subtracted
+    from the time taken through the middleware for each key function, for requests which are allowed or limited.
+
+    :type number: int
+    :param number: number of requests for each run
+
+    :rtype: list
+    :return: results for each key function and budget
+    """
+    environ = {
+        'REQUEST_METHOD': 'POST',
+        'PATH_INFO': '/upload-single',
+        'REMOTE_ADDR': '192.0.2.1'
+    }
+    baseline = time_function(lambda: _application(dict(environ), _start_response), number=number)
+
+    results = []
+    for key in RATE_LIMIT_KEYS:
+        for budget_name, budget in BUDGETS.items():
+            middleware = RateLimit(Flask(__name__), budgets={'/upload-': budget}, key=key)
+            middleware.app = _application
+
+            elapsed = time_function(lambda: middleware(dict(environ), _start_response), number=number)
+            results.append({
+                'key': key,
+                'budget': budget_name,
+                'microseconds_per_request': elapsed - baseline
+            })
+
+    return results
@@ -0,0 +1,56 @@
+from uuid import uuid4
+
+from flask import Flask
+
+from file_upload_endpoint.benchmarks import time_function
+from file_upload_endpoint.middleware.request_id import REQUEST_ID_GENERATORS, RequestID
+
+# Request ID headers sent by clients, covering each way a request ID can be considered unique (or not)
+REQUEST_ID_HEADERS = {
+    'none': None,
+    'uuid': str(uuid4()),
+    'load-balancer': 'BAS-API-LB-RV1+C0AB89535BD8D6750000',
+    'client': 'client-request-id',
+    'client-multiple': 'client-request-id-1,client-request-id-2,client-request-id-3'
+}
+
+
+def _application(environ: dict, start_response):
+    start_response('204 No Content', [])
+    return []
+
+
+def _start_response(status: str, response_headers: list, exc_info=None):
+    pass
+
+
+def benchmark_request_id(number: int = 10000) -> list:
+    """
+    Benchmarks the overhead the Request ID middleware adds to each request
+
+    The middleware wraps a minimal WSGI application, the time taken to call this application directly is subtracted
+    from the time taken through the middleware for each Request ID header and generator.
+
+    :type number: int
+    :param number: number of requests for each run
+
+    :rtype: list
+    :return: results for each Request ID generator and header
+    """
+    results = []
+    for generator_name, generator in REQUEST_ID_GENERATORS.items():
+        middleware = RequestID(Flask(__name__), generator=generator())
+        middleware.app = _application
+
+        for header_name, header_value in REQUEST_ID_HEADERS.items():
+            environ = {} if header_value is None else {'HTTP_X_REQUEST_ID': header_value}
+
+            baseline = time_function(lambda: _application(dict(environ), _start_response), number=number)
+            elapsed = time_function(lambda: middleware(dict(environ), _start_response), number=number)
+            results.append({
+                'generator': generator_name,
+                'header': header_name,
+                'microseconds_per_request': elapsed - baseline
+            })
+
+    return results
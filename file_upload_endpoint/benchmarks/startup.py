@@ -0,0 +1,133 @@
+import json
+import os
+import platform
+import subprocess  # nosec
+import sys
+
+from typing import List, Optional
+
+# Marks the start of each phase in the import time output of the profiled interpreter
+IMPORT_MARKER = 'startup-profile:'
+
+# Ran in a new interpreter, as the current process has already imported and created the application. Nothing from the
+# application is imported before the first marker, so all application imports are included.
+PROFILE_SCRIPT = f"""
+import cProfile
+import json
+import pstats
+import sys
+import time
+
+sys.stderr.write('{ IMPORT_MARKER } import\\n')
+started_at = time.perf_counter()
+from file_upload_endpoint import create_app
+imported_at = time.perf_counter()
+
+sys.stderr.write('{ IMPORT_MARKER } create_app\\n')
+profiler = cProfile.Profile()
+profiler.enable()
+create_app(sys.argv[1])
+profiler.disable()
+created_at = time.perf_counter()
+
+modules = {{
+    getattr(module, '__file__', None): name for name, module in list(sys.modules.items())
+    if getattr(module, '__file__', None)
+}}
+create_app_modules = {{}}
+for (filename, _line, _function), (_cc, _nc, self_time, _ct, _callers) in pstats.Stats(profiler).stats.items():
+    module = modules.get(filename, '<builtin>' if filename == '~' else filename)
+    create_app_modules[module] = create_app_modules.get(module, 0) + self_time
+
+sys.stdout.write(json.dumps({{
+    'import_ms': (imported_at - started_at) * 1000,
+    'create_app_ms': (created_at - imported_at) * 1000,
+    'create_app_modules': create_app_modules
+}}))
+"""
+
+
+def parse_import_times(output: str) -> List[dict]:
+    """
+    Parses import times (from `python -X importtime`), after the first phase marker
+
+    :type output: str
+    :param output: standard error output of the profiled interpreter
+
+    :rtype: list
+    :return: module, phase, own (self) and cumulative import times (in milliseconds) for each imported module
+    """
+    imports = []
+    phase = None
+    for line in output.splitlines():
+        if line.startswith(IMPORT_MARKER):
+            phase = line[len(IMPORT_MARKER):].strip()
+            continue
+        if phase is None or not line.startswith('import time:'):
+            continue
+
+        own, cumulative, module = line[len('import time:'):].split('|')
+        try:
+            imports.append({
+                'module': module.strip(),
+                'phase': phase,
+                'own_ms': int(own) / 1000,
+                'cumulative_ms': int(cumulative) / 1000
+            })
+        except ValueError:
+            # header line
+            continue
+
+    return imports
+
+
+def _group(items: List[dict], key: str, value: str) -> List[dict]:
+    groups = {}
+    for item in items:
+        groups[item[key]] = groups.get(item[key], 0) + item[value]
+    return [{key: name, 'ms': ms} for name, ms in sorted(groups.items(), key=lambda group: group[1], reverse=True)]
+
+
+def profile_startup(config_name: str, limit: Optional[int] = 20) -> dict:
+    """
+    Profiles the time taken to import and create the application, by module
+
+    The application is imported and created in a new interpreter, with import times recorded by Python
+    (`-X importtime`) and `create_app()` profiled using cProfile. Import times are grouped by top level package, and
+    include modules imported by `create_app()` (e.g. optional dependencies). Profiling adds overhead, so times for
+    `create_app()` are inflated, but are comparable between runs.
+
+    :type config_name: str
+    :param config_name: application configuration (e.g. 'production')
+
+    :type limit: Optional[int]
+    :param limit: maximum number of modules and packages to include in each breakdown, or None for all
+
+    :rtype: dict
+    :return: startup profile
+    """
+    process = subprocess.run(  # nosec
+        [sys.executable, '-X', 'importtime', '-c', PROFILE_SCRIPT, config_name],
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True
+    )
+    timings = json.loads(process.stdout.decode())
+    imports = parse_import_times(process.stderr.decode())
+    for item in imports:
+        item['package'] = item['module'].split('.', 1)[0]
+
+    return {
+        'config': config_name,
+        'python': platform.python_version(),
+        'import_ms': timings['import_ms'],
+        'create_app_ms': timings['create_app_ms'],
+        'imports_by_package': _group(imports, 'package', 'own_ms')[:limit],
+        'imports_by_module': sorted(imports, key=lambda item: item['own_ms'], reverse=True)[:limit],
+        'create_app_by_module': [
+            {'module': module, 'ms': seconds * 1000} for module, seconds in sorted(
+                timings['create_app_modules'].items(), key=lambda item: item[1], reverse=True
+            )
+        ][:limit]
+    }
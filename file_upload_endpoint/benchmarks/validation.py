@@ -0,0 +1,93 @@
+from cerberus import Validator
+
+from file_upload_endpoint.benchmarks import time_function
+from file_upload_endpoint.meta import logging_entry_schema
+from file_upload_endpoint.meta.utils import CompiledSchema, get_cerberus_schema
+from file_upload_endpoint.meta.validators import FastValidator
+
+
+def synthetic_schema(size: int) -> tuple:
+    """
+    Generates an extended validation schema with a mix of field types and rules, with valid and invalid documents
+
+    :type size: int
+    :param size: number of fields
+
+    :rtype: tuple
+    :return: Extended (application) validation schema, valid document, invalid document
+    """
+    field_definitions = [
+        {'type': 'string', 'required': True, 'allowed': ['apple', 'orange', 'pear']},
+        {'type': 'integer', 'required': True, 'min': 0, 'max': 100},
+        {'type': 'string', 'regex': '[a-z]+', 'minlength': 1, 'maxlength': 20},
+        {'type': 'boolean'},
+        {'type': 'number', 'nullable': True, 'max': 1.5}
+    ]
+    field_values = ['apple', 50, 'foo', True, 1.0]
+    invalid_field_values = ['banana', 500, 'FOO', 'true', 2.5]
+
+    schema = {}
+    valid_document = {}
+    invalid_document = {}
+    for index in range(size):
+        field = f"field_{ index }"
+        schema[field] = dict(field_definitions[index % len(field_definitions)], request_type='parameter')
+        valid_document[field] = field_values[index % len(field_values)]
+        invalid_document[field] = invalid_field_values[index % len(invalid_field_values)]
+
+    return schema, valid_document, invalid_document
+
+
+def benchmark_schema(name: str, schema: dict, valid_document: dict, invalid_document: dict, number: int) -> list:
+    """
+    Compares the time taken to validate documents using Cerberus and the fast validation engine
+
+    :rtype: list
+    :return: results for each validation engine and document
+    """
+    compiled_schema = CompiledSchema(schema)
+    cerberus_schema = get_cerberus_schema(schema)
+
+    engines = {
+        'cerberus (uncached)': lambda document: Validator(get_cerberus_schema(schema)).validate(document),
+        'cerberus': Validator(cerberus_schema).validate,
+        'fast': FastValidator(cerberus_schema, compiled_schema.validate_function).validate
+    }
+
+    results = []
+    for engine, validate in engines.items():
+        for document_type, document in [('valid', valid_document), ('invalid', invalid_document)]:
+            results.append({
+                'schema': name,
+                'fields': len(schema),
+                'engine': engine,
+                'document': document_type,
+                'microseconds_per_validation': time_function(lambda: validate(document), number=number)
+            })
+
+    return results
+
+
+def benchmark_validation(number: int = 1000) -> list:
+    """
+    Benchmarks validation engines using the logging entry schema and larger synthetic schemas
+
+    :type number: int
+    :param number: number of validations for each run
+
+    :rtype: list
+    :return: results for each schema, validation engine and document
+    """
+    results = benchmark_schema(
+        'logging-entry',
+        logging_entry_schema.schema,
+        {'logging_level': 'debug'},
+        {'logging_level': 'foo'},
+        number
+    )
+
+    for size in [10, 50]:
+        schema, valid_document, invalid_document = synthetic_schema(size)
+        results.extend(benchmark_schema(f"synthetic-{ size }", schema, valid_document, invalid_document, number))
+
+    return results
@@ -0,0 +1,414 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import weakref
+
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional, Tuple
+
+from flask import Flask as App, has_request_context, request
+from werkzeug.wsgi import get_current_url
+
+
+def _get_request_environ(record: logging.LogRecord) -> Optional[dict]:
+    """
+    Gets the WSGI environment of the request a log record was made in, if any
+
+    Records passed through a `RequestContextFilter` carry a reference to the environment, so they can be formatted
+    outside of the request (e.g. in another thread), otherwise the current request is used.
+    """
+    if hasattr(record, 'request_environ'):
+        return record.request_environ
+    if has_request_context():
+        return request.environ
+    return None
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Logging filter to capture the request a log record was made in, so it can be formatted later
+
+    Only a reference to the request's WSGI environment is captured, values such as the request URL are computed when
+    the record is formatted.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_environ = request.environ if has_request_context() else None
+        return True
+
+
+class RequestFormatter(logging.Formatter):
+    """
+    Logging formatter including the URL and Request ID of the request a log record was made in
+
+    Where a record wasn't made in a request, these fields are substituted with 'NA'.
+    """
+
+    def __init__(self, *args, request_ids: bool = True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.request_ids = request_ids
+
+    def format(self, record: logging.LogRecord) -> str:
+        record.url = 'NA'
+        record.request_id = 'NA'
+
+        environ = _get_request_environ(record)
+        if environ is not None:
+            record.url = get_current_url(environ)
+            if self.request_ids:
+                record.request_id = environ.get("HTTP_X_REQUEST_ID")
+
+        return super().format(record)
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Logging formatter for structured (JSON) log records, with each record on a single line
+
+    Records include the URL and Request ID of the request they were made in, or null if not made in a request. Request
+    timings (see `ServerTiming`) are included where given.
+    """
+
+    def __init__(self, request_ids: bool = True):
+        super().__init__()
+        self.request_ids = request_ids
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'message': record.getMessage(),
+            'url': None,
+            'request_id': None
+        }
+
+        environ = _get_request_environ(record)
+        if environ is not None:
+            entry['url'] = get_current_url(environ)
+            if self.request_ids:
+                entry['request_id'] = environ.get("HTTP_X_REQUEST_ID")
+
+        if hasattr(record, 'timings'):
+            entry['timings'] = record.timings
+
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+
+        return json.dumps(entry, separators=(',', ':'), default=str)
+
+
+class BatchStreamHandler(logging.StreamHandler):
+    """
+    Logging handler writing formatted records to a stream in batches, rather than individually
+
+    Records are written once a batch is full, or when the handler is flushed (e.g. by a `LogQueueListener` once its
+    queue is empty). This handler should therefore only be used behind a queue, where records are flushed regularly.
+    """
+
+    def __init__(self, stream=None, batch_size: int = 100):
+        super().__init__(stream)
+        self.batch_size = batch_size
+        self._batch: List[str] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self._batch.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+            return
+
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            if self._batch and self.stream is not None:
+                self.stream.write(self.terminator.join(self._batch) + self.terminator)
+                self._batch = []
+            super().flush()
+        finally:
+            self.release()
+
+
+class LogQueueHandler(QueueHandler):
+    """
+    Logging handler adding records to a bounded queue, to be handled by a `LogQueueListener` in another thread
+
+    Records are prepared for the queue by merging their message and arguments, other formatting (such as request
+    information, or exception tracebacks) is left to the listener's handlers.
+
+    If the queue is full, records are either dropped (the 'drop' overflow policy) or the logging thread waits for space
+    in the queue (the 'block' policy). Dropped records are counted and included in a warning once the queue has space.
+    """
+
+    def __init__(self, log_queue: queue.Queue, overflow: str = 'drop'):
+        if overflow not in ('drop', 'block'):
+            raise ValueError(f"Overflow policy [{ overflow }] is not supported, use 'drop' or 'block'")
+
+        super().__init__(log_queue)
+        self.overflow = overflow
+        self.dropped = 0
+        self.listener: Optional[LogQueueListener] = None
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.overflow == 'block':
+            self.queue.put(record)
+            return
+
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+            return
+
+        if self.dropped:
+            with self._dropped_lock:
+                dropped = self.dropped
+                self.dropped = 0
+            summary = logging.makeLogRecord({
+                'name': record.name,
+                'levelno': logging.WARNING,
+                'levelname': logging.getLevelName(logging.WARNING),
+                'msg': f"{ dropped } log records dropped, log queue full",
+                'request_environ': None
+            })
+            try:
+                self.queue.put_nowait(summary)
+            except queue.Full:
+                with self._dropped_lock:
+                    self.dropped += dropped
+
+
+class LogQueueListener(QueueListener):
+    """
+    Logging queue listener, handling records from a `LogQueueHandler` in a background thread
+
+    Handlers are flushed whenever the queue is empty, so records can be written in batches when records are logged
+    faster than they can be written.
+    """
+
+    def handle(self, record: logging.LogRecord) -> None:
+        super().handle(record)
+        if self.queue.empty():
+            for handler in self.handlers:
+                handler.flush()
+
+    def stop(self) -> None:
+        # the listener may already have been stopped (e.g. when replaced by another listener)
+        if self._thread is not None:
+            super().stop()
+
+    def enqueue_sentinel(self) -> None:
+        # wait for space in the queue, rather than failing, as the listener will continue to remove records
+        self.queue.put(self._sentinel)
+
+
+class _TokenBucket(object):
+    __slots__ = ('tokens', 'updated_at', 'suppressed')
+
+    def __init__(self, tokens: float, updated_at: float):
+        self.tokens = tokens
+        self.updated_at = updated_at
+        self.suppressed = 0
+
+
+class LogRateLimiter(logging.Filter):
+    """
+    Flask extension to rate limit repeated application log records, such as warnings for the same client error
+
+    Records are grouped by their message template (i.e. before any arguments are merged) and the route of the request
+    they were made in. Each group has a token bucket, allowing a burst of records, then records at a steady rate.
+    Records over this rate are suppressed (not logged), and counted. Periodically, a warning is logged for each group
+    with suppressed records, with the number of records suppressed.
+
+    Only records at or below a maximum level (warning by default) are rate limited, more severe records are always
+    logged.
+    """
+
+    def __init__(
+        self,
+        app: App,
+        rate: float = 1.0,
+        burst: int = 10,
+        summary_interval: float = 60,
+        max_level: int = logging.WARNING
+    ):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.summary_interval = summary_interval
+        self.max_level = max_level
+
+        self._buckets: Dict[Tuple[str, Optional[str]], _TokenBucket] = {}
+        self._lock = threading.Lock()
+        self._summary_at = time.monotonic() + summary_interval
+
+        # remove any existing rate limiter for this logger (e.g. where the application has been created before)
+        self.logger = app.logger
+        for _filter in list(self.logger.filters):
+            if isinstance(_filter, LogRateLimiter):
+                self.logger.removeFilter(_filter)
+        self.logger.addFilter(self)
+
+        app.extensions['log_rate_limiter'] = self
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, 'rate_limit_summary', False):
+            return True
+
+        now = time.monotonic()
+        if now >= self._summary_at:
+            self.summarise(now)
+
+        if record.levelno > self.max_level:
+            return True
+
+        route = None
+        if has_request_context() and request.url_rule is not None:
+            route = request.url_rule.rule
+        key = (str(record.msg), route)
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _TokenBucket(self.burst, now)
+            else:
+                bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated_at) * self.rate)
+                bucket.updated_at = now
+
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                return True
+
+            bucket.suppressed += 1
+            return False
+
+    def summarise(self, now: Optional[float] = None) -> None:
+        """
+        Logs a warning for each group of records suppressed since the last summary
+
+        Groups without suppressed records, and which would have a full token bucket, are removed.
+
+        :type now: Optional[float]
+        :param now: current (monotonic) time
+        """
+        now = now or time.monotonic()
+        summaries = []
+        with self._lock:
+            self._summary_at = now + self.summary_interval
+            for key, bucket in list(self._buckets.items()):
+                if bucket.suppressed:
+                    summaries.append((key, bucket.suppressed))
+                    bucket.suppressed = 0
+                elif bucket.tokens + (now - bucket.updated_at) * self.rate >= self.burst:
+                    del self._buckets[key]
+
+        for (template, route), suppressed in summaries:
+            self.logger.handle(self.logger.makeRecord(
+                self.logger.name,
+                logging.WARNING,
+                __file__,
+                0,
+                "Suppressed %d similar messages to [%s] (route: [%s])",
+                (suppressed, template, route),
+                None,
+                extra={'rate_limit_summary': True}
+            ))
+
+
+# Queued logging extensions in use. Their listeners are restarted in forked processes, and stopped when the process
+# exits, by handlers registered once (as these can't be unregistered), rather than for each application.
+_queued_loggings: weakref.WeakSet = weakref.WeakSet()
+
+
+def _restart_queued_loggings() -> None:
+    for queued_logging in list(_queued_loggings):
+        queued_logging._restart()
+
+
+def _stop_queued_loggings() -> None:
+    for queued_logging in list(_queued_loggings):
+        queued_logging.stop()
+
+
+os.register_at_fork(after_in_child=_restart_queued_loggings)
+atexit.register(_stop_queued_loggings)
+
+
+class QueuedLogging(object):
+    """
+    Flask extension to handle application log records in a background thread
+
+    Handlers for the application logger are moved behind a `LogQueueHandler`, so that writing log records (e.g. to a
+    slow log collector) doesn't add latency to requests. Request information is captured as a reference when a record
+    is logged and formatted by the listener's handlers.
+
+    The listener is started when the extension is created, and restarted in each process where the application is
+    forked. Queued records are handled when the process exits.
+    """
+
+    def __init__(
+        self,
+        app: App,
+        handlers: Optional[List[logging.Handler]] = None,
+        queue_size: int = 10000,
+        overflow: str = 'drop'
+    ):
+        logger = app.logger
+
+        # remove any existing queue handler for this logger (e.g. where the application has been created before)
+        for handler in list(logger.handlers):
+            if isinstance(handler, LogQueueHandler):
+                logger.removeHandler(handler)
+                handler.listener.stop()
+                for queued_logging in list(_queued_loggings):
+                    if queued_logging.handler is handler:
+                        _queued_loggings.discard(queued_logging)
+
+        handlers = list(handlers or []) + list(logger.handlers)
+        for handler in handlers:
+            logger.removeHandler(handler)
+
+        self.queue_size = queue_size
+        self.handler = LogQueueHandler(queue.Queue(maxsize=queue_size), overflow=overflow)
+        self.handler.addFilter(RequestContextFilter())
+        self.handlers = handlers
+        self._start_listener()
+        logger.addHandler(self.handler)
+
+        _queued_loggings.add(self)
+
+        app.extensions['queued_logging'] = self
+
+    def stop(self) -> None:
+        """
+        Handles any queued records and stops the listener
+        """
+        self.handler.listener.stop()
+
+    def _start_listener(self) -> None:
+        self.handler.listener = LogQueueListener(self.handler.queue, *self.handlers, respect_handler_level=True)
+        self.handler.listener.start()
+
+    def _restart(self) -> None:
+        # Threads (and the state of any locks they held) aren't copied when a process is forked, so a new queue and
+        # listener are needed. Records queued, but not yet handled, before forking are handled by the parent process.
+        self.handler.queue = queue.Queue(maxsize=self.queue_size)
+        self._start_listener()
@@ -1,48 +1,294 @@
+import os
+
 from http import HTTPStatus
+from typing import Callable, Optional
 
-from flask import Blueprint, request, make_response, jsonify, abort
+from flask import Blueprint, request, abort, current_app as app, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
 
-from file_upload_endpoint.main.errors import error_no_file, error_no_file_selection, error_wrong_mime_type
-from file_upload_endpoint.meta.errors import error_too_large
+from file_upload_endpoint.main.checksums import compute_checksums
+from file_upload_endpoint.main.errors import error_response_no_file, error_response_no_file_selection, \
+    error_response_wrong_mime_type, error_response_too_many_files, error_response_file_too_large, \
+    error_response_files_too_large, error_response_multipart_limit, error_response_upload_storage_full, \
+    register_error_templates
+from file_upload_endpoint.main.multipart import MultipartError, MultipartLimitError, MultipartPart, \
+    MultipartPartTooLargeError, MultipartReader, MultipartTooLargeError, get_multipart_boundary
+from file_upload_endpoint.main.sniffing import sniff_mime_type
+from file_upload_endpoint.main.spooling import UploadSpool, UploadSpoolFullError
+from file_upload_endpoint.meta.errors import error_response_too_large
+from file_upload_endpoint.meta.responses import template_response
+from file_upload_endpoint.timings import time_phase
 
 
 main = Blueprint('main', __name__)
 
+# Size of each read by Werkzeug's multipart parser, which may be held in memory before its form field limit is checked
+FORM_PARSER_READ_SIZE = 64 * 1024  # 64KB
+
+
+@main.record_once
+def register_templates(state) -> None:
+    """
+    Registers response templates for this blueprint when registered with the application
 
-def common_single_file():
+    :param state: Flask blueprint setup state
+    """
+    templates = state.app.extensions['response_templates']
+
+    templates.register('main.index', {
+        'meta': {
+            'summary': 'A minimal API implementing a simple form action for testing file upload components in the BAS '
+                       'Style Kit.'
+        }
+    })
+    register_error_templates(templates)
+
+
+@main.record_once
+def register_upload_spool(state) -> None:
+    """
+    Creates the upload spool for this blueprint when registered with the application
+
+    The spool is created when the application is created, before any worker processes are started, so that the budget
+    for files spooled to disk is shared by all workers.
+
+    :param state: Flask blueprint setup state
+    """
+    UploadSpool(state.app, **state.app.config['UPLOAD_SPOOL_CONFIG'])
+
+
+def get_request_files():
+    """
+    Parses the files in the current request, as `FileStorage` objects
+
+    Files are spooled using the `UploadSpool` extension. Aborts the request if files spooled to disk would exceed the
+    budget set in the `UPLOAD_SPOOL_CONFIG` config option.
+
+    The limits set in the `MULTIPART_LIMITS` config option are also applied. The number of parts, and the size of form
+    fields (within a read of the limit, which also bounds part headers), are checked by Werkzeug as the request is
+    parsed. Werkzeug doesn't say which of these limits was exceeded, so either is reported as the 'form' limit. The
+    exact size of form fields, and the length of filenames, are checked once the request is parsed.
+
+    :rtype: MultiDict
+    :return: files, keyed by field name
+    """
+    limits = app.config['MULTIPART_LIMITS']
+    request.max_form_parts = limits['max_parts']
+    request.max_form_memory_size = limits['max_field_size'] + FORM_PARSER_READ_SIZE
+
+    try:
+        files = request.files
+    except UploadSpoolFullError as e:
+        abort(error_response_upload_storage_full(e.max_disk_size))
+    except RequestEntityTooLarge:
+        # Requests over the maximum content length, either declared or as the request body is read (i.e. chunked
+        # requests), are reported by the 413 error handler. Any other limit is one checked by Werkzeug's form parser.
+        if request.content_length is None:
+            too_large = getattr(request.stream, 'is_exhausted', False)
+        else:
+            too_large = request.content_length > request.max_content_length
+        if too_large:
+            raise
+        abort(error_response_multipart_limit('form', None))
+
+    for value in request.form.values():
+        if len(value.encode()) > limits['max_field_size']:
+            abort(error_response_multipart_limit('field_size', limits['max_field_size']))
+    if limits['max_filename_length'] is not None:
+        for file in files.values():
+            if file.filename is not None and len(file.filename) > limits['max_filename_length']:
+                abort(error_response_multipart_limit('filename_length', limits['max_filename_length']))
+
+    return files
+
+
+def get_multipart_reader(limit: Optional[int] = None) -> Optional[MultipartReader]:
+    """
+    Creates a streaming multipart parser for the current request
+
+    The parser checks the limits set in the `MULTIPART_LIMITS` config option as each part is parsed.
+
+    :type limit: Optional[int]
+    :param limit: maximum request body size (in bytes), defaults to the global maximum content length
+
+    :rtype: Optional[MultipartReader]
+    :return: multipart reader, or None if the request doesn't use multipart/form-data encoding
+    """
+    boundary = get_multipart_boundary(request.headers.get('Content-Type'))
+    if boundary is None:
+        return None
+
+    if limit is None:
+        limit = app.config['MAX_CONTENT_LENGTH']
+
+    return MultipartReader(
+        request.stream,
+        boundary,
+        chunk_size=app.config['UPLOAD_STREAM_CHUNK_SIZE'],
+        limit=limit,
+        **app.config['MULTIPART_LIMITS']
+    )
+
+
+def common_single_file(inspect: Optional[Callable] = None, limit: Optional[int] = None):
     """
     Common file processing logic
 
     Checks a 'file' form input is included in a request and isn't an empty selection.
     Aborts the request with the appropriate error if these checks fail.
+
+    An optional inspect function can be given to examine the file (e.g. its content type) once these checks pass.
+
+    When streaming uploads are enabled, the request body is parsed incrementally and file content is discarded as it is
+    read. The inspect function is called before the file's content is discarded. In either case, the size of the
+    request body is checked as it is read, aborting the request as soon as the (optional) limit is exceeded.
+
+    Time spent parsing the request and checking the file (including the inspect function) is timed separately.
+
+    :type inspect: Optional[Callable]
+    :param inspect: function to call with the file before it is drained
+
+    :type limit: Optional[int]
+    :param limit: maximum request body size (in bytes), defaults to the global maximum content length
     """
 
-    if 'file' not in request.files:
-        payload = {'errors': [error_no_file('file')]}
-        abort(make_response(jsonify(payload), HTTPStatus.BAD_REQUEST))
+    if app.config['APP_ENABLE_STREAMING_UPLOADS']:
+        return _common_single_file_streaming(inspect, limit)
+
+    if limit is not None:
+        # checked by Werkzeug as the request body is read, for requests without a declared content length
+        request.max_content_length = limit
+
+    with time_phase('parse'):
+        files = get_request_files()
 
-    file = request.files['file']
-    if file.filename == '':
-        payload = {'errors': [error_no_file_selection('file')]}
-        abort(make_response(jsonify(payload), HTTPStatus.BAD_REQUEST))
+    with time_phase('validate'):
+        if 'file' not in files:
+            abort(error_response_no_file('file'))
+
+        file = files['file']
+        if file.filename == '':
+            abort(error_response_no_file_selection('file'))
+
+        if inspect is not None:
+            inspect(file)
+
+    return file
+
+
+def _common_single_file_streaming(
+    inspect: Optional[Callable] = None,
+    limit: Optional[int] = None
+) -> MultipartPart:
+    reader = get_multipart_reader(limit)
+    file = None
+
+    try:
+        with time_phase('parse'):
+            if reader is not None:
+                for part in reader:
+                    # As with request.files, only the first part for a field which includes a filename is considered
+                    if part.name == 'file' and part.filename is not None:
+                        file = part
+                        break
+
+        with time_phase('validate'):
+            if file is None:
+                abort(error_response_no_file('file'))
+
+            if file.filename == '':
+                abort(error_response_no_file_selection('file'))
+
+            if inspect is not None:
+                inspect(file)
+
+        with time_phase('parse'):
+            file.drain()
+            reader.discard()
+    except MultipartTooLargeError as e:
+        abort(error_response_too_large(e.limit, e.size))
+    except MultipartLimitError as e:
+        abort(error_response_multipart_limit(e.limit, e.maximum))
+    except MultipartError:
+        abort(HTTPStatus.BAD_REQUEST)
 
     return file
 
 
+def _upload_multiple_streaming() -> None:
+    reader = get_multipart_reader()
+    limits = app.config['UPLOAD_MULTIPLE_LIMITS']
+    files_count = 0
+    total_size = 0
+
+    try:
+        # Files are checked as they are parsed, aborting on the first invalid file without reading any later files. The
+        # time taken to check each file is negligible.
+        with time_phase('parse'):
+            if reader is not None:
+                for part in reader:
+                    if part.name != 'files[]' or part.filename is None:
+                        continue
+
+                    if part.filename == '':
+                        abort(error_response_no_file_selection('file'))
+
+                    files_count += 1
+                    if files_count > limits['max_files']:
+                        abort(error_response_too_many_files(limits['max_files']))
+
+                    try:
+                        part.drain(limit=min(limits['max_file_size'], limits['max_total_size'] - total_size))
+                    except MultipartPartTooLargeError:
+                        # As when files are buffered, the per-file limit is checked before the total, so a file over
+                        # the remaining total is read up to the per-file limit to tell which error applies.
+                        try:
+                            part.drain(limit=limits['max_file_size'])
+                        except MultipartPartTooLargeError:
+                            pass
+                        if part.size > limits['max_file_size']:
+                            abort(error_response_file_too_large(limits['max_file_size'], part.filename))
+                        abort(error_response_files_too_large(limits['max_total_size']))
+                    total_size += part.size
+    except MultipartTooLargeError as e:
+        abort(error_response_too_large(e.limit, e.size))
+    except MultipartLimitError as e:
+        abort(error_response_multipart_limit(e.limit, e.maximum))
+    except MultipartError:
+        abort(HTTPStatus.BAD_REQUEST)
+
+    with time_phase('validate'):
+        if files_count <= 0:
+            abort(error_response_no_file('files'))
+
+
+def check_mime_type(file) -> None:
+    """
+    Checks a file uses an allowed MIME type
+
+    Aborts the request with the appropriate error if this check fails.
+
+    :param file: uploaded file (FileStorage or multipart part)
+    """
+    allowed_content_types = app.config['UPLOAD_RESTRICTED_MIME_TYPES']
+
+    file_content_type = file.content_type
+    if app.config['APP_ENABLE_MIME_TYPE_SNIFFING']:
+        file_content_type = sniff_mime_type(file) or 'application/octet-stream'
+
+    if file_content_type not in allowed_content_types:
+        abort(error_response_wrong_mime_type(sorted(allowed_content_types), file_content_type))
+
+
 @main.route("/")
 def index():
     """
     Returns a simple welcome message
-    """
 
-    payload = {
-        'meta': {
-            'summary': 'A minimal API implementing a simple form action for testing file upload components in the BAS '
-                       'Style Kit.'
-        }
-    }
+    As this message doesn't change, it is returned from a template with an ETag to allow clients to cache it.
+    """
 
-    return jsonify(payload)
+    return template_response('main.index', HTTPStatus.OK)
 
 
 @main.route('/upload-single', methods=['post'])
@@ -57,6 +303,24 @@ def upload_single():
     return '', HTTPStatus.NO_CONTENT
 
 
+@main.route('/upload-single-checksums', methods=['post'])
+def upload_single_checksums():
+    """
+    Accepts a single file upload, returning its size and checksums (SHA-256, MD5 and CRC32)
+
+    Designed to test client side integrity checks, by proving the exact bytes of a file were received. Checksums are
+    computed as the file is read (before it is discarded), rather than after buffering it.
+
+    The uploaded file is not used or stored.
+    """
+
+    result = {}
+    file = common_single_file(
+        inspect=lambda file: result.update(compute_checksums(file, app.config['UPLOAD_STREAM_CHUNK_SIZE']))
+    )
+    return jsonify({'meta': {'file': {'filename': file.filename, **result}}}), HTTPStatus.OK
+
+
 @main.route('/upload-multiple', methods=['post'])
 def upload_multiple():
     """
@@ -65,16 +329,33 @@ def upload_multiple():
     The uploaded files are not used or stored.
     """
 
-    files = request.files.getlist('files[]')
+    if app.config['APP_ENABLE_STREAMING_UPLOADS']:
+        _upload_multiple_streaming()
+        return '', HTTPStatus.NO_CONTENT
 
-    if len(files) <= 0:
-        payload = {'errors': [error_no_file('files')]}
-        abort(make_response(jsonify(payload), HTTPStatus.BAD_REQUEST))
+    with time_phase('parse'):
+        files = get_request_files().getlist('files[]')
 
-    for file in files:
-        if file.filename == '':
-            payload = {'errors': [error_no_file_selection('file')]}
-            abort(make_response(jsonify(payload), HTTPStatus.BAD_REQUEST))
+    with time_phase('validate'):
+        if len(files) <= 0:
+            abort(error_response_no_file('files'))
+
+        limits = app.config['UPLOAD_MULTIPLE_LIMITS']
+        total_size = 0
+        for files_count, file in enumerate(files, start=1):
+            if file.filename == '':
+                abort(error_response_no_file_selection('file'))
+
+            if files_count > limits['max_files']:
+                abort(error_response_too_many_files(limits['max_files']))
+
+            size = file.stream.seek(0, os.SEEK_END)
+            file.stream.seek(0)
+            if size > limits['max_file_size']:
+                abort(error_response_file_too_large(limits['max_file_size'], file.filename))
+            total_size += size
+            if total_size > limits['max_total_size']:
+                abort(error_response_files_too_large(limits['max_total_size']))
 
     return '', HTTPStatus.NO_CONTENT
 
@@ -90,13 +371,15 @@ def upload_single_restricted_size():
     """
 
     content_length = request.content_length
-    upload_limit = 1024 * 40  # 40KB
+    upload_limit = app.config['UPLOAD_ROUTE_MAX_CONTENT_LENGTHS'][request.path]
 
-    if content_length is not None and content_length > upload_limit:
-        payload = {'errors': [error_too_large(upload_limit, content_length)]}
-        abort(make_response(jsonify(payload), HTTPStatus.REQUEST_ENTITY_TOO_LARGE))
+    # Requests with a declared content length are rejected before any of the request body is read. Requests without
+    # (i.e. using chunked transfer encoding) are checked as the request body is streamed.
+    with time_phase('validate'):
+        if content_length is not None and content_length > upload_limit:
+            abort(error_response_too_large(upload_limit, content_length))
 
-    common_single_file()
+    common_single_file(limit=upload_limit)
     return '', HTTPStatus.NO_CONTENT
 
 
@@ -107,16 +390,11 @@ def upload_single_restricted_mime_types():
 
     Designed to more easily test when a user uploads an unsupported file type.
 
+    If MIME type sniffing is enabled, the type of the file is determined from its first few bytes, rather than the type
+    given by the client. The rest of the file is then discarded, or the request rejected, without being read.
+
     The uploaded file is not used or stored.
     """
 
-    file = common_single_file()
-
-    file_content_type = file.content_type
-    allowed_content_types = ['image/jpeg']
-
-    if file_content_type not in allowed_content_types:
-        payload = {'errors': [error_wrong_mime_type(allowed_content_types, file_content_type)]}
-        abort(make_response(jsonify(payload), HTTPStatus.UNSUPPORTED_MEDIA_TYPE))
-
+    common_single_file(inspect=check_mime_type)
     return '', HTTPStatus.NO_CONTENT
@@ -0,0 +1,66 @@
+import hashlib
+import threading
+import zlib
+
+DEFAULT_BUFFER_SIZE = 64 * 1024  # 64KB
+
+# Buffers are allocated once per thread and reused for each file, rather than allocating a new bytes object per read
+_buffers = threading.local()
+
+
+def _get_buffer(size: int) -> memoryview:
+    buffer = getattr(_buffers, 'buffer', None)
+    if buffer is None or len(buffer) != size:
+        buffer = _buffers.buffer = memoryview(bytearray(size))
+    return buffer
+
+
+def _md5():
+    try:
+        return hashlib.md5(usedforsecurity=False)
+    except TypeError:
+        # Python versions before 3.9 don't support `usedforsecurity`, MD5 is used as a checksum, not for security
+        return hashlib.md5()  # nosec
+
+
+def compute_checksums(file, buffer_size: int = DEFAULT_BUFFER_SIZE) -> dict:
+    """
+    Computes SHA-256, MD5 and CRC32 checksums of a file, reading the rest of the file in a single pass
+
+    The file is read (using `readinto()`) into a preallocated buffer, reused by each call in the same thread, with
+    each checksum updated from a view of the buffer. File contents are therefore not copied for each checksum, or
+    buffered beyond a single read. The file is not rewound, so any content already read is not included.
+
+    :param file: file like object (e.g. a multipart part or FileStorage) to read from, supporting `readinto()`
+
+    :type buffer_size: int
+    :param buffer_size: maximum number of bytes to read at a time
+
+    :rtype: dict
+    :return: size of the file content read (in bytes) and hex encoded checksums
+    """
+    buffer = _get_buffer(buffer_size)
+    sha256 = hashlib.sha256()
+    md5 = _md5()
+    crc32 = 0
+    size = 0
+
+    while True:
+        read = file.readinto(buffer)
+        if not read:
+            break
+
+        data = buffer[:read]
+        sha256.update(data)
+        md5.update(data)
+        crc32 = zlib.crc32(data, crc32)
+        size += read
+
+    return {
+        'size': size,
+        'checksums': {
+            'sha256': sha256.hexdigest(),
+            'md5': md5.hexdigest(),
+            'crc32': f"{ crc32:08x}"
+        }
+    }
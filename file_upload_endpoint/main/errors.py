@@ -1,8 +1,11 @@
 from http import HTTPStatus
+from typing import Optional
 from uuid import uuid4
 
-import sentry_sdk
-from flask import current_app as app
+from flask import Response
+
+from file_upload_endpoint.meta.responses import ResponseTemplates, error_template, slot, template_response
+from file_upload_endpoint.reporting import log_handled_error
 
 
 def error_no_file(field: str) -> dict:
@@ -17,15 +20,6 @@ def error_no_file(field: str) -> dict:
     :rtype: dict
     :return Complete JSON-API compatible error object
     """
-    log_message = f"[{ field }] field missing in request"
-    app.logger.warning(log_message)
-
-    # As the API handles this error through this error message, it is not reported to Sentry.
-    # However, because it's useful for tracking, we want report it anyway.
-    with sentry_sdk.push_scope() as scope:
-        scope.set_extra('debug', False)
-        sentry_sdk.capture_message(log_message)
-
     return {
         'id': uuid4(),
         'status': HTTPStatus.BAD_REQUEST,
@@ -46,15 +40,6 @@ def error_no_file_selection(field: str) -> dict:
     :rtype: dict
     :return Complete JSON-API compatible error object
     """
-    log_message = f"[{ field }] field value is an empty selection"
-    app.logger.warning(log_message)
-
-    # As the API handles this error through this error message, it is not reported to Sentry.
-    # However, because it's useful for tracking, we want report it anyway.
-    with sentry_sdk.push_scope() as scope:
-        scope.set_extra('debug', False)
-        sentry_sdk.capture_message(log_message)
-
     return {
         'id': uuid4(),
         'status': HTTPStatus.BAD_REQUEST,
@@ -78,15 +63,6 @@ def error_wrong_mime_type(valid_mime_types: list, invalid_mime_type: str) -> dic
     :rtype: dict
     :return Complete JSON-API compatible error object
     """
-    log_message = f"File type uploaded, [{ invalid_mime_type }], is not allowed"
-    app.logger.warning(log_message)
-
-    # As the API handles this error through this error message, it is not reported to Sentry.
-    # However, because it's useful for tracking, we want report it anyway.
-    with sentry_sdk.push_scope() as scope:
-        scope.set_extra('debug', False)
-        sentry_sdk.capture_message(log_message)
-
     return {
         'id': uuid4(),
         'status': HTTPStatus.UNSUPPORTED_MEDIA_TYPE,
@@ -97,3 +73,293 @@ def error_wrong_mime_type(valid_mime_types: list, invalid_mime_type: str) -> dic
             'instance_mime_type': invalid_mime_type
         }
     }
+
+
+def error_too_many_files(maximum_files: int) -> dict:
+    """
+    Creates an error for a request containing more files than allowed
+
+    :type maximum_files: int
+    :param maximum_files: Maximum number of files allowed
+
+    :rtype: dict
+    :return Complete JSON-API compatible error object
+    """
+    return {
+        'id': uuid4(),
+        'status': HTTPStatus.BAD_REQUEST,
+        'title': 'Too many files in request',
+        'detail': 'Check the number of files uploaded is less than the maximum allowed',
+        'meta': {
+            'maximum_files_allowed': maximum_files
+        }
+    }
+
+
+def error_file_too_large(maximum_size: int, filename: str) -> dict:
+    """
+    Creates an error for a file input in a request that is larger than allowed
+
+    :type maximum_size: int
+    :param maximum_size: Maximum size of each file (in bytes)
+
+    :type filename: str
+    :param filename: Name of the file that is too large
+
+    :rtype: dict
+    :return Complete JSON-API compatible error object
+    """
+    return {
+        'id': uuid4(),
+        'status': HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+        'title': 'File size is too great',
+        'detail': 'Check the size of each file uploaded is less than the maximum allowed',
+        'meta': {
+            'maximum_file_size_allowed': maximum_size,
+            'instance_filename': filename,
+            'size_units': 'bytes'
+        }
+    }
+
+
+def error_files_too_large(maximum_size: int) -> dict:
+    """
+    Creates an error for file inputs in a request that are larger than allowed in total
+
+    :type maximum_size: int
+    :param maximum_size: Maximum total size of all files (in bytes)
+
+    :rtype: dict
+    :return Complete JSON-API compatible error object
+    """
+    return {
+        'id': uuid4(),
+        'status': HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+        'title': 'Total size of files is too great',
+        'detail': 'Check the total size of all files uploaded is less than the maximum allowed',
+        'meta': {
+            'maximum_total_size_allowed': maximum_size,
+            'size_units': 'bytes'
+        }
+    }
+
+
+def error_multipart_limit(limit: str, maximum: Optional[int]) -> dict:
+    """
+    Creates an error for a multipart/form-data request body that exceeds a limit on its parts
+
+    :type limit: str
+    :param limit: Name of the limit exceeded (e.g. 'parts')
+
+    :type maximum: Optional[int]
+    :param maximum: Maximum value allowed for the limit, or None if not known
+
+    :rtype: dict
+    :return Complete JSON-API compatible error object
+    """
+    return {
+        'id': uuid4(),
+        'status': HTTPStatus.BAD_REQUEST,
+        'title': f"Multipart request exceeds [{ limit }] limit",
+        'detail': 'Check the number of parts, and the size of part headers, form fields and filenames, in the request',
+        'meta': {
+            'limit': limit,
+            'maximum_allowed': maximum
+        }
+    }
+
+
+def error_upload_storage_full() -> dict:
+    """
+    Creates an error for a request whose files would exceed the temporary storage available for uploads
+
+    :rtype: dict
+    :return: Complete JSON-API compatible error object
+    """
+    return {
+        'id': uuid4(),
+        'status': HTTPStatus.SERVICE_UNAVAILABLE,
+        'title': 'Temporary storage for uploads is full',
+        'detail': 'Try again once other uploads have finished'
+    }
+
+
+def error_response_no_file(field: str) -> Response:
+    """
+    Creates an error response for a missing file input in a request
+
+    The error is logged and reported to Sentry, as it is handled by this API.
+
+    :type field: str
+    :param field: Name of the missing file input
+
+    :rtype: Response
+    :return: Flask response
+    """
+    log_handled_error('no_file', "[%s] field missing in request", field)
+    return template_response('main.no_file', HTTPStatus.BAD_REQUEST, id=uuid4(), field=field)
+
+
+def error_response_no_file_selection(field: str) -> Response:
+    """
+    Creates an error response for an empty file input in a request
+
+    The error is logged and reported to Sentry, as it is handled by this API.
+
+    :type field: str
+    :param field: Name of the missing file input
+
+    :rtype: Response
+    :return: Flask response
+    """
+    log_handled_error('no_file_selection', "[%s] field value is an empty selection", field)
+    return template_response('main.no_file_selection', HTTPStatus.BAD_REQUEST, id=uuid4(), field=field)
+
+
+def error_response_wrong_mime_type(valid_mime_types: list, invalid_mime_type: str) -> Response:
+    """
+    Creates an error response for an file input in a request that uses an unsupported MIME type
+
+    The error is logged and reported to Sentry, as it is handled by this API.
+
+    :type valid_mime_types: str
+    :param valid_mime_types: List of valid MIME types
+
+    :type invalid_mime_type: str
+    :param invalid_mime_type: Mime type used that is not in the list of valid types
+
+    :rtype: Response
+    :return: Flask response
+    """
+    log_handled_error('wrong_mime_type', "File type uploaded, [%s], is not allowed", invalid_mime_type)
+    return template_response(
+        'main.wrong_mime_type',
+        HTTPStatus.UNSUPPORTED_MEDIA_TYPE,
+        id=uuid4(),
+        valid_mime_types=valid_mime_types,
+        invalid_mime_type=invalid_mime_type
+    )
+
+
+def error_response_too_many_files(maximum_files: int) -> Response:
+    """
+    Creates an error response for a request containing more files than allowed
+
+    The error is logged and reported to Sentry, as it is handled by this API.
+
+    :type maximum_files: int
+    :param maximum_files: Maximum number of files allowed
+
+    :rtype: Response
+    :return: Flask response
+    """
+    log_handled_error('too_many_files', "Request contains more than [%s] files", maximum_files)
+    return template_response('main.too_many_files', HTTPStatus.BAD_REQUEST, id=uuid4(), maximum_files=maximum_files)
+
+
+def error_response_file_too_large(maximum_size: int, filename: str) -> Response:
+    """
+    Creates an error response for a file input in a request that is larger than allowed
+
+    The error is logged and reported to Sentry, as it is handled by this API.
+
+    :type maximum_size: int
+    :param maximum_size: Maximum size of each file (in bytes)
+
+    :type filename: str
+    :param filename: Name of the file that is too large
+
+    :rtype: Response
+    :return: Flask response
+    """
+    log_handled_error('file_too_large', "File size is greater than [%s] bytes", maximum_size)
+    return template_response(
+        'main.file_too_large',
+        HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+        id=uuid4(),
+        maximum_size=maximum_size,
+        filename=filename
+    )
+
+
+def error_response_files_too_large(maximum_size: int) -> Response:
+    """
+    Creates an error response for file inputs in a request that are larger than allowed in total
+
+    The error is logged and reported to Sentry, as it is handled by this API.
+
+    :type maximum_size: int
+    :param maximum_size: Maximum total size of all files (in bytes)
+
+    :rtype: Response
+    :return: Flask response
+    """
+    log_handled_error('files_too_large', "Total size of files is greater than [%s] bytes", maximum_size)
+    return template_response(
+        'main.files_too_large',
+        HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+        id=uuid4(),
+        maximum_size=maximum_size
+    )
+
+
+def error_response_multipart_limit(limit: str, maximum: Optional[int]) -> Response:
+    """
+    Creates an error response for a multipart/form-data request body that exceeds a limit on its parts
+
+    The error is logged and reported to Sentry, as it is handled by this API.
+
+    :type limit: str
+    :param limit: Name of the limit exceeded (e.g. 'parts')
+
+    :type maximum: Optional[int]
+    :param maximum: Maximum value allowed for the limit, or None if not known
+
+    :rtype: Response
+    :return: Flask response
+    """
+    log_handled_error('multipart_limit', "Multipart request exceeds [%s] limit of [%s]", limit, maximum)
+    return template_response(
+        'main.multipart_limit',
+        HTTPStatus.BAD_REQUEST,
+        id=uuid4(),
+        limit=limit,
+        maximum=maximum
+    )
+
+
+def error_response_upload_storage_full(maximum_size: int) -> Response:
+    """
+    Creates an error response for a request whose files would exceed the temporary storage available for uploads
+
+    The error is logged and reported to Sentry, as it is handled by this API.
+
+    :type maximum_size: int
+    :param maximum_size: Maximum size of files spooled to disk (in bytes)
+
+    :rtype: Response
+    :return: Flask response
+    """
+    log_handled_error('upload_storage_full', "Files spooled to disk would exceed [%s] bytes", maximum_size)
+    return template_response('main.upload_storage_full', HTTPStatus.SERVICE_UNAVAILABLE, id=uuid4())
+
+
+def register_error_templates(templates: ResponseTemplates) -> None:
+    """
+    Registers response templates for errors, which are the same for each request other than their ID and any meta data
+
+    :type templates: ResponseTemplates
+    :param templates: Response templates extension
+    """
+    templates.register('main.no_file', error_template(error_no_file(slot('field'))))
+    templates.register('main.no_file_selection', error_template(error_no_file_selection(slot('field'))))
+    templates.register('main.wrong_mime_type', error_template(
+        error_wrong_mime_type(slot('valid_mime_types'), slot('invalid_mime_type'))
+    ))
+    templates.register('main.too_many_files', error_template(error_too_many_files(slot('maximum_files'))))
+    templates.register('main.file_too_large', error_template(
+        error_file_too_large(slot('maximum_size'), slot('filename'))
+    ))
+    templates.register('main.files_too_large', error_template(error_files_too_large(slot('maximum_size'))))
+    templates.register('main.multipart_limit', error_template(error_multipart_limit(slot('limit'), slot('maximum'))))
+    templates.register('main.upload_storage_full', error_template(error_upload_storage_full()))
@@ -0,0 +1,349 @@
+from typing import Callable, Iterator, Optional
+
+from werkzeug.http import parse_options_header
+
+DEFAULT_CHUNK_SIZE = 64 * 1024  # 64KB
+MAX_PART_HEADER_SIZE = 16 * 1024  # 16KB
+# RFC 2046 limits boundaries to 70 characters, but some clients (e.g. Werkzeug's test client) use longer boundaries,
+# which are accepted by Werkzeug's own parser (i.e. `request.files`)
+MAX_BOUNDARY_LENGTH = 200
+
+
+class MultipartError(ValueError):
+    """
+    Raised when a multipart/form-data request body is malformed
+    """
+    pass
+
+
+class MultipartTooLargeError(MultipartError):
+    """
+    Raised when a multipart/form-data request body exceeds the maximum size allowed
+
+    :type limit: int
+    :param limit: maximum request body size allowed (in bytes)
+
+    :type size: int
+    :param size: number of bytes read from the request body when the limit was exceeded
+    """
+
+    def __init__(self, limit: int, size: int):
+        super().__init__(f"Request body exceeds maximum size of [{ limit }] bytes")
+        self.limit = limit
+        self.size = size
+
+
+class MultipartPartTooLargeError(MultipartError):
+    """
+    Raised when the content of a part within a multipart/form-data request body exceeds the maximum size allowed
+
+    :type limit: int
+    :param limit: maximum part size allowed (in bytes)
+
+    :type size: int
+    :param size: number of bytes read from the part when the limit was exceeded
+    """
+
+    def __init__(self, limit: int, size: int):
+        super().__init__(f"Multipart part exceeds maximum size of [{ limit }] bytes")
+        self.limit = limit
+        self.size = size
+
+
+class MultipartLimitError(MultipartError):
+    """
+    Raised when a multipart/form-data request body exceeds a limit on its structure (rather than its overall size)
+
+    Limits bound the work needed to parse a request body, which depends on the number and shape of its parts, as well as
+    its size (e.g. many tiny parts cost far more to parse than a single large part).
+
+    :type limit: str
+    :param limit: name of the limit exceeded ('parts', 'part_header_size', 'field_size' or 'filename_length')
+
+    :type maximum: int
+    :param maximum: maximum value allowed for the limit
+    """
+
+    def __init__(self, limit: str, maximum: int):
+        super().__init__(f"Multipart body exceeds [{ limit }] limit of [{ maximum }]")
+        self.limit = limit
+        self.maximum = maximum
+
+
+def get_multipart_boundary(content_type: Optional[str]) -> Optional[bytes]:
+    """
+    Gets the boundary used to separate parts in a multipart/form-data request body
+
+    :type content_type: Optional[str]
+    :param content_type: value of the Content-Type request header, may be null
+
+    :rtype: Optional[bytes]
+    :return: boundary, or None if the request isn't a (valid) multipart/form-data request
+    """
+    mimetype, options = parse_options_header(content_type)
+    if mimetype != 'multipart/form-data':
+        return None
+
+    boundary = options.get('boundary')
+    if not boundary or len(boundary) > MAX_BOUNDARY_LENGTH:
+        return None
+
+    try:
+        return boundary.encode('latin-1')
+    except UnicodeEncodeError:
+        return None
+
+
+class MultipartPart(object):
+    """
+    A single part within a multipart/form-data request body
+
+    Part headers are parsed when the part is reached, its content is read on demand from the underlying reader. Content
+    that isn't read is discarded when moving to the next part.
+    """
+
+    def __init__(self, reader: 'MultipartReader', headers: dict):
+        self._reader = reader
+        self.headers = headers
+        self.finished = False
+        self.size = 0
+
+        _disposition, disposition_options = parse_options_header(headers.get('content-disposition'))
+        self.name = disposition_options.get('name')  # type: Optional[str]
+        self.filename = disposition_options.get('filename')  # type: Optional[str]
+        self.content_type = headers.get('content-type')  # type: Optional[str]
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        Reads content from this part
+
+        :type size: int
+        :param size: maximum number of bytes to return, or -1 to read until the end of the part
+
+        :rtype: bytes
+        :return: part content, empty once the end of the part is reached
+        """
+        return self._reader.read_part(self, size)
+
+    def readinto(self, buffer) -> int:
+        """
+        Reads content from this part into an existing buffer, avoiding allocating a new bytes object for each read
+
+        :param buffer: writable buffer (e.g. a `bytearray` or `memoryview`)
+
+        :rtype: int
+        :return: number of bytes read, 0 once the end of the part is reached
+        """
+        return self._reader.readinto_part(self, buffer)
+
+    def drain(self, limit: Optional[int] = None) -> int:
+        """
+        Discards any unread content in this part without buffering it
+
+        If a limit is given, the size of the part is checked as its content is discarded, stopping as soon as the limit
+        is exceeded (i.e. within a chunk of the limit), rather than at the end of the part.
+
+        :type limit: Optional[int]
+        :param limit: maximum size of this part's content (in bytes)
+
+        :rtype: int
+        :return: total size of this part's content (in bytes)
+        """
+        self._reader.drain_part(self, limit)
+        return self.size
+
+
+class MultipartReader(object):
+    """
+    Incremental multipart/form-data parser
+
+    Reads a request body in fixed size chunks, yielding parts as their headers arrive. Part content is only copied when
+    explicitly read, otherwise it is discarded as the body is consumed. The amount of memory used is therefore bounded
+    by the chunk size, regardless of the size of the request or its files, and nothing is written to temporary files.
+
+    Parts must be consumed in order. Any content not read from a part is discarded when iterating to the next part.
+
+    If a limit is given, the number of bytes read from the request body is checked as each chunk is read, regardless of
+    any declared content length (e.g. for chunked requests). Reading stops as soon as the limit is exceeded.
+
+    Optional limits on the number of parts, the size of each part's headers, the size of form fields (parts without a
+    filename) and the length of filenames are checked as each part is parsed, raising a `MultipartLimitError`.
+    """
+
+    def __init__(
+        self,
+        stream,
+        boundary: bytes,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        limit: Optional[int] = None,
+        max_parts: Optional[int] = None,
+        max_part_header_size: int = MAX_PART_HEADER_SIZE,
+        max_field_size: Optional[int] = None,
+        max_filename_length: Optional[int] = None
+    ):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._limit = limit
+        self._max_parts = max_parts
+        self._max_part_header_size = max_part_header_size
+        self._max_field_size = max_field_size
+        self._max_filename_length = max_filename_length
+        self.parts_count = 0
+        self._delimiter = b'\r\n--' + boundary
+        # Content that may be the start of a delimiter split across chunks must be kept until the next chunk is read
+        self._keep = len(self._delimiter) - 1
+        # The first delimiter isn't preceded by a line break, adding one allows all delimiters to be found the same way
+        self._buffer = bytearray(b'\r\n')
+        self._eof = False
+        self.bytes_read = 0
+
+    def __iter__(self) -> Iterator[MultipartPart]:
+        self._skip_preamble()
+
+        while True:
+            # A delimiter is followed by '--' for the final part, or a line break (allowing for transport padding)
+            line = self._read_line()
+            if line.startswith(b'--'):
+                self.discard()
+                return
+            if line.strip(b' \t') != b'':
+                raise MultipartError('Invalid multipart boundary')
+
+            self.parts_count += 1
+            if self._max_parts is not None and self.parts_count > self._max_parts:
+                raise MultipartLimitError('parts', self._max_parts)
+
+            part = MultipartPart(self, self._read_headers())
+            filename_length = len(part.filename) if part.filename is not None else 0
+            if self._max_filename_length is not None and filename_length > self._max_filename_length:
+                raise MultipartLimitError('filename_length', self._max_filename_length)
+            yield part
+            self.drain_part(part)
+
+    def discard(self) -> int:
+        """
+        Reads and discards the rest of the request body without parsing it
+
+        :rtype: int
+        :return: total number of bytes read from the request body
+        """
+        self._buffer.clear()
+        while self._fill():
+            self._buffer.clear()
+
+        return self.bytes_read
+
+    def read_part(self, part: MultipartPart, size: int = -1) -> bytes:
+        if size >= 0:
+            data = bytearray()
+            self._consume(part, size, data.extend)
+            return bytes(data)
+
+        data = bytearray()
+        while not part.finished:
+            self._consume(part, -1, data.extend)
+        return bytes(data)
+
+    def readinto_part(self, part: MultipartPart, buffer) -> int:
+        target = memoryview(buffer).cast('B')
+
+        def copy(data: memoryview) -> None:
+            target[:len(data)] = data
+
+        return self._consume(part, len(target), copy)
+
+    def drain_part(self, part: MultipartPart, limit: Optional[int] = None) -> None:
+        while not part.finished:
+            self._consume(part, -1)
+            if limit is not None and part.size > limit:
+                raise MultipartPartTooLargeError(limit, part.size)
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+
+        read_size = self._chunk_size
+        if self._limit is not None:
+            # read at most one byte past the limit so it's known to be exceeded without reading more than needed
+            read_size = max(min(read_size, self._limit - self.bytes_read + 1), 1)
+
+        chunk = self._stream.read(read_size)
+        if not chunk:
+            self._eof = True
+            return False
+
+        self.bytes_read += len(chunk)
+        if self._limit is not None and self.bytes_read > self._limit:
+            raise MultipartTooLargeError(self._limit, self.bytes_read)
+        self._buffer += chunk
+        return True
+
+    def _consume(self, part: MultipartPart, size: int, sink: Optional[Callable[[memoryview], None]] = None) -> int:
+        # Content is passed to the sink as a view of the buffer, rather than a copy, which is only valid during the call
+        if part.finished:
+            return 0
+
+        while True:
+            index = self._buffer.find(self._delimiter)
+            end = index if index >= 0 else len(self._buffer) - self._keep
+            if 0 <= size < end:
+                end = size
+
+            finished = index >= 0 and end == index
+            if end > 0 or finished:
+                if sink is not None and end > 0:
+                    with memoryview(self._buffer) as view, view[:end] as data:
+                        sink(data)
+                del self._buffer[:end]
+                part.size += end
+                if self._max_field_size is not None and part.filename is None and part.size > self._max_field_size:
+                    raise MultipartLimitError('field_size', self._max_field_size)
+                if finished:
+                    del self._buffer[:len(self._delimiter)]
+                    part.finished = True
+                return end
+
+            if not self._fill():
+                raise MultipartError('Unexpected end of multipart body')
+
+    def _skip_preamble(self) -> None:
+        while True:
+            index = self._buffer.find(self._delimiter)
+            if index >= 0:
+                del self._buffer[:index + len(self._delimiter)]
+                return
+
+            del self._buffer[:-self._keep]
+            if not self._fill():
+                raise MultipartError('Missing multipart boundary')
+
+    def _read_line(self) -> bytes:
+        while True:
+            index = self._buffer.find(b'\r\n')
+            if index >= 0:
+                line = bytes(self._buffer[:index])
+                del self._buffer[:index + 2]
+                return line
+
+            if len(self._buffer) > self._max_part_header_size:
+                raise MultipartLimitError('part_header_size', self._max_part_header_size)
+            if not self._fill():
+                raise MultipartError('Unexpected end of multipart body')
+
+    def _read_headers(self) -> dict:
+        headers = {}
+        headers_size = 0
+
+        while True:
+            line = self._read_line()
+            if line == b'':
+                return headers
+
+            headers_size += len(line) + 2
+            if headers_size > self._max_part_header_size:
+                raise MultipartLimitError('part_header_size', self._max_part_header_size)
+
+            name, separator, value = line.decode('utf-8', 'replace').partition(':')
+            if not separator:
+                raise MultipartError('Invalid multipart part header')
+            headers[name.strip().lower()] = value.strip()
@@ -0,0 +1,50 @@
+import re
+
+from typing import Optional
+
+SNIFF_SIZE = 256  # bytes
+
+# Signatures (magic numbers) for common file types, checked against the start of a file. Signatures are combined into
+# a single pattern when this module is loaded so a file can be identified in a single pass of its first few bytes.
+_SIGNATURES = [
+    (rb'\xff\xd8\xff', 'image/jpeg'),
+    (rb'\x89PNG\r\n\x1a\n', 'image/png'),
+    (rb'GIF8[79]a', 'image/gif'),
+    (rb'RIFF.{4}WEBP', 'image/webp'),
+    (rb'II\*\x00|MM\x00\*', 'image/tiff'),
+    (rb'BM', 'image/bmp'),
+    (rb'.{4}ftyp(?:heic|heix|mif1)', 'image/heic'),
+    (rb'.{4}ftyp(?:isom|iso2|mp41|mp42|avc1)', 'video/mp4'),
+    (rb'%PDF-', 'application/pdf'),
+    (rb'PK(?:\x03\x04|\x05\x06|\x07\x08)', 'application/zip'),
+    (rb'\x1f\x8b', 'application/gzip'),
+    (rb'7z\xbc\xaf\x27\x1c', 'application/x-7z-compressed'),
+    (rb'Rar!\x1a\x07', 'application/vnd.rar')
+]
+_SIGNATURES_PATTERN = re.compile(b'|'.join(b'(' + signature + b')' for signature, _ in _SIGNATURES), re.DOTALL)
+_SIGNATURES_MIME_TYPES = [mime_type for _, mime_type in _SIGNATURES]
+
+
+def sniff_mime_type(file) -> Optional[str]:
+    """
+    Identifies the MIME type of a file from its contents, rather than trusting the type given by the client
+
+    Only the first few bytes of the file are read, regardless of its size. The file is not rewound afterwards.
+
+    :param file: file like object (e.g. a multipart part or FileStorage) to read from
+
+    :rtype: Optional[str]
+    :return: MIME type, or None if the file type isn't recognised
+    """
+    prefix = b''
+    while len(prefix) < SNIFF_SIZE:
+        data = file.read(SNIFF_SIZE - len(prefix))
+        if not data:
+            break
+        prefix += data
+
+    match = _SIGNATURES_PATTERN.match(prefix)
+    if match is None:
+        return None
+
+    return _SIGNATURES_MIME_TYPES[match.lastindex - 1]
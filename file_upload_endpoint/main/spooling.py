@@ -0,0 +1,220 @@
+import mmap
+import multiprocessing
+import struct
+
+from tempfile import SpooledTemporaryFile
+from typing import IO, List, Optional
+
+from flask import Flask as App, Request, abort, current_app, request
+
+from file_upload_endpoint.main.errors import error_response_upload_storage_full
+
+# Budget for files spooled to disk (in bytes), set by servers which spool request bodies using the `UploadSpool`
+# extension (see `asgi`) when receiving a request body would exceed it
+SPOOL_FULL_ENVIRON_KEY = 'file_upload_endpoint.upload_spool.full'
+
+
+class UploadSpoolFullError(Exception):
+    """
+    Raised when writing to a spooled file would exceed the budget for files spooled to disk
+    """
+
+    def __init__(self, max_disk_size: int):
+        super().__init__(f"Files spooled to disk would exceed the budget of [{ max_disk_size }] bytes")
+        self.max_disk_size = max_disk_size
+
+
+class SpooledUploadFile(SpooledTemporaryFile):
+    """
+    Temporary file an uploaded file is spooled to, in memory until it exceeds a threshold, then on disk
+
+    Bytes written are counted by the `UploadSpool` the file belongs to, before they are written, so writes that would
+    exceed the budget for files spooled to disk are refused. Counted bytes are released when the file is closed (which
+    may happen more than once).
+
+    :type spool: UploadSpool
+    :param spool: upload spool counting bytes written to this file
+    """
+
+    def __init__(self, spool: 'UploadSpool'):
+        super().__init__(max_size=spool.max_memory_size, mode='rb+', dir=spool.directory)
+        self.spool = spool
+        self.size = 0
+        self.spilled = False
+        self._released = False
+
+    def write(self, s: bytes) -> int:
+        size = self.size + len(s)
+        # matches when `SpooledTemporaryFile` rolls over to disk, as files are only written sequentially
+        spill = not self.spilled and size > self.spool.max_memory_size
+        if self.spilled:
+            disk_bytes = len(s)
+        elif spill:
+            disk_bytes = size
+        else:
+            disk_bytes = 0
+
+        self.spool.reserve(len(s), disk_bytes, spill)
+        written = super().write(s)
+        self.size = size
+        self.spilled = self.spilled or spill
+        return written
+
+    def close(self) -> None:
+        if not self._released:
+            self._released = True
+            self.spool.release(self.size, self.size if self.spilled else 0)
+        super().close()
+
+
+class SpoolingRequest(Request):
+    """
+    Flask request class, spooling uploaded files parsed into `FileStorage` objects using the `UploadSpool` extension
+
+    Spooled files are closed when the request ends, including files the form parser discarded because parsing failed
+    (e.g. as the budget for files spooled to disk was exceeded).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.spooled_files: List[SpooledUploadFile] = []
+
+    def _get_file_stream(
+        self,
+        total_content_length: Optional[int],
+        content_type: Optional[str],
+        filename: Optional[str] = None,
+        content_length: Optional[int] = None
+    ) -> IO[bytes]:
+        file = current_app.extensions['upload_spool'].create_file()
+        self.spooled_files.append(file)
+        return file
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            for file in self.spooled_files:
+                file.close()
+
+
+class UploadSpool(object):
+    """
+    Flask extension for spooling uploaded files when they are parsed into `FileStorage` objects (i.e. `request.files`)
+
+    By default, Werkzeug spools each file in memory up to 500KB, then to a temporary file in the system temporary
+    directory, which within containers is often a slow overlay filesystem. Instead, each file is held in memory up to
+    `max_memory_size` bytes, then spooled to a temporary file in `directory` (e.g. a tmpfs mount).
+
+    The size of files spooled to disk by all worker processes is limited to `max_disk_size` bytes, counted in shared
+    memory. This extension must be created before worker processes are started (forked), so that they share the same
+    count. Writes that would exceed this budget raise an `UploadSpoolFullError`.
+
+    Where metrics are enabled, files spooled to disk (spills) and the peak number of bytes spooled at once, in memory
+    and on disk, are recorded.
+
+    Servers receiving request bodies before calling the application (e.g. the ASGI adapter) can also spool them using
+    this extension. Requests whose body would exceed the budget (see `SPOOL_FULL_ENVIRON_KEY`) are answered with an
+    error before they are handled.
+
+    :type app: App
+    :param app: Flask application
+
+    :type max_memory_size: int
+    :param max_memory_size: size each file is held in memory up to, before it is spooled to disk (in bytes), at least 1
+
+    :type directory: Optional[str]
+    :param directory: directory for temporary files, or None for the system temporary directory
+
+    :type max_disk_size: Optional[int]
+    :param max_disk_size: maximum size of all files spooled to disk at once (in bytes), or None for no limit
+    """
+
+    # bytes spooled (in memory and on disk), bytes spooled on disk
+    RECORD = struct.Struct('<qq')
+
+    def __init__(
+        self,
+        app: App,
+        max_memory_size: int = 500 * 1024,
+        directory: Optional[str] = None,
+        max_disk_size: Optional[int] = None
+    ):
+        # a `SpooledTemporaryFile` with a maximum size of 0 is never moved to disk, so files would be held in memory
+        if max_memory_size < 1:
+            raise ValueError(f"Maximum memory size [{ max_memory_size }] is not supported, use at least 1 byte")
+
+        self.flask_app = app
+        self.max_memory_size = max_memory_size
+        self.directory = directory
+        self.max_disk_size = max_disk_size
+
+        self._usage = mmap.mmap(-1, self.RECORD.size)
+        self._lock = multiprocessing.Lock()
+
+        app.request_class = SpoolingRequest
+        app.before_request(self._before_request)
+        app.extensions['upload_spool'] = self
+
+    def create_file(self) -> SpooledUploadFile:
+        """
+        Creates a temporary file to spool an uploaded file to
+
+        :rtype: SpooledUploadFile
+        :return: temporary file
+        """
+        return SpooledUploadFile(self)
+
+    def usage(self) -> tuple:
+        """
+        Gets the number of bytes currently spooled by all worker processes
+
+        :rtype: tuple
+        :return: bytes spooled (in memory and on disk), and bytes spooled on disk
+        """
+        with self._lock:
+            return self.RECORD.unpack_from(self._usage)
+
+    def reserve(self, size: int, disk_size: int, spill: bool = False) -> None:
+        """
+        Counts bytes about to be written to a spooled file
+
+        :type size: int
+        :param size: bytes to be written
+
+        :type disk_size: int
+        :param disk_size: bytes to be written to disk, including any bytes moved from memory when a file spills
+
+        :type spill: bool
+        :param spill: whether the file is about to be moved from memory to disk
+        """
+        with self._lock:
+            spooled, spooled_disk = self.RECORD.unpack_from(self._usage)
+            if self.max_disk_size is not None and disk_size and spooled_disk + disk_size > self.max_disk_size:
+                raise UploadSpoolFullError(self.max_disk_size)
+            spooled += size
+            spooled_disk += disk_size
+            self.RECORD.pack_into(self._usage, 0, spooled, spooled_disk)
+
+        metrics = self.flask_app.extensions.get('metrics')
+        if metrics is not None:
+            metrics.record_spooled_bytes(spooled - spooled_disk, spooled_disk, spill=spill)
+
+    def release(self, size: int, disk_size: int) -> None:
+        """
+        Releases bytes counted for a spooled file, once it is closed
+
+        :type size: int
+        :param size: bytes written to the file
+
+        :type disk_size: int
+        :param disk_size: bytes written to the file on disk
+        """
+        with self._lock:
+            spooled, spooled_disk = self.RECORD.unpack_from(self._usage)
+            self.RECORD.pack_into(self._usage, 0, spooled - size, spooled_disk - disk_size)
+
+    def _before_request(self) -> None:
+        max_disk_size = request.environ.get(SPOOL_FULL_ENVIRON_KEY)
+        if max_disk_size is not None:
+            abort(error_response_upload_storage_full(max_disk_size))
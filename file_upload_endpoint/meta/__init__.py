@@ -1,13 +1,22 @@
 from http import HTTPStatus
 
-from cerberus import Validator
 from flask import Blueprint, abort, current_app as app, jsonify, make_response
 
 from file_upload_endpoint.meta.errors import error_request_validation
-from file_upload_endpoint.meta.utils import get_cerberus_schema
+from file_upload_endpoint.meta.utils import validation_schemas
+from file_upload_endpoint.metrics import CONTENT_TYPE
 
 meta = Blueprint('meta', __name__)
 
+logging_entry_schema = validation_schemas.register('meta.meta_logging_entry', {
+    'logging_level': {
+        'type': 'string',
+        'request_type': 'parameter',
+        'required': True,
+        'allowed': ['debug', 'info', 'warning', 'error', 'critical']
+    }
+})
+
 
 @meta.route('/meta/health/canary', methods=['get', 'options'])
 def meta_healthcheck_canary():
@@ -19,6 +28,20 @@ def meta_healthcheck_canary():
     return '', HTTPStatus.NO_CONTENT
 
 
+@meta.route('/meta/metrics')
+def meta_metrics():
+    """
+    Returns request metrics in the Prometheus text exposition format
+
+    Where metrics are disabled, a not found error is returned.
+    """
+    metrics = app.extensions.get('metrics')
+    if metrics is None:
+        abort(HTTPStatus.NOT_FOUND)
+
+    return app.response_class(metrics.render(), status=HTTPStatus.OK, content_type=CONTENT_TYPE)
+
+
 @meta.route('/meta/errors/generic-bad-request')
 def meta_errors_generic_bad_request():
     """
@@ -47,18 +70,10 @@ def meta_logging_entry(logging_level: str):
     """
 
     # Validate request
-    logging_entry_schema = {
-        'logging_level': {
-            'type': 'string',
-            'request_type': 'parameter',
-            'required': True,
-            'allowed': ['debug', 'info', 'warning', 'error', 'critical']
-        }
-    }
     logging_entry_document = {'logging_level': logging_level}
-    validator = Validator(get_cerberus_schema(logging_entry_schema))
+    validator = logging_entry_schema.get_validator()
     if not validator.validate(logging_entry_document):
-        payload = {'errors': error_request_validation(validator, logging_entry_schema)}
+        payload = {'errors': error_request_validation(validator, logging_entry_schema.schema)}
         abort(make_response(jsonify(payload), HTTPStatus.BAD_REQUEST))
 
     # Log message
@@ -1,10 +1,16 @@
 from http import HTTPStatus
+from typing import TYPE_CHECKING
 from uuid import uuid4
 
-import sentry_sdk
-from cerberus import Validator
-from cerberus.errors import ValidationError  # noqa: F401
-from flask import request, make_response, jsonify, current_app as app
+from flask import Response, request
+
+from file_upload_endpoint.meta.responses import ResponseTemplates, error_template, slot, template_response
+from file_upload_endpoint.reporting import log_handled_error
+
+if TYPE_CHECKING:
+    # Cerberus is imported when a request is first validated (see `CompiledSchema`)
+    from cerberus import Validator
+    from cerberus.errors import ValidationError  # noqa: F401
 
 
 def error_generic_bad_request() -> dict:
@@ -65,15 +71,6 @@ def error_too_large(maximum_size: int, request_size: int) -> dict:
     :rtype: dict
     :return: Complete JSON-API compatible error object
     """
-    log_message = f"Request content length, [{ request_size }], is too great"
-    app.logger.warning(log_message)
-
-    # As the API handles this error through this error message, it is not reported to Sentry.
-    # However, because it's useful for tracking, we want report it anyway.
-    with sentry_sdk.push_scope() as scope:
-        scope.set_extra('debug', False)
-        sentry_sdk.capture_message(log_message)
-
     return {
         'id': uuid4(),
         'status': HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
@@ -87,7 +84,90 @@ def error_too_large(maximum_size: int, request_size: int) -> dict:
     }
 
 
-def error_request_validation(validator: Validator, schema: dict) -> list:
+def error_overloaded(retry_after: int) -> dict:
+    """
+    Creates an error for a request refused because too many uploads are in progress
+
+    :type retry_after: int
+    :param retry_after: Time after which the request may be retried (in seconds)
+
+    :rtype: dict
+    :return: Complete JSON-API compatible error object
+    """
+    return {
+        'id': uuid4(),
+        'status': HTTPStatus.SERVICE_UNAVAILABLE,
+        'title': 'Server is at capacity for uploads',
+        'detail': 'Too many uploads are in progress, try again after the time given in the Retry-After header',
+        'meta': {
+            'retry_after': retry_after,
+            'retry_after_units': 'seconds'
+        }
+    }
+
+
+def error_rate_limited(retry_after: int) -> dict:
+    """
+    Creates an error for a request refused because a client has made too many requests
+
+    :type retry_after: int
+    :param retry_after: Time after which the request may be retried (in seconds)
+
+    :rtype: dict
+    :return: Complete JSON-API compatible error object
+    """
+    return {
+        'id': uuid4(),
+        'status': HTTPStatus.TOO_MANY_REQUESTS,
+        'title': 'Too many requests',
+        'detail': 'Request rate limit exceeded, try again after the time given in the Retry-After header',
+        'meta': {
+            'retry_after': retry_after,
+            'retry_after_units': 'seconds'
+        }
+    }
+
+
+def error_response_too_large(maximum_size: int, request_size: int) -> Response:
+    """
+    Creates a 'request too big' error response
+
+    The error is logged and reported to Sentry, as it is handled by this API.
+
+    :type maximum_size: int
+    :param maximum_size: Maximum content length (in bytes)
+
+    :type request_size: int
+    :param request_size: Content length of request (in bytes)
+
+    :rtype: Response
+    :return: Flask response
+    """
+    log_handled_error('too_large', "Request content length, [%s], is too great", request_size)
+
+    return template_response(
+        'meta.too_large',
+        HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+        id=uuid4(),
+        maximum_size=maximum_size,
+        request_size=request_size
+    )
+
+
+def register_error_templates(templates: ResponseTemplates) -> None:
+    """
+    Registers response templates for errors, which are the same for each request other than their ID and any meta data
+
+    :type templates: ResponseTemplates
+    :param templates: Response templates extension
+    """
+    templates.register('meta.generic_bad_request', error_template(error_generic_bad_request()))
+    templates.register('meta.generic_not_found', error_template(error_generic_not_found()))
+    templates.register('meta.generic_internal_server_error', error_template(error_generic_internal_server_error()))
+    templates.register('meta.too_large', error_template(error_too_large(slot('maximum_size'), slot('request_size'))))
+
+
+def error_request_validation(validator: 'Validator', schema: dict) -> list:
     """
     Generates errors for each invalid field in a validation schema
 
@@ -154,8 +234,7 @@ def error_handler_generic_bad_request(e: Exception):
 
     :return: Flask response
     """
-    payload = {'errors': [error_generic_bad_request()]}
-    return make_response(jsonify(payload), HTTPStatus.BAD_REQUEST)
+    return template_response('meta.generic_bad_request', HTTPStatus.BAD_REQUEST, id=uuid4())
 
 
 # noinspection PyUnusedLocal
@@ -168,8 +247,7 @@ def error_handler_generic_not_found(e: Exception):
 
     :return: Flask response
     """
-    payload = {'errors': [error_generic_not_found()]}
-    return make_response(jsonify(payload), HTTPStatus.NOT_FOUND)
+    return template_response('meta.generic_not_found', HTTPStatus.NOT_FOUND, id=uuid4())
 
 
 # noinspection PyUnusedLocal
@@ -182,8 +260,7 @@ def error_handler_generic_internal_server_error(e: Exception):
 
     :return: Flask response
     """
-    payload = {'errors': [error_generic_internal_server_error()]}
-    return make_response(jsonify(payload), HTTPStatus.INTERNAL_SERVER_ERROR)
+    return template_response('meta.generic_internal_server_error', HTTPStatus.INTERNAL_SERVER_ERROR, id=uuid4())
 
 
 # noinspection PyUnusedLocal
@@ -197,6 +274,6 @@ def error_handler_request_entity_too_large(e: Exception):
     :return: Flask response
     """
     content_length = request.content_length
-    upload_limit = app.config['MAX_CONTENT_LENGTH']
-    payload = {'errors': [error_too_large(upload_limit, content_length)]}
-    return make_response(jsonify(payload), HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+    # the maximum content length of this request, which may be a route specific limit
+    upload_limit = request.max_content_length
+    return error_response_too_large(upload_limit, content_length)
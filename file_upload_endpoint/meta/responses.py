@@ -0,0 +1,136 @@
+import json
+import re
+
+from hashlib import sha256
+from typing import Dict
+
+from flask import Flask as App, Response, current_app, request
+
+_SLOT_PATTERN = re.compile(r'"__slot_(\w+)__"|__slot_(\w+)__')
+
+
+def slot(name: str) -> str:
+    """
+    Creates a placeholder for a value that varies each time a template is rendered
+
+    Placeholders can be used as values (e.g. an error ID) or within strings (e.g. a field name within a title).
+
+    :type name: str
+    :param name: name of the slot
+
+    :rtype: str
+    :return: placeholder
+    """
+    return f"__slot_{ name }__"
+
+
+class JSONTemplate(object):
+    """
+    A JSON document serialised once, with placeholders (slots) for values that vary each time it is used
+
+    When rendered, slots are replaced with the JSON representation of their values and joined with the static parts of
+    the document, which are not serialised again. Documents without slots are rendered as constant bytes.
+    """
+
+    def __init__(self, document: dict):
+        serialised = json.dumps(document, sort_keys=True, separators=(',', ':'), default=str)
+
+        self._parts = []
+        self._slots = []
+        position = 0
+        for match in _SLOT_PATTERN.finditer(serialised):
+            self._parts.append(serialised[position:match.start()])
+            # a slot in quotes is a complete value, otherwise it's within a string so its value needs to be escaped
+            self._slots.append((match.group(1) or match.group(2), match.group(1) is None))
+            position = match.end()
+        self._parts.append(serialised[position:])
+
+        self.static = None
+        self.etag = None
+        if not self._slots:
+            self.static = self._parts[0].encode()
+            self.etag = sha256(self.static).hexdigest()
+
+    def render(self, **values) -> bytes:
+        """
+        Renders the template with values for each slot
+
+        :rtype: bytes
+        :return: JSON document
+        """
+        if self.static is not None:
+            return self.static
+
+        rendered = [self._parts[0]]
+        for (name, in_string), part in zip(self._slots, self._parts[1:]):
+            if in_string:
+                rendered.append(json.dumps(str(values[name]))[1:-1])
+            else:
+                rendered.append(json.dumps(values[name], default=str))
+            rendered.append(part)
+
+        return ''.join(rendered).encode()
+
+
+def error_template(error: dict) -> dict:
+    """
+    Creates a template document for a JSON-API error, using a slot for the error's ID
+
+    :type error: dict
+    :param error: JSON-API error object
+
+    :rtype: dict
+    :return: JSON-API errors document
+    """
+    error['id'] = slot('id')
+    return {'errors': [error]}
+
+
+class ResponseTemplates(object):
+    """
+    Flask extension for JSON responses serialised when the application is created, rather than for each request
+
+    Templates are registered by name and rendered using `template_response()`.
+    """
+
+    def __init__(self, app: App):
+        self.templates: Dict[str, JSONTemplate] = {}
+        app.extensions['response_templates'] = self
+
+    def register(self, name: str, document: dict) -> None:
+        """
+        Registers a JSON document as a template
+
+        :type name: str
+        :param name: name of the template
+
+        :type document: dict
+        :param document: JSON document, using placeholders from `slot()` for values that vary
+        """
+        self.templates[name] = JSONTemplate(document)
+
+
+def template_response(name: str, status: int, **values) -> Response:
+    """
+    Creates a JSON response from a registered template
+
+    For templates without slots, a strong ETag is set and a '304 Not Modified' response returned if the client already
+    has the same response.
+
+    :type name: str
+    :param name: name of the template
+
+    :type status: int
+    :param status: HTTP status code
+
+    :rtype: Response
+    :return: Flask response
+    """
+    template = current_app.extensions['response_templates'].templates[name]
+    response = current_app.response_class(template.render(**values), status=status, mimetype='application/json')
+
+    if template.etag is not None:
+        response.set_etag(template.etag)
+        response = response.make_conditional(request)
+
+    return response
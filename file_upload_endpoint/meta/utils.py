@@ -1,4 +1,11 @@
+import threading
+
 from copy import deepcopy
+from typing import Dict
+
+from flask import current_app
+
+from file_upload_endpoint.meta.validators import FastValidator, compile_validate_function
 
 
 def get_cerberus_schema(schema: dict) -> dict:
@@ -29,3 +36,85 @@ def get_cerberus_schema(schema: dict) -> dict:
         del(cerberus_schema[field]['request_type'])
 
     return cerberus_schema
+
+
+class CompiledSchema(object):
+    """
+    An extended (application) validation schema, compiled for reuse across requests
+
+    The Cerberus compatible schema is generated once, when the schema is registered. Cerberus validators are created
+    once per thread (as they hold the state of the last validation), and reused for each request. As Cerberus validates
+    the schema itself when a validator is created, only the document needs to be validated for each request.
+
+    If the fast validation engine is enabled (`APP_ENABLE_FAST_VALIDATION`), a validation function generated from the
+    schema when it is registered is used instead of Cerberus. Schemas using rules that can't be compiled are always
+    validated using Cerberus.
+
+    To validate a document:
+
+    validator = schema.get_validator()
+    if not validator.validate(document):
+        payload = {'errors': error_request_validation(validator, schema.schema)}
+    """
+
+    def __init__(self, schema: dict):
+        self.schema = schema
+        self.cerberus_schema = get_cerberus_schema(schema)
+        self.validate_function = compile_validate_function(self.cerberus_schema)
+        self._validators = threading.local()
+
+    def get_validator(self):
+        """
+        Gets a validator for this schema, for use in the current thread
+
+        :rtype: Union[Validator, FastValidator]
+        :return: Cerberus validator, or a compatible validator using the fast validation engine if enabled
+        """
+        if self.validate_function is not None and current_app.config['APP_ENABLE_FAST_VALIDATION']:
+            validator = getattr(self._validators, 'fast_validator', None)
+            if validator is None:
+                validator = FastValidator(self.cerberus_schema, self.validate_function)
+                self._validators.fast_validator = validator
+            return validator
+
+        validator = getattr(self._validators, 'validator', None)
+        if validator is None:
+            # Cerberus is imported when first needed, rather than when the application starts
+            from cerberus import Validator
+
+            validator = Validator(self.cerberus_schema)
+            self._validators.validator = validator
+
+        return validator
+
+
+class SchemaRegistry(object):
+    """
+    Registry of compiled validation schemas, keyed by route (endpoint)
+    """
+
+    def __init__(self):
+        self._schemas: Dict[str, CompiledSchema] = {}
+
+    def register(self, endpoint: str, schema: dict) -> CompiledSchema:
+        """
+        Compiles and registers an extended (application) validation schema
+
+        :type endpoint: str
+        :param endpoint: Flask endpoint (e.g. 'meta.meta_logging_entry') the schema is used for
+
+        :type schema: dict
+        :param schema: Extended (application) validation schema
+
+        :rtype: CompiledSchema
+        :return: Compiled validation schema
+        """
+        compiled_schema = CompiledSchema(schema)
+        self._schemas[endpoint] = compiled_schema
+        return compiled_schema
+
+    def __getitem__(self, endpoint: str) -> CompiledSchema:
+        return self._schemas[endpoint]
+
+
+validation_schemas = SchemaRegistry()
@@ -0,0 +1,171 @@
+import re
+
+from collections.abc import Iterable, Mapping, Sequence
+from typing import Callable, Dict, List, Optional
+
+# Rules which can be compiled, any other rule means the schema is validated using Cerberus instead
+COMPILABLE_RULES = frozenset([
+    'type', 'required', 'nullable', 'allowed', 'min', 'max', 'minlength', 'maxlength', 'regex'
+])
+
+# Rules which compare values, and so need a type to be known for their behaviour to match Cerberus
+_TYPED_RULES = frozenset(['allowed', 'min', 'max'])
+
+# Normal rules are checked in alphabetical order, to match the order Cerberus sorts errors for a field in
+_NORMAL_RULES = ['allowed', 'max', 'maxlength', 'min', 'minlength', 'regex']
+
+_TYPE_CHECKS = {
+    'string': 'isinstance(value, str)',
+    'integer': 'isinstance(value, int)',
+    'float': 'isinstance(value, (int, float))',
+    'number': '(isinstance(value, (int, float)) and not isinstance(value, bool))',
+    'boolean': 'isinstance(value, bool)',
+    'dict': 'isinstance(value, Mapping)',
+    'list': '(isinstance(value, Sequence) and not isinstance(value, str))'
+}
+
+_SCALAR_TYPES = frozenset(['string', 'integer', 'float', 'number', 'boolean'])
+
+
+class FastValidationError(object):
+    """
+    Validation error, compatible with the Cerberus ValidationError properties used by `error_request_validation()`
+    """
+
+    __slots__ = ('field', 'rule', 'constraint', 'value')
+
+    def __init__(self, field: str, rule: str, constraint, value):
+        self.field = field
+        self.rule = rule
+        self.constraint = constraint
+        self.value = value
+
+
+class FastValidator(object):
+    """
+    Validator using a function compiled from a validation schema
+
+    Compatible with the Cerberus Validator properties used by `error_request_validation()`, so the same errors are
+    returned regardless of which is used. As with Cerberus validators, instances hold the state of the last validation
+    and should not be shared between threads.
+    """
+
+    def __init__(self, schema: dict, validate_function: Callable[[dict], Dict[str, List[FastValidationError]]]):
+        self.schema = schema
+        self.document_error_tree = {}  # type: Dict[str, List[FastValidationError]]
+        self._validate_function = validate_function
+        self._fields = frozenset(schema.keys())
+
+    def validate(self, document: dict) -> bool:
+        self.document_error_tree = self._validate_function(document)
+        # As with Cerberus, unknown fields are not allowed
+        return not self.document_error_tree and self._fields.issuperset(document.keys())
+
+
+def _compile_field(index: int, field: str, rules: dict, namespace: dict) -> Optional[List[str]]:
+    if not COMPILABLE_RULES.issuperset(rules.keys()):
+        return None
+
+    field_type = rules.get('type')
+    field_types = [field_type] if isinstance(field_type, str) else field_type
+    if field_types is not None and not set(field_types).issubset(_TYPE_CHECKS.keys()):
+        return None
+    if not _TYPED_RULES.isdisjoint(rules.keys()):
+        if field_types is None or not set(field_types).issubset(_SCALAR_TYPES):
+            return None
+
+    # Values from the schema are passed to the generated function as constants, rather than included in its source
+    field_name = f"field_{ index }"
+    namespace[field_name] = field
+    namespace[f"type_{ index }"] = field_type
+    namespace[f"allowed_{ index }"] = rules.get('allowed')
+    if 'allowed' in rules:
+        namespace[f"allowed_set_{ index }"] = frozenset(rules['allowed'])
+    for rule in ['min', 'max', 'minlength', 'maxlength']:
+        namespace[f"{ rule }_{ index }"] = rules.get(rule)
+    if 'regex' in rules:
+        # Cerberus requires the whole value matches a pattern
+        pattern = rules['regex'] if rules['regex'].endswith('$') else f"{ rules['regex'] }$"
+        namespace[f"regex_{ index }"] = rules['regex']
+        namespace[f"regex_match_{ index }"] = re.compile(pattern).match
+
+    lines = [
+        f"    if { field_name } in document:",
+        f"        value = document[{ field_name }]",
+        "        if value is None:",
+    ]
+    if rules.get('nullable', False):
+        lines.append("            pass")
+    else:
+        lines.append(f"            add({ field_name }, 'nullable', False, value)")
+
+    if field_types is not None:
+        type_check = ' or '.join(_TYPE_CHECKS[_type] for _type in field_types)
+        lines.append(f"        elif not ({ type_check }):")
+        lines.append(f"            add({ field_name }, 'type', type_{ index }, value)")
+
+    checks = {
+        'allowed': f"value not in allowed_set_{ index }",
+        'max': f"value > max_{ index }",
+        'maxlength': f"isinstance(value, Iterable) and len(value) > maxlength_{ index }",
+        'min': f"value < min_{ index }",
+        'minlength': f"isinstance(value, Iterable) and len(value) < minlength_{ index }",
+        'regex': f"isinstance(value, str) and not regex_match_{ index }(value)"
+    }
+    normal_rules = [rule for rule in _NORMAL_RULES if rule in rules]
+    if normal_rules:
+        lines.append("        else:")
+        for rule in normal_rules:
+            lines.append(f"            if { checks[rule] }:")
+            lines.append(f"                add({ field_name }, '{ rule }', { rule }_{ index }, value)")
+
+    if rules.get('required', False):
+        lines.append("    else:")
+        lines.append(f"        add({ field_name }, 'required', True, None)")
+
+    return lines
+
+
+def compile_validate_function(schema: dict) -> Optional[Callable[[dict], Dict[str, List[FastValidationError]]]]:
+    """
+    Generates a Python function to validate documents against a (Cerberus compatible) validation schema
+
+    Rules are translated into direct comparisons (e.g. type checks, frozenset membership tests for allowed values) in a
+    single function, generated from the schema when it's registered. This avoids the rule dispatch Cerberus performs
+    for each rule, for each field, each time a document is validated.
+
+    Only some rules can be compiled (see `COMPILABLE_RULES`), if a schema uses others None is returned and Cerberus
+    should be used instead.
+
+    :type schema: dict
+    :param schema: Cerberus compatible validation schema
+
+    :rtype: Optional[Callable]
+    :return: function returning a dict of errors for each invalid field, or None if the schema can't be compiled
+    """
+    namespace = {
+        'Iterable': Iterable,
+        'Mapping': Mapping,
+        'Sequence': Sequence,
+        'FastValidationError': FastValidationError
+    }
+    source = [
+        "def validate(document):",
+        "    errors = {}",
+        "",
+        "    def add(field, rule, constraint, value):",
+        "        errors.setdefault(field, []).append(FastValidationError(field, rule, constraint, value))",
+        ""
+    ]
+
+    for index, (field, rules) in enumerate(schema.items()):
+        field_source = _compile_field(index, field, rules, namespace)
+        if field_source is None:
+            return None
+        source.extend(field_source)
+
+    source.append("    return errors")
+
+    # The generated source only contains identifiers and rule names, schema values are passed in as constants.
+    exec(compile('\n'.join(source), '<validation schema>', 'exec'), namespace)  # nosec
+    return namespace['validate']
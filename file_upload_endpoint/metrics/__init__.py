@@ -0,0 +1,420 @@
+import bisect
+import json
+import os
+import re
+import threading
+import time
+
+from typing import Dict, List, Optional, Tuple
+
+from flask import Flask as App, Response, current_app, g, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Route label for requests not matching a route (e.g. not found errors), so labels are bounded
+UNMATCHED_ROUTE = '<unmatched>'
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Metrics files written by each process to a shared directory (see `Metrics.write`), including partially written files
+METRICS_FILE_PATTERN = re.compile(r'^metrics-(\d+)\.json(\.tmp)?$')
+
+# WSGI environment key for the request body stream counting bytes read, set by `Metrics`
+STREAM_ENVIRON_KEY = 'file_upload_endpoint.metrics.stream'
+
+
+class CountedStream(object):
+    """
+    Wrapper for a request body stream (WSGI input), counting the bytes read from it
+
+    Unlike the content length, this includes request bodies sent without one (using chunked transfer encoding).
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.bytes = 0
+
+    def read(self, *args) -> bytes:
+        data = self._stream.read(*args)
+        self.bytes += len(data)
+        return data
+
+    def readinto(self, buffer) -> Optional[int]:
+        size = self._stream.readinto(buffer)
+        self.bytes += size or 0
+        return size
+
+    def readline(self, *args) -> bytes:
+        data = self._stream.readline(*args)
+        self.bytes += len(data)
+        return data
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def close(self) -> None:
+        if hasattr(self._stream, 'close'):
+            self._stream.close()
+
+
+class _ThreadMetrics(object):
+    """
+    Metrics recorded by a single thread
+
+    Only the owning thread updates these values, so no locking is needed. Other threads read copies when metrics are
+    collected.
+    """
+
+    __slots__ = ('requests', 'latencies', 'request_bytes', 'handled_errors', 'upload_spills', 'spooled_bytes_peak')
+
+    def __init__(self):
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        # per route: count of requests in each bucket (not cumulative), total latency, count of requests
+        self.latencies: Dict[str, list] = {}
+        self.request_bytes: Dict[str, int] = {}
+        self.handled_errors: Dict[str, int] = {}
+        self.upload_spills = 0
+        # per storage ('memory' or 'disk'): peak bytes spooled at once, by all threads, when recorded by this thread
+        self.spooled_bytes_peak: Dict[str, int] = {}
+
+
+def _empty_snapshot() -> dict:
+    return {
+        'requests': {},
+        'latencies': {},
+        'request_bytes': {},
+        'handled_errors': {},
+        'upload_spills': 0,
+        'spooled_bytes_peak': {}
+    }
+
+
+def _merge_snapshot(into: dict, snapshot: dict) -> None:
+    for section in ('requests', 'request_bytes', 'handled_errors'):
+        for key, value in snapshot[section].items():
+            into[section][key] = into[section].get(key, 0) + value
+    for route, (buckets, total, count) in snapshot['latencies'].items():
+        merged = into['latencies'].setdefault(route, [[0] * len(buckets), 0.0, 0])
+        merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+        merged[1] += total
+        merged[2] += count
+    # snapshots written by earlier versions may not include spooling metrics
+    into['upload_spills'] += snapshot.get('upload_spills', 0)
+    for storage, value in snapshot.get('spooled_bytes_peak', {}).items():
+        into['spooled_bytes_peak'][storage] = max(into['spooled_bytes_peak'].get(storage, 0), value)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Metrics(object):
+    """
+    Flask extension recording request metrics, exposed in the Prometheus text exposition format
+
+    Metrics recorded:
+    * request counts, by route, method and status code
+    * request latency histograms, by route
+    * request body bytes read by the application, by route
+    * handled error counts, by kind of error (e.g. 'no_file')
+    * uploaded files spooled to disk (spills), and peak bytes spooled at once, in memory and on disk (see `UploadSpool`)
+
+    To keep recording cheap, each thread records metrics in its own counters, without locks. Counters for each thread
+    are merged when metrics are collected.
+
+    Where the application runs in multiple worker processes, a directory shared by all workers can be set. Each
+    process periodically writes its metrics to a file in this directory (and when metrics are collected), with metrics
+    from all files merged so a single scrape reflects all workers. Files left by processes which are no longer running
+    (e.g. from a previous run) are removed when this extension is created, before workers start.
+
+    To record a handled error: record_handled_error('kind')
+    """
+
+    def __init__(
+        self,
+        app: App,
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+        directory: Optional[str] = None,
+        interval: float = 10
+    ):
+        self.buckets = tuple(sorted(buckets))
+        self.directory = directory
+        self.interval = interval
+
+        self._local = threading.local()
+        self._threads: List[_ThreadMetrics] = []
+        self._threads_lock = threading.Lock()
+        self._writer_pid = None  # type: Optional[int]
+        self._writer_lock = threading.Lock()
+
+        if directory is not None:
+            self.remove_stale_files()
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.extensions['metrics'] = self
+
+    def record_request(self, route: str, method: str, status: int, latency: float, request_bytes: int) -> None:
+        """
+        Records a request
+
+        :type route: str
+        :param route: route rule (e.g. '/upload-single')
+
+        :type method: str
+        :param method: HTTP method
+
+        :type status: int
+        :param status: HTTP status code
+
+        :type latency: float
+        :param latency: time taken to handle the request (in seconds)
+
+        :type request_bytes: int
+        :param request_bytes: bytes of the request body read (in bytes)
+        """
+        metrics = self._get_thread_metrics()
+
+        key = (route, method, status)
+        metrics.requests[key] = metrics.requests.get(key, 0) + 1
+        metrics.request_bytes[route] = metrics.request_bytes.get(route, 0) + request_bytes
+
+        histogram = metrics.latencies.get(route)
+        if histogram is None:
+            histogram = metrics.latencies[route] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        histogram[0][bisect.bisect_left(self.buckets, latency)] += 1
+        histogram[1] += latency
+        histogram[2] += 1
+
+    def record_handled_error(self, kind: str) -> None:
+        """
+        Records an error handled by this application
+
+        :type kind: str
+        :param kind: kind of error (e.g. 'no_file')
+        """
+        metrics = self._get_thread_metrics()
+        metrics.handled_errors[kind] = metrics.handled_errors.get(kind, 0) + 1
+
+    def record_spooled_bytes(self, memory_bytes: int, disk_bytes: int, spill: bool = False) -> None:
+        """
+        Records the bytes of uploaded files currently spooled, and whether a file has been spooled to disk
+
+        :type memory_bytes: int
+        :param memory_bytes: bytes spooled in memory
+
+        :type disk_bytes: int
+        :param disk_bytes: bytes spooled on disk
+
+        :type spill: bool
+        :param spill: whether a file has been moved from memory to disk
+        """
+        metrics = self._get_thread_metrics()
+        if spill:
+            metrics.upload_spills += 1
+
+        peak = metrics.spooled_bytes_peak
+        if memory_bytes > peak.get('memory', 0):
+            peak['memory'] = memory_bytes
+        if disk_bytes > peak.get('disk', 0):
+            peak['disk'] = disk_bytes
+
+    def snapshot(self) -> dict:
+        """
+        Merges metrics recorded by each thread in this process
+
+        :rtype: dict
+        :return: metrics for this process
+        """
+        snapshot = _empty_snapshot()
+        with self._threads_lock:
+            threads = list(self._threads)
+
+        for metrics in threads:
+            # copying a dict is atomic, so copies are consistent even if the owning thread is recording metrics
+            latencies = metrics.latencies.copy()
+            _merge_snapshot(snapshot, {
+                'requests': {json.dumps(key): value for key, value in metrics.requests.copy().items()},
+                'latencies': {route: [list(buckets), total, count] for route, (buckets, total, count) in
+                              latencies.items()},
+                'request_bytes': metrics.request_bytes.copy(),
+                'handled_errors': metrics.handled_errors.copy(),
+                'upload_spills': metrics.upload_spills,
+                'spooled_bytes_peak': metrics.spooled_bytes_peak.copy()
+            })
+
+        return snapshot
+
+    def collect(self) -> dict:
+        """
+        Collects metrics for this process, or all processes if a shared directory is set
+
+        :rtype: dict
+        :return: metrics
+        """
+        if self.directory is None:
+            return self.snapshot()
+
+        self.write()
+        snapshot = _empty_snapshot()
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as metrics_file:
+                    _merge_snapshot(snapshot, json.load(metrics_file))
+            except (OSError, ValueError):
+                # files may be removed, or partially written by other tools, while being read
+                continue
+
+        return snapshot
+
+    def remove_stale_files(self) -> None:
+        """
+        Removes metrics files written to the shared directory by processes which are no longer running
+        """
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+
+        for name in names:
+            match = METRICS_FILE_PATTERN.match(name)
+            if match is None:
+                continue
+            try:
+                os.kill(int(match.group(1)), 0)
+                continue
+            except ProcessLookupError:
+                pass
+            except (OSError, OverflowError):
+                # the process exists, but belongs to another user, or the process ID is invalid
+                continue
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+
+    def write(self) -> None:
+        """
+        Writes metrics for this process to the shared directory
+        """
+        path = os.path.join(self.directory, f"metrics-{ os.getpid() }.json")
+        with open(f"{ path }.tmp", 'w') as metrics_file:
+            json.dump(self.snapshot(), metrics_file)
+        os.replace(f"{ path }.tmp", path)
+
+    def render(self) -> str:
+        """
+        Renders metrics in the Prometheus text exposition format
+
+        :rtype: str
+        :return: metrics
+        """
+        snapshot = self.collect()
+        lines = [
+            '# HELP file_upload_endpoint_requests_total Requests handled, by route, method and status code.',
+            '# TYPE file_upload_endpoint_requests_total counter'
+        ]
+        for key, value in sorted(snapshot['requests'].items()):
+            route, method, status = json.loads(key)
+            lines.append(
+                f"file_upload_endpoint_requests_total{{route=\"{ _escape(route) }\",method=\"{ method }\","
+                f"status=\"{ status }\"}} { value }"
+            )
+
+        lines.append('# HELP file_upload_endpoint_request_duration_seconds Time taken to handle requests, by route.')
+        lines.append('# TYPE file_upload_endpoint_request_duration_seconds histogram')
+        for route, (buckets, total, count) in sorted(snapshot['latencies'].items()):
+            route = _escape(route)
+            cumulative = 0
+            for bound, bucket_count in zip(list(self.buckets) + ['+Inf'], buckets):
+                cumulative += bucket_count
+                lines.append(
+                    f"file_upload_endpoint_request_duration_seconds_bucket{{route=\"{ route }\",le=\"{ bound }\"}} "
+                    f"{ cumulative }"
+                )
+            lines.append(f"file_upload_endpoint_request_duration_seconds_sum{{route=\"{ route }\"}} { total }")
+            lines.append(f"file_upload_endpoint_request_duration_seconds_count{{route=\"{ route }\"}} { count }")
+
+        lines.append('# HELP file_upload_endpoint_request_bytes_total Request body bytes read, by route.')
+        lines.append('# TYPE file_upload_endpoint_request_bytes_total counter')
+        for route, value in sorted(snapshot['request_bytes'].items()):
+            lines.append(f"file_upload_endpoint_request_bytes_total{{route=\"{ _escape(route) }\"}} { value }")
+
+        lines.append('# HELP file_upload_endpoint_handled_errors_total Errors handled by this API, by kind of error.')
+        lines.append('# TYPE file_upload_endpoint_handled_errors_total counter')
+        for kind, value in sorted(snapshot['handled_errors'].items()):
+            lines.append(f"file_upload_endpoint_handled_errors_total{{error=\"{ _escape(kind) }\"}} { value }")
+
+        lines.append('# HELP file_upload_endpoint_upload_spills_total Uploaded files spooled to disk.')
+        lines.append('# TYPE file_upload_endpoint_upload_spills_total counter')
+        lines.append(f"file_upload_endpoint_upload_spills_total { snapshot['upload_spills'] }")
+
+        lines.append(
+            '# HELP file_upload_endpoint_upload_spooled_bytes_peak Peak bytes of uploaded files spooled at once, by '
+            'storage.'
+        )
+        lines.append('# TYPE file_upload_endpoint_upload_spooled_bytes_peak gauge')
+        for storage, value in sorted(snapshot['spooled_bytes_peak'].items()):
+            lines.append(f"file_upload_endpoint_upload_spooled_bytes_peak{{storage=\"{ storage }\"}} { value }")
+
+        return '\n'.join(lines) + '\n'
+
+    def _get_thread_metrics(self) -> _ThreadMetrics:
+        metrics = getattr(self._local, 'metrics', None)
+        if metrics is None:
+            metrics = self._local.metrics = _ThreadMetrics()
+            with self._threads_lock:
+                self._threads.append(metrics)
+        return metrics
+
+    @staticmethod
+    def _before_request() -> None:
+        g.metrics_started_at = time.perf_counter()
+        stream = CountedStream(request.environ['wsgi.input'])
+        request.environ['wsgi.input'] = stream
+        request.environ[STREAM_ENVIRON_KEY] = stream
+
+    def _after_request(self, response: Response) -> Response:
+        started_at = g.get('metrics_started_at')
+        if started_at is not None:
+            route = request.url_rule.rule if request.url_rule is not None else UNMATCHED_ROUTE
+            self.record_request(
+                route,
+                request.method,
+                response.status_code,
+                time.perf_counter() - started_at,
+                request.environ[STREAM_ENVIRON_KEY].bytes
+            )
+
+        if self.directory is not None and self._writer_pid != os.getpid():
+            self._start_writer()
+
+        return response
+
+    def _start_writer(self) -> None:
+        with self._writer_lock:
+            if self._writer_pid == os.getpid():
+                return
+
+            os.makedirs(self.directory, exist_ok=True)
+            threading.Thread(target=self._run_writer, name='metrics-writer', daemon=True).start()
+            self._writer_pid = os.getpid()
+
+    def _run_writer(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            self.write()
+
+
+def record_handled_error(kind: str) -> None:
+    """
+    Records an error handled by this application, if metrics are enabled
+
+    :type kind: str
+    :param kind: kind of error (e.g. 'no_file')
+    """
+    metrics = current_app.extensions.get('metrics')
+    if metrics is not None:
+        metrics.record_handled_error(kind)
@@ -0,0 +1,229 @@
+import math
+import threading
+import time
+
+from typing import Iterable, Optional, Tuple
+from uuid import uuid4
+
+from flask import Flask as App
+
+from file_upload_endpoint.meta.errors import error_overloaded
+from file_upload_endpoint.meta.responses import JSONTemplate, error_template, slot
+from file_upload_endpoint.middleware.cors import cors_response_headers
+from file_upload_endpoint.middleware.health import TASK_DISPATCHER_ENVIRON_KEY, get_content_length, \
+    queued_request_bytes
+
+# Requests using these methods are considered uploads, other requests (e.g. CORS preflight requests) are not limited
+UPLOAD_METHODS = frozenset(['POST', 'PUT', 'PATCH'])
+
+# Whether an upload was accepted (None) or refused (the time after which it may be retried), decided once per request
+ADMISSION_ENVIRON_KEY = 'file_upload_endpoint.admission'
+
+
+class AdmissionControl(object):
+    """
+    WSGI middleware to refuse uploads when too many are in progress, before they reach the Flask application
+
+    Under a surge of uploads, accepting every request exhausts memory and temporary disk space, and increases latency
+    for all requests. Instead, uploads beyond a limit are answered immediately with a '503 Service Unavailable' error,
+    with a `Retry-After` header, so clients back off and uploads that were accepted complete at a normal pace.
+
+    An upload (a request using a method in `UPLOAD_METHODS`) is refused when either:
+
+    * `max_uploads` uploads are already being handled
+    * the request bodies of uploads being handled, and requests waiting for a thread, would exceed `max_inflight_bytes`
+      including this upload (based on declared `Content-Length` headers)
+
+    An upload is always accepted if no other uploads are being handled, so uploads larger than `max_inflight_bytes`
+    aren't refused indefinitely. Requests waiting for a thread are only known where the server sets its task
+    dispatcher in the WSGI environment (see `HealthChecks`).
+
+    `Retry-After` is estimated from the rate uploads have completed (drained) over the last `window` seconds: the time
+    needed for enough uploads, or bytes, to complete for this upload to be accepted. This is rounded up to whole seconds
+    and capped at `max_retry_after`, which is also used if no uploads have completed recently.
+
+    Requests to paths starting with any of the `exempt_paths` (e.g. health checks) are never refused or counted.
+
+    Servers which receive request bodies before calling the application (e.g. the ASGI adapter) can decide whether to
+    accept an upload from its headers, by calling `admit`, so that a refused upload isn't received. The decision is
+    kept in the WSGI environment, and used when the request reaches this middleware, which answers refused uploads. An
+    upload accepted this way, but not passed to the application (e.g. as the client disconnected), must be released.
+
+    Note: As these responses don't reach the Flask application, they aren't included in request timings. Refused uploads
+    are counted as a handled error ('overloaded') in metrics, if enabled. For allowed `origins`, responses include CORS
+    headers so browsers can read the error and `Retry-After` header.
+
+    :type app: App
+    :param app: Flask application
+
+    :type max_uploads: Optional[int]
+    :param max_uploads: maximum number of uploads being handled at once, or None for no limit
+
+    :type max_inflight_bytes: Optional[int]
+    :param max_inflight_bytes: maximum size of request bodies being handled or queued (in bytes), or None for no limit
+
+    :type exempt_paths: Iterable[str]
+    :param exempt_paths: path prefixes of requests which are never refused
+
+    :type origins: Iterable[str]
+    :param origins: origins allowed to read refused responses (i.e. CORS origins)
+
+    :type window: int
+    :param window: time over which the rate uploads complete is measured (in seconds)
+
+    :type max_retry_after: int
+    :param max_retry_after: maximum time clients are asked to wait before retrying (in seconds)
+    """
+
+    def __init__(
+        self,
+        app: App,
+        max_uploads: Optional[int] = None,
+        max_inflight_bytes: Optional[int] = None,
+        exempt_paths: Iterable[str] = ('/meta/',),
+        origins: Iterable[str] = (),
+        window: int = 10,
+        max_retry_after: int = 60
+    ):
+        self.flask_app = app
+        self.max_uploads = max_uploads
+        self.max_inflight_bytes = max_inflight_bytes
+        self.exempt_paths = tuple(exempt_paths)
+        self.origins = frozenset(origins)
+        self.window = window
+        self.max_retry_after = max_retry_after
+
+        self.inflight_uploads = 0
+        self.inflight_bytes = 0
+        self.refused_uploads = 0
+        # uploads and bytes completed in each second of the window, as a ring of (second, uploads, bytes) buckets
+        self._drained = [(0, 0, 0)] * window
+        self._lock = threading.Lock()
+        self._template = JSONTemplate(error_template(error_overloaded(slot('retry_after'))))
+
+        self.app = app.wsgi_app
+        app.wsgi_app = self
+        app.extensions['admission_control'] = self
+
+    def __call__(self, environ, start_response):
+        if not self.admit(environ):
+            return self._refuse(environ, start_response, environ[ADMISSION_ENVIRON_KEY])
+
+        try:
+            return self.app(environ, start_response)
+        finally:
+            self.release(environ)
+
+    def admit(self, environ: dict) -> bool:
+        """
+        Decides whether to accept a request, based on its headers
+
+        Accepted uploads are counted as in progress until released. The decision is made once per request, so this
+        method can be called before the request reaches this middleware.
+
+        :type environ: dict
+        :param environ: WSGI environment of the request
+
+        :rtype: bool
+        :return: whether the request is accepted
+        """
+        if ADMISSION_ENVIRON_KEY in environ:
+            return environ[ADMISSION_ENVIRON_KEY] is None
+
+        path = environ.get('PATH_INFO', '')
+        if environ['REQUEST_METHOD'] not in UPLOAD_METHODS or path.startswith(self.exempt_paths):
+            return True
+
+        content_length = get_content_length(environ)
+        task_dispatcher = environ.get(TASK_DISPATCHER_ENVIRON_KEY)
+        queued_bytes = 0 if task_dispatcher is None else queued_request_bytes(task_dispatcher)
+        with self._lock:
+            retry_after = self._admit(content_length, queued_bytes)
+            if retry_after is None:
+                self.inflight_uploads += 1
+                self.inflight_bytes += content_length
+            else:
+                self.refused_uploads += 1
+
+        environ[ADMISSION_ENVIRON_KEY] = retry_after
+        return retry_after is None
+
+    def release(self, environ: dict) -> None:
+        """
+        Stops counting an accepted upload as in progress, recording it as completed
+
+        Requests which weren't counted (i.e. which weren't accepted uploads), or were already released, are ignored.
+
+        :type environ: dict
+        :param environ: WSGI environment of the request
+        """
+        if ADMISSION_ENVIRON_KEY not in environ or environ[ADMISSION_ENVIRON_KEY] is not None:
+            return
+        del environ[ADMISSION_ENVIRON_KEY]
+
+        content_length = get_content_length(environ)
+        second = int(time.monotonic())
+        with self._lock:
+            self.inflight_uploads -= 1
+            self.inflight_bytes -= content_length
+
+            index = second % self.window
+            bucket_second, uploads, drained_bytes = self._drained[index]
+            if bucket_second != second:
+                uploads, drained_bytes = 0, 0
+            self._drained[index] = (second, uploads + 1, drained_bytes + content_length)
+
+    def drain_rate(self) -> Tuple[float, float]:
+        """
+        Gets the rate uploads have completed over the window
+
+        :rtype: tuple
+        :return: uploads and bytes completed per second
+        """
+        oldest = int(time.monotonic()) - self.window
+        uploads = 0
+        drained_bytes = 0
+        for bucket_second, bucket_uploads, bucket_bytes in self._drained:
+            if bucket_second > oldest:
+                uploads += bucket_uploads
+                drained_bytes += bucket_bytes
+        return uploads / self.window, drained_bytes / self.window
+
+    def _admit(self, content_length: int, queued_bytes: int) -> Optional[int]:
+        # returns None if the upload is accepted, otherwise the time after which it may be retried (in seconds)
+        if self.inflight_uploads == 0:
+            return None
+
+        excess_uploads = 0
+        if self.max_uploads is not None:
+            excess_uploads = self.inflight_uploads + 1 - self.max_uploads
+        excess_bytes = 0
+        if self.max_inflight_bytes is not None:
+            excess_bytes = self.inflight_bytes + queued_bytes + content_length - self.max_inflight_bytes
+        if excess_uploads <= 0 and excess_bytes <= 0:
+            return None
+
+        upload_rate, byte_rate = self.drain_rate()
+        waits = []
+        if excess_uploads > 0:
+            waits.append(excess_uploads / upload_rate if upload_rate else self.max_retry_after)
+        if excess_bytes > 0:
+            waits.append(excess_bytes / byte_rate if byte_rate else self.max_retry_after)
+        return min(max(math.ceil(max(waits)), 1), self.max_retry_after)
+
+    def _refuse(self, environ, start_response, retry_after: int):
+        metrics = self.flask_app.extensions.get('metrics')
+        if metrics is not None:
+            metrics.record_handled_error('overloaded')
+
+        body = self._template.render(id=uuid4(), retry_after=retry_after)
+        headers = [
+            ('Content-Type', 'application/json'),
+            ('Content-Length', str(len(body))),
+            ('Retry-After', str(retry_after)),
+            ('Cache-Control', 'no-store')
+        ]
+        headers.extend(cors_response_headers(environ, self.origins, expose_headers=('Retry-After',)))
+
+        start_response('503 SERVICE UNAVAILABLE', headers)
+        return [body]
@@ -0,0 +1,128 @@
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from flask import Flask as App
+
+
+def cors_response_headers(
+    environ: dict,
+    origins: FrozenSet[str],
+    expose_headers: Iterable[str] = ()
+) -> List[Tuple[str, str]]:
+    """
+    Gets CORS headers for a response answered by WSGI middleware, rather than the Flask application (and Flask-CORS)
+
+    This allows browsers to read responses (e.g. errors) from middleware, for requests from an allowed origin.
+
+    :type environ: dict
+    :param environ: WSGI environment of the request
+
+    :type origins: FrozenSet[str]
+    :param origins: allowed origins
+
+    :type expose_headers: Iterable[str]
+    :param expose_headers: response headers browsers may read, other than those in simple responses
+
+    :rtype: list
+    :return: response headers, empty if the request isn't from an allowed origin
+    """
+    origin = environ.get('HTTP_ORIGIN')
+    if origin not in origins:
+        return []
+
+    headers = [('Access-Control-Allow-Origin', origin), ('Vary', 'Origin')]
+    expose_headers = ', '.join(expose_headers)
+    if expose_headers:
+        headers.append(('Access-Control-Expose-Headers', expose_headers))
+    return headers
+
+
+class CORSPreflight(object):
+    """
+    WSGI middleware to respond to CORS preflight requests without calling the Flask application
+
+    Browsers make a preflight (OPTIONS) request before each cross-origin upload. These are otherwise handled by Flask,
+    after routing and creating a request context, only to return a fixed response.
+
+    Instead, responses for each allowed origin and route are built once (when the first preflight request is made, as
+    routes are registered after middleware). A preflight request is then answered using a dictionary lookup on its
+    origin and path. Preflight requests from other origins, or to routes this middleware doesn't cover, are passed to
+    the application (where Flask-CORS responds without CORS headers).
+
+    Only routes without variables, using Flask's automatic OPTIONS response, are covered. Requested headers are
+    allowed as requested, as Flask-CORS allows all headers by default.
+
+    An `Access-Control-Max-Age` header is included if set, allowing browsers to cache preflight responses (up to a
+    browser specific limit), rather than making a preflight request before each upload.
+
+    Note: As these responses don't reach the Flask application, they aren't included in metrics or request timings.
+
+    :type app: App
+    :param app: Flask application
+
+    :type origins: Iterable[str]
+    :param origins: allowed origins
+
+    :type methods: Iterable[str]
+    :param methods: allowed HTTP methods
+
+    :type max_age: Optional[int]
+    :param max_age: time browsers may cache preflight responses for (in seconds)
+    """
+
+    def __init__(self, app: App, origins: Iterable[str], methods: Iterable[str], max_age: Optional[int] = None):
+        self.flask_app = app
+        self.origins = frozenset(origins)
+        self.methods = ', '.join(sorted(method.upper() for method in methods))
+        self.max_age = max_age
+        self._responses = None  # type: Optional[Dict[Tuple[str, str], Tuple[Tuple[str, str], ...]]]
+
+        self.app = app.wsgi_app
+        app.wsgi_app = self
+        app.extensions['cors_preflight'] = self
+
+    def __call__(self, environ, start_response):
+        if environ['REQUEST_METHOD'] == 'OPTIONS' and 'HTTP_ACCESS_CONTROL_REQUEST_METHOD' in environ:
+            responses = self._responses
+            if responses is None:
+                responses = self._responses = self.build_responses()
+
+            headers = responses.get((environ.get('HTTP_ORIGIN'), environ.get('PATH_INFO')))
+            if headers is not None:
+                headers = list(headers)
+                requested_headers = environ.get('HTTP_ACCESS_CONTROL_REQUEST_HEADERS')
+                if requested_headers:
+                    headers.append(('Access-Control-Allow-Headers', requested_headers))
+                start_response('200 OK', headers)
+                return []
+
+        return self.app(environ, start_response)
+
+    def build_responses(self) -> Dict[Tuple[str, str], Tuple[Tuple[str, str], ...]]:
+        """
+        Builds preflight response headers for each allowed origin and covered route
+
+        :rtype: dict
+        :return: response headers, keyed by origin and path
+        """
+        route_methods = {}  # type: Dict[str, set]
+        for rule in self.flask_app.url_map.iter_rules():
+            if rule.arguments or not getattr(rule, 'provide_automatic_options', False):
+                continue
+            route_methods.setdefault(rule.rule, set()).update(rule.methods)
+
+        responses = {}
+        for path, methods in route_methods.items():
+            for origin in self.origins:
+                headers = [
+                    ('Content-Type', 'text/html; charset=utf-8'),
+                    ('Content-Length', '0'),
+                    ('Allow', ', '.join(sorted(methods))),
+                    ('Access-Control-Allow-Origin', origin),
+                    ('Access-Control-Allow-Methods', self.methods),
+                    ('Vary', 'Origin')
+                ]  # type: List[Tuple[str, str]]
+                if self.max_age is not None:
+                    headers.append(('Access-Control-Max-Age', str(self.max_age)))
+                responses[(origin, path)] = tuple(headers)
+
+        return responses
@@ -0,0 +1,180 @@
+import json
+import threading
+
+from typing import Optional
+
+from flask import Flask as App
+
+CANARY_PATH = '/meta/health/canary'
+READINESS_PATH = '/meta/health/ready'
+
+# WSGI environment key for the task dispatcher (thread pool) of the server handling a request, set by servers which
+# can report their capacity (see `serving`)
+TASK_DISPATCHER_ENVIRON_KEY = 'file_upload_endpoint.task_dispatcher'
+
+
+def get_content_length(environ: dict) -> int:
+    """
+    Gets the declared content length of a request, treating a missing or invalid length as 0
+
+    :type environ: dict
+    :param environ: WSGI environment
+
+    :rtype: int
+    :return: content length (in bytes)
+    """
+    try:
+        return int(environ.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return 0
+
+
+def queued_request_bytes(task_dispatcher) -> int:
+    """
+    Gets the total size of request bodies waiting for a thread in a Waitress task dispatcher
+
+    Older versions of Waitress queue a task for each request, newer versions queue each connection (channel) with
+    requests waiting to be handled. Both are supported.
+
+    :param task_dispatcher: Waitress task dispatcher
+
+    :rtype: int
+    :return: total content length of queued requests (in bytes)
+    """
+    total = 0
+    # copying a deque (or list) is atomic, so queued requests can be read while the server is adding to it
+    for item in list(task_dispatcher.queue):
+        requests = getattr(item, 'requests', None)
+        if requests is None:
+            requests = [getattr(item, 'request', None)]
+        for request in list(requests):
+            if request is not None:
+                total += request.content_length or 0
+    return total
+
+
+class HealthChecks(object):
+    """
+    WSGI middleware to respond to health check requests without calling the Flask application
+
+    The canary health check (`CANARY_PATH`) is polled frequently by load balancers. As it always returns the same
+    (empty) response, it is answered directly, rather than after other middleware, routing and creating a request
+    context. Requests with an `Origin` header are passed to the application, so cross-origin requests are still given
+    CORS headers.
+
+    The readiness health check (`READINESS_PATH`) reports whether this instance has capacity for more requests. This
+    allows a load balancer to stop sending requests to an overloaded instance before latency increases, rather than
+    after it fails. An instance isn't ready when any of:
+
+    * all threads, other than the thread answering the readiness check, are handling requests
+    * the request bodies of requests being handled, or waiting for a thread, exceed `max_inflight_bytes`
+    * the number of requests waiting for a thread exceeds `max_queue_depth`
+
+    Requests being handled (and their content length) are counted by this middleware, until the application returns a
+    response. Threads and queued requests are only known where the server sets its task dispatcher in the WSGI
+    environment (`TASK_DISPATCHER_ENVIRON_KEY`), otherwise these checks are skipped.
+
+    Note: As these responses don't reach the Flask application, they aren't included in metrics or request timings.
+
+    :type app: App
+    :param app: Flask application
+
+    :type fast_canary: bool
+    :param fast_canary: whether to answer canary health checks in this middleware
+
+    :type max_inflight_bytes: Optional[int]
+    :param max_inflight_bytes: maximum size of request bodies being handled or queued (in bytes), or None for no limit
+
+    :type max_queue_depth: Optional[int]
+    :param max_queue_depth: maximum number of requests waiting for a thread, or None for no limit
+    """
+
+    def __init__(
+        self,
+        app: App,
+        fast_canary: bool = True,
+        max_inflight_bytes: Optional[int] = None,
+        max_queue_depth: Optional[int] = None
+    ):
+        self.fast_canary = fast_canary
+        self.max_inflight_bytes = max_inflight_bytes
+        self.max_queue_depth = max_queue_depth
+
+        self.inflight_requests = 0
+        self.inflight_bytes = 0
+        self._lock = threading.Lock()
+
+        self.app = app.wsgi_app
+        app.wsgi_app = self
+        app.extensions['health_checks'] = self
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO')
+        if path == CANARY_PATH and self.fast_canary and 'HTTP_ORIGIN' not in environ and \
+                environ['REQUEST_METHOD'] in ('GET', 'HEAD', 'OPTIONS'):
+            start_response('204 NO CONTENT', [('Content-Type', 'text/html; charset=utf-8')])
+            return []
+        if path == READINESS_PATH and environ['REQUEST_METHOD'] in ('GET', 'HEAD'):
+            return self._readiness(environ, start_response)
+
+        content_length = get_content_length(environ)
+        with self._lock:
+            self.inflight_requests += 1
+            self.inflight_bytes += content_length
+        try:
+            return self.app(environ, start_response)
+        finally:
+            with self._lock:
+                self.inflight_requests -= 1
+                self.inflight_bytes -= content_length
+
+    def readiness(self, task_dispatcher=None) -> dict:
+        """
+        Checks whether this instance has capacity for more requests
+
+        :param task_dispatcher: Waitress task dispatcher of the server, if known
+
+        :rtype: dict
+        :return: readiness, with the value and limit of each check
+        """
+        checks = {}
+        inflight_bytes = self.inflight_bytes
+
+        if task_dispatcher is not None:
+            # the thread answering this check is excluded, as it is free once the check is answered
+            busy_threads = self.inflight_requests
+            other_threads = len(task_dispatcher.threads) - 1
+            checks['busy_threads'] = {
+                'value': busy_threads,
+                'limit': other_threads,
+                'ready': other_threads < 1 or busy_threads < other_threads
+            }
+
+            queue_depth = len(task_dispatcher.queue)
+            inflight_bytes += queued_request_bytes(task_dispatcher)
+            checks['queue_depth'] = {
+                'value': queue_depth,
+                'limit': self.max_queue_depth,
+                'ready': self.max_queue_depth is None or queue_depth <= self.max_queue_depth
+            }
+
+        checks['inflight_bytes'] = {
+            'value': inflight_bytes,
+            'limit': self.max_inflight_bytes,
+            'ready': self.max_inflight_bytes is None or inflight_bytes <= self.max_inflight_bytes
+        }
+
+        return {'ready': all(check['ready'] for check in checks.values()), 'checks': checks}
+
+    def _readiness(self, environ, start_response):
+        readiness = self.readiness(environ.get(TASK_DISPATCHER_ENVIRON_KEY))
+        body = json.dumps(readiness).encode()
+
+        start_response('200 OK' if readiness['ready'] else '503 SERVICE UNAVAILABLE', [
+            ('Content-Type', 'application/json'),
+            ('Content-Length', str(len(body))),
+            ('Cache-Control', 'no-store')
+        ])
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+        return [body]
@@ -0,0 +1,241 @@
+import hashlib
+import math
+import mmap
+import multiprocessing
+import struct
+import time
+
+from typing import Dict, Iterable, Tuple
+from uuid import uuid4
+
+from flask import Flask as App
+
+from file_upload_endpoint.meta.errors import error_rate_limited
+from file_upload_endpoint.meta.responses import JSONTemplate, error_template, slot
+from file_upload_endpoint.middleware.cors import cors_response_headers
+
+# Time until a limited request may be retried (in seconds), or 0 if it isn't limited, decided once per request
+RATE_LIMIT_ENVIRON_KEY = 'file_upload_endpoint.rate_limit'
+
+
+def client_ip_key(environ: dict, trusted_proxies: int = 0) -> str:
+    """
+    Gets the IP address of the client making a request
+
+    Where requests are made through proxies (e.g. a load balancer), the address is taken from the `X-Forwarded-For`
+    header, counting back the number of trusted proxies, as values added before these proxies may be set by the client.
+
+    :type environ: dict
+    :param environ: WSGI environment of the request
+
+    :type trusted_proxies: int
+    :param trusted_proxies: number of proxies in front of this application which add to the `X-Forwarded-For` header
+
+    :rtype: str
+    :return: client IP address
+    """
+    if trusted_proxies:
+        forwarded_for = environ.get('HTTP_X_FORWARDED_FOR', '').split(',')
+        if len(forwarded_for) >= trusted_proxies:
+            return forwarded_for[-trusted_proxies].strip()
+    return environ.get('REMOTE_ADDR', '')
+
+
+# Functions identifying the client making a request, selected using the `key` option of the `RATE_LIMITS_CONFIG` config
+# option. Keys must not be taken from values the client can choose freely (e.g. its Request ID), as a client could then
+# avoid limits by sending a new value with each request.
+RATE_LIMIT_KEYS = {
+    'client-ip': client_ip_key
+}
+
+
+class SharedTokenBuckets(object):
+    """
+    Token buckets, stored in shared memory for all worker processes
+
+    Each bucket holds up to `burst` tokens, refilled at `rate` tokens per second, with a token taken for each request.
+    Buckets are stored in a fixed size table of slots, in an anonymous memory map. This table must be created before
+    worker processes are started (forked), so that they share the same buckets.
+
+    A bucket is stored in the slot chosen by a hash of its key, without probing other slots, so taking a token is
+    constant time. If two keys hash to the same slot, the most recent key replaces the other, which then starts again
+    with a full bucket. Limits are therefore only relaxed (never tightened) by collisions, which are rare while there
+    are many more slots than active clients.
+
+    Slots are locked in stripes, with a lock shared between processes for each stripe, so requests from different
+    clients rarely wait for each other.
+
+    :type slots: int
+    :param slots: number of buckets in the table
+
+    :type stripes: int
+    :param stripes: number of locks, each shared by a stripe of slots
+    """
+
+    # key hash, tokens, time last updated
+    RECORD = struct.Struct('<Qdd')
+
+    def __init__(self, slots: int = 65536, stripes: int = 64):
+        self.slots = slots
+
+        self._table = mmap.mmap(-1, self.RECORD.size * slots)
+        self._locks = [multiprocessing.Lock() for _ in range(stripes)]
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        """
+        Takes a token from a bucket, if available
+
+        :type key: str
+        :param key: key of the bucket (e.g. a client and budget)
+
+        :type rate: float
+        :param rate: tokens added to the bucket per second
+
+        :type burst: int
+        :param burst: maximum number of tokens in the bucket
+
+        :rtype: float
+        :return: 0 if a token was taken, otherwise the time until a token is available (in seconds)
+        """
+        # the hash must be the same in each process, unlike `hash()`, with 0 reserved for empty slots
+        key_hash = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+        slot = key_hash % self.slots
+        offset = slot * self.RECORD.size
+
+        with self._locks[slot % len(self._locks)]:
+            # monotonic time is system wide (on Linux), so times recorded by other processes can be compared
+            now = time.monotonic()
+            slot_hash, tokens, updated = self.RECORD.unpack_from(self._table, offset)
+            if slot_hash != key_hash:
+                tokens = burst
+            else:
+                tokens = min(burst, tokens + (now - updated) * rate)
+
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self.RECORD.pack_into(self._table, offset, key_hash, tokens, now)
+
+        return wait
+
+
+class RateLimit(object):
+    """
+    WSGI middleware to limit the rate of requests made by each client, before they reach the Flask application
+
+    Requests are limited by budgets, each for a path prefix (e.g. '/upload-' for the upload routes), with a rate (in
+    requests per second) and a burst (requests that can be made at once). Each client has a token bucket for each
+    budget, shared between worker processes (see `SharedTokenBuckets`). Requests to paths not matching a budget, or
+    matching any of the `exempt_paths` (e.g. health checks), and CORS preflight requests (made by browsers
+    automatically) are not limited.
+
+    Clients are identified by a key function (see `RATE_LIMIT_KEYS`), using their IP address. Behind proxies (e.g. a
+    load balancer), `trusted_proxies` must be set, otherwise all clients share the buckets of the nearest proxy's
+    address. Requests over a budget are answered immediately with a '429 Too Many Requests' error, with a
+    `Retry-After` header for when a token is next available.
+
+    Servers which receive request bodies before calling the application (e.g. the ASGI adapter) can take a token for a
+    request from its headers, by calling `admit`, so that the body of a limited request isn't received. The decision is
+    kept in the WSGI environment, and used when the request reaches this middleware, which answers limited requests.
+
+    Note: As these responses don't reach the Flask application, they aren't included in request timings. Limited
+    requests are counted as a handled error ('rate_limited') in metrics, if enabled. For allowed `origins`, responses
+    include CORS headers so browsers can read the error and `Retry-After` header.
+
+    :type app: App
+    :param app: Flask application
+
+    :type budgets: Dict[str, Tuple[float, int]]
+    :param budgets: rate (requests per second) and burst for each path prefix
+
+    :type key: str
+    :param key: name of the function identifying clients (see `RATE_LIMIT_KEYS`)
+
+    :type trusted_proxies: int
+    :param trusted_proxies: number of proxies in front of this application which add to the `X-Forwarded-For` header
+
+    :type slots: int
+    :param slots: number of buckets in the shared table
+
+    :type exempt_paths: Iterable[str]
+    :param exempt_paths: path prefixes of requests which are never limited
+
+    :type origins: Iterable[str]
+    :param origins: origins allowed to read limited responses (i.e. CORS origins)
+    """
+
+    def __init__(
+        self,
+        app: App,
+        budgets: Dict[str, Tuple[float, int]],
+        key: str = 'client-ip',
+        trusted_proxies: int = 0,
+        slots: int = 65536,
+        exempt_paths: Iterable[str] = (),
+        origins: Iterable[str] = ()
+    ):
+        self.flask_app = app
+        # longer prefixes are matched first, so more specific budgets take precedence
+        self.budgets = sorted(budgets.items(), key=lambda budget: len(budget[0]), reverse=True)
+        self.key = RATE_LIMIT_KEYS[key]
+        self.trusted_proxies = trusted_proxies
+        self.exempt_paths = tuple(exempt_paths)
+        self.origins = frozenset(origins)
+        self.buckets = SharedTokenBuckets(slots=slots)
+        self._template = JSONTemplate(error_template(error_rate_limited(slot('retry_after'))))
+
+        self.app = app.wsgi_app
+        app.wsgi_app = self
+        app.extensions['rate_limit'] = self
+
+    def __call__(self, environ, start_response):
+        if not self.admit(environ):
+            return self._limit(environ, start_response, math.ceil(environ[RATE_LIMIT_ENVIRON_KEY]))
+
+        return self.app(environ, start_response)
+
+    def admit(self, environ: dict) -> bool:
+        """
+        Takes a token for a request from the bucket of its client and budget, if any
+
+        The decision is made once per request, so this method can be called before the request reaches this middleware.
+
+        :type environ: dict
+        :param environ: WSGI environment of the request
+
+        :rtype: bool
+        :return: whether the request is allowed
+        """
+        if RATE_LIMIT_ENVIRON_KEY not in environ:
+            environ[RATE_LIMIT_ENVIRON_KEY] = self._take(environ)
+        return not environ[RATE_LIMIT_ENVIRON_KEY]
+
+    def _take(self, environ: dict) -> float:
+        # returns 0 if the request isn't limited, otherwise the time until a token is available (in seconds)
+        path = environ.get('PATH_INFO', '')
+        if environ['REQUEST_METHOD'] == 'OPTIONS' or path.startswith(self.exempt_paths):
+            return 0
+
+        for prefix, (rate, burst) in self.budgets:
+            if path.startswith(prefix):
+                return self.buckets.take(f"{ prefix }\0{ self.key(environ, self.trusted_proxies) }", rate, burst)
+        return 0
+
+    def _limit(self, environ, start_response, retry_after: int):
+        metrics = self.flask_app.extensions.get('metrics')
+        if metrics is not None:
+            metrics.record_handled_error('rate_limited')
+
+        body = self._template.render(id=uuid4(), retry_after=retry_after)
+        headers = [
+            ('Content-Type', 'application/json'),
+            ('Content-Length', str(len(body))),
+            ('Retry-After', str(retry_after)),
+            ('Cache-Control', 'no-store')
+        ]
+        headers.extend(cors_response_headers(environ, self.origins, expose_headers=('Retry-After',)))
+
+        start_response('429 TOO MANY REQUESTS', headers)
+        return [body]
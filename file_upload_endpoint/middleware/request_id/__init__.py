@@ -1,8 +1,61 @@
-from typing import Optional
-from uuid import UUID, uuid4
+import itertools
+import os
+import re
+import time
+
+from typing import Callable, Optional
+from uuid import uuid4
 
 from flask import Flask as App
 
+# Matches values in any of the forms accepted by `uuid.UUID()`, without needing to parse them or handle exceptions
+_UUID_PATTERN = re.compile(r'(?:urn:)?(?:uuid:)?\{*-*(?:[0-9a-fA-F]-*){32}\}*')
+
+
+def generate_uuid4_request_id() -> str:
+    """
+    Generates a unique request ID value using a random (version 4) UUID
+
+    :rtype: str
+    :return: unique request ID
+    """
+    return str(uuid4())
+
+
+class TimeOrderedRequestIDGenerator(object):
+    """
+    Generates unique, time ordered, request ID values without reading random data for each ID
+
+    IDs are formatted as UUIDs and consist of a random prefix, chosen once per process, and a counter, starting from
+    the time the prefix was chosen (in microseconds). IDs generated by a process are therefore ordered by the time they
+    were generated. A new prefix is chosen when the process is forked, so IDs remain unique across worker processes.
+
+    Note: These IDs are not random and so should not be used where IDs need to be unpredictable.
+    """
+
+    def __init__(self):
+        self._prefix = ''
+        self._counter = itertools.count()
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def __call__(self) -> str:
+        # `next()` on `itertools.count` is atomic, as it doesn't release the GIL, so IDs are unique across threads
+        value = next(self._counter)
+        return f"{ self._prefix }{ value >> 48 & 0xffff:04x}-{ value & 0xffffffffffff:012x}"
+
+    def _reset(self) -> None:
+        prefix = os.urandom(8).hex()
+        self._prefix = f"{ prefix[:8] }-{ prefix[8:12] }-{ prefix[12:] }-"
+        self._counter = itertools.count(time.time_ns() // 1000)
+
+
+# Request ID generators, selected using the `REQUEST_ID_GENERATOR` config option
+REQUEST_ID_GENERATORS = {
+    'uuid4': lambda: generate_uuid4_request_id,
+    'time-ordered': TimeOrderedRequestIDGenerator
+}
+
 
 class RequestID(object):
     """
@@ -20,33 +73,41 @@ class RequestID(object):
 
     Where possible we try to ensure there is at least one unique request ID value (typically a UUID) whilst respecting
     a request ID value given by a client, but which may not be unique.
+
+    Request IDs are generated using a random UUID by default, or another generator (any callable returning a string).
+
+    This middleware should wrap the application last (as the outermost middleware), so that responses made by other
+    middleware (e.g. health checks or refused uploads) include the Request ID header too.
     """
 
-    def __init__(self, app: App):
+    def __init__(self, app: App, generator: Optional[Callable[[], str]] = None):
         self._header_name = "X-Request-ID"
         self._flask_header_name = f"HTTP_{ self._header_name.upper().replace('-', '_') }"
+        self._generate_request_id = generator or generate_uuid4_request_id
         self.app = app.wsgi_app
         app.wsgi_app = self
+        app.extensions['request_id'] = self
 
     def __call__(self, environ, start_response) -> App:
-        request_id_header = self._compute_request_id_header(environ.get(self._flask_header_name))
+        request_id_header = self.compute_request_id_header(environ.get(self._flask_header_name))
         environ[self._flask_header_name] = request_id_header
+        response_header = (self._header_name, request_id_header)
 
         def new_start_response(status, response_headers, exc_info=None):
-            response_headers.append((self._header_name, request_id_header))
+            response_headers.append(response_header)
             return start_response(status, response_headers, exc_info)
 
         return self.app(environ, new_start_response)
 
-    def _compute_request_id_header(self, header_value: Optional[str] = None) -> str:
+    def compute_request_id_header(self, header_value: Optional[str] = None) -> str:
         """
         Computes a request ID header based on a possibly existing value
 
         If there isn't an existing header, a single unique request ID is generated and returned.
 
-        If there is an existing header, it is split to check for multiple values as per RFC 2616.
+        If there is an existing header, it may contain multiple values as per RFC 2616.
 
-        Each header value (request ID) is then checked for uniqueness:
+        The header values (request IDs) are then checked for uniqueness:
         1. if the header is a valid UUID it is considered unique
         2. if the header is from the BAS Load Balancer it is considered unique
 
@@ -59,61 +120,35 @@ class RequestID(object):
         :return: computed value for Request ID HTTP header
         """
 
-        has_unique_header = False
-
         if header_value is None:
-            header_value = self._generate_request_id()
-        elif type(header_value) == str:
-            header_values = header_value.split(',')
-            for request_id in header_values:
-                # prevent requiring all header values to be unique
-                if not has_unique_header:
-                    has_unique_header = self._is_request_id_unique(request_id)
-
-            if not has_unique_header:
-                # append a unique header value
-                header_value = f"{ header_value },{ self._generate_request_id() }"
+            return self._generate_request_id()
+
+        if not self._is_request_id_unique(header_value):
+            # append a unique header value
+            header_value = f"{ header_value },{ self._generate_request_id() }"
 
         return header_value
 
     @staticmethod
     def _is_request_id_unique(request_id: str) -> bool:
         """
-        Checks whether a Request ID is unique
+        Checks whether a Request ID, or any of a list of Request IDs, is unique
 
         Checks:
         1. if a request is from the BAS Load Balancer (which generates unique values)
         2. if a request is a valid UUID
 
+        Rather than parsing each value as a UUID, values are checked using a pattern matching the format of a UUID.
+
         :type request_id: str
-        :param request_id: a Request ID
+        :param request_id: a Request ID, or comma separated Request IDs
 
         :rtype: bool
         :return: whether the Request ID is unique or not
         """
-
-        is_unique = False
-
-        # check if the Request ID is from the BAS Load Balancer
+        # check if any Request ID is from the BAS Load Balancer
         if 'BAS-API-LB-RV1' in request_id:
-            is_unique = True
-
-        # check if the Request ID is a UUID
-        try:
-            UUID(request_id, version=4)
-            is_unique = True
-        except ValueError:
-            pass
-
-        return is_unique
-
-    @staticmethod
-    def _generate_request_id() -> str:
-        """
-        Generates a unique request ID value
-
-        :rtype: str
-        :return: unique request ID
-        """
+            return True
 
-        return str(uuid4())
+        # check if any Request ID is a UUID
+        return any(map(_UUID_PATTERN.fullmatch, request_id.split(',')))
@@ -0,0 +1,216 @@
+import atexit
+import os
+import queue
+import random
+import threading
+import time
+import weakref
+
+from typing import Dict, List, Optional, Tuple
+
+from flask import Flask as App, current_app
+
+from file_upload_endpoint.metrics import record_handled_error
+
+# Maximum number of message arguments reported for each kind of error and message template in a reporting window
+MAX_REPORTED_ARGS = 10
+
+# Reporters are flushed when the interpreter exits by a single exit handler, rather than one for each application
+_reporters: weakref.WeakSet = weakref.WeakSet()
+_reporters_lock = threading.Lock()
+_flush_registered = False
+
+
+def _flush_reporters() -> None:
+    for reporter in list(_reporters):
+        reporter.flush()
+
+
+def _register_flush() -> None:
+    # Exit handlers are called in the reverse order they are registered. The flush is registered when the first reporter
+    # is created, after Sentry is initialised, so it runs before Sentry's own exit handler closes its client.
+    global _flush_registered
+
+    with _reporters_lock:
+        if not _flush_registered:
+            atexit.register(_flush_reporters)
+            _flush_registered = True
+
+
+class HandledErrorReporter(object):
+    """
+    Flask extension to report errors handled by this application to Sentry in aggregate
+
+    Errors such as a missing file are handled by this API, through an error response, so are not reported to Sentry
+    automatically. As they're useful for tracking they are reported anyway, however reporting every instance would mean
+    a misconfigured client could generate as many Sentry events as it makes bad requests.
+
+    Instead, reports are added to a bounded queue, which is read by a background worker. Reports of the same kind and
+    message template (before it is formatted with any arguments) are counted over a reporting window, after which a
+    single Sentry message is sent for each, grouped by its kind and template (as its fingerprint). The number of
+    occurrences, and arguments for up to `MAX_REPORTED_ARGS` of them, are included as extra information. If the queue
+    is full, reports are dropped rather than blocking the request. Reports can also be sampled, using a rate per kind
+    of error.
+
+    The worker is started when the first report is made (including in each process where the application is forked).
+    Reports counted in the last window are flushed when the interpreter exits, so this extension must be created after
+    Sentry is initialised.
+
+    To report a handled error: report_handled_error('kind', 'message [%s]', arg)
+    """
+
+    def __init__(
+        self,
+        app: App,
+        window: float = 60,
+        queue_size: int = 1000,
+        sample_rates: Optional[Dict[str, float]] = None,
+        default_sample_rate: float = 1.0
+    ):
+        self.window = window
+        self.sample_rates = sample_rates or {}
+        self.default_sample_rate = default_sample_rate
+        self.dropped = 0
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        # per kind and message template: count of reports, and arguments for the first reports
+        self._counts: Dict[Tuple[str, str], Tuple[int, List[tuple]]] = {}
+        self._counts_lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_pid: Optional[int] = None
+        self._worker_lock = threading.Lock()
+
+        app.extensions['handled_error_reporter'] = self
+        _reporters.add(self)
+        _register_flush()
+
+    def report(self, kind: str, message: str, *args) -> None:
+        """
+        Queues a handled error to be reported
+
+        :type kind: str
+        :param kind: kind of error, used for sampling (e.g. 'no_file')
+
+        :type message: str
+        :param message: message template to report (using '%s' placeholders)
+
+        :param args: values for message template
+        """
+        sample_rate = self.sample_rates.get(kind, self.default_sample_rate)
+        # Random numbers are used for sampling, not for any security purpose
+        if sample_rate < 1 and random.random() >= sample_rate:  # nosec
+            return
+
+        if self._worker_pid != os.getpid():
+            self._start_worker()
+
+        try:
+            self._queue.put_nowait((kind, message, args))
+        except queue.Full:
+            with self._counts_lock:
+                self.dropped += 1
+
+    def flush(self) -> None:
+        """
+        Reports all errors counted in the current reporting window to Sentry
+        """
+        # Sentry is only imported where errors are reported, as this module is used whether Sentry is enabled or not
+        import sentry_sdk
+
+        while True:
+            try:
+                self._count(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        with self._counts_lock:
+            counts = self._counts
+            self._counts = {}
+            dropped = self.dropped
+            self.dropped = 0
+
+        for (kind, message), (count, args) in counts.items():
+            sample_rate = self.sample_rates.get(kind, self.default_sample_rate)
+            with sentry_sdk.new_scope() as scope:
+                # grouped by template, rather than the formatted message, so values (e.g. sizes) don't split reports
+                scope.fingerprint = ['handled-error', kind, message]
+                scope.set_extra('debug', False)
+                scope.set_extra('kind', kind)
+                scope.set_extra('count', count)
+                scope.set_extra('args', [list(report_args) for report_args in args])
+                scope.set_extra('sample_rate', sample_rate)
+                scope.set_extra('window', self.window)
+                scope.set_extra('dropped', dropped)
+                sentry_sdk.capture_message(message)
+
+    def _start_worker(self) -> None:
+        with self._worker_lock:
+            if self._worker_pid == os.getpid():
+                return
+
+            self._worker = threading.Thread(target=self._run, name='handled-error-reporter', daemon=True)
+            self._worker.start()
+            self._worker_pid = os.getpid()
+
+    def _run(self) -> None:
+        flush_at = time.monotonic() + self.window
+
+        while True:
+            timeout = flush_at - time.monotonic()
+            if timeout > 0:
+                try:
+                    self._count(self._queue.get(timeout=timeout))
+                    continue
+                except queue.Empty:
+                    pass
+
+            self.flush()
+            flush_at = time.monotonic() + self.window
+
+    def _count(self, report: Tuple[str, str, tuple]) -> None:
+        kind, message, args = report
+        with self._counts_lock:
+            count, reported_args = self._counts.get((kind, message), (0, []))
+            if args and len(reported_args) < MAX_REPORTED_ARGS:
+                reported_args.append(args)
+            self._counts[(kind, message)] = (count + 1, reported_args)
+
+
+def report_handled_error(kind: str, message: str, *args) -> None:
+    """
+    Reports an error handled by this application to Sentry, if enabled
+
+    :type kind: str
+    :param kind: kind of error, used for sampling (e.g. 'no_file')
+
+    :type message: str
+    :param message: message template to report (using '%s' placeholders)
+
+    :param args: values for message template
+    """
+    reporter = current_app.extensions.get('handled_error_reporter')
+    if reporter is not None:
+        reporter.report(kind, message, *args)
+
+
+def log_handled_error(kind: str, message: str, *args) -> None:
+    """
+    Logs an error handled by this application as a warning, records it in metrics and reports it to Sentry, if enabled
+
+    The message is a template, formatted with any arguments (using '%s' placeholders), so similar messages can be
+    grouped (e.g. by a `LogRateLimiter`, or in Sentry).
+
+    :type kind: str
+    :param kind: kind of error, used for sampling (e.g. 'no_file')
+
+    :type message: str
+    :param message: message template to log and report
+
+    :param args: values for message template
+    """
+    current_app.logger.warning(message, *args)
+    record_handled_error(kind)
+
+    # As the API handles this error through an error response, it is not reported to Sentry.
+    # However, because it's useful for tracking, we want report it anyway (in aggregate).
+    report_handled_error(kind, message, *args)
@@ -0,0 +1,231 @@
+import zlib
+
+from http import HTTPStatus
+from typing import Optional, Tuple
+
+from flask import Blueprint, request, abort, url_for, current_app as app
+
+from file_upload_endpoint.meta.errors import error_response_too_large
+from file_upload_endpoint.resumable.errors import error_response_invalid_header, error_response_offset_mismatch, \
+    error_response_too_many_uploads, error_response_upload_incomplete, register_error_templates
+from file_upload_endpoint.resumable.store import UPLOAD_STORES, UploadState
+from file_upload_endpoint.timings import time_phase
+
+# Content type for the body of requests continuing an upload
+CHUNK_CONTENT_TYPE = 'application/offset+octet-stream'
+
+resumable = Blueprint('resumable', __name__)
+
+
+@resumable.record_once
+def register_store(state) -> None:
+    """
+    Registers response templates and creates the upload store for this blueprint when registered with the application
+
+    The store is created when the application is created, before any worker processes are started, so that a shared
+    store is shared by all workers.
+
+    :param state: Flask blueprint setup state
+    """
+    register_error_templates(state.app.extensions['response_templates'])
+
+    config = state.app.config['RESUMABLE_UPLOADS_CONFIG']
+    state.app.extensions['resumable_uploads'] = UPLOAD_STORES[config['store']](
+        max_uploads=config['max_uploads'],
+        ttl=config['ttl']
+    )
+
+
+def get_header_int(name: str) -> int:
+    """
+    Gets a header from the current request as a non-negative integer
+
+    Aborts the request with the appropriate error if the header is missing or isn't a non-negative integer.
+
+    :type name: str
+    :param name: header name
+
+    :rtype: int
+    :return: header value
+    """
+    value = request.headers.get(name, '')
+    if not value.isdigit():
+        abort(error_response_invalid_header(name))
+    return int(value)
+
+
+def get_upload(upload_id: str) -> UploadState:
+    """
+    Gets the progress of an upload
+
+    Aborts the request as not found if the upload doesn't exist, or has expired.
+
+    :type upload_id: str
+    :param upload_id: upload ID
+
+    :rtype: UploadState
+    :return: upload progress
+    """
+    state = app.extensions['resumable_uploads'].get(upload_id)
+    if state is None:
+        abort(HTTPStatus.NOT_FOUND)
+    return state
+
+
+def upload_headers(state: UploadState) -> dict:
+    """
+    Creates response headers describing the progress of an upload
+
+    :type state: UploadState
+    :param state: upload progress
+
+    :rtype: dict
+    :return: response headers
+    """
+    headers = {
+        'Upload-Offset': str(state.offset),
+        'Upload-Length': str(state.length),
+        'Cache-Control': 'no-store'
+    }
+    if state.crc32 is not None:
+        headers['Upload-Checksum'] = f"crc32 { state.crc32:08x}"
+    return headers
+
+
+def receive_chunk(limit: int, crc32: Optional[int] = None) -> Tuple[int, Optional[int]]:
+    """
+    Reads and discards the body of the current request, counting its size and optionally updating a running checksum
+
+    The request body is read into a single, reused, buffer. Aborts the request as too large as soon as more than the
+    limit is read.
+
+    :type limit: int
+    :param limit: maximum number of bytes to read (the remaining length of the upload)
+
+    :type crc32: Optional[int]
+    :param crc32: running CRC32 checksum to update, or None to not calculate a checksum
+
+    :rtype: tuple
+    :return: number of bytes read and updated checksum
+    """
+    stream = request.stream
+    buffer = memoryview(bytearray(app.config['UPLOAD_STREAM_CHUNK_SIZE']))
+    received = 0
+
+    while True:
+        size = stream.readinto(buffer)
+        if not size:
+            return received, crc32
+
+        received += size
+        if received > limit:
+            abort(error_response_too_large(limit, received))
+        if crc32 is not None:
+            crc32 = zlib.crc32(buffer[:size], crc32)
+
+
+@resumable.route('/uploads', methods=['post'])
+def create_upload():
+    """
+    Starts a resumable upload
+
+    The total size of the upload is given by an 'Upload-Length' header. A running CRC32 checksum of the upload is
+    calculated if an 'Upload-Checksum-Algorithm: crc32' header is included.
+
+    Returns the URL of the upload, used to continue it, in a 'Location' header.
+    """
+
+    with time_phase('validate'):
+        length = get_header_int('Upload-Length')
+        max_length = app.config['RESUMABLE_UPLOADS_CONFIG']['max_length']
+        if length > max_length:
+            abort(error_response_too_large(max_length, length))
+
+        algorithm = request.headers.get('Upload-Checksum-Algorithm')
+        if algorithm is not None and algorithm.lower() != 'crc32':
+            abort(error_response_invalid_header('Upload-Checksum-Algorithm'))
+
+    upload_id = app.extensions['resumable_uploads'].create(length, checksum=algorithm is not None)
+    if upload_id is None:
+        abort(error_response_too_many_uploads())
+
+    headers = upload_headers(UploadState(length, 0, 0 if algorithm is not None else None))
+    # relative to the application root, so that it is correct where the application is mounted under a path prefix
+    headers['Location'] = url_for('resumable.continue_upload', upload_id=upload_id)
+    return '', HTTPStatus.CREATED, headers
+
+
+@resumable.route('/uploads/<upload_id>', methods=['head'])
+def get_upload_offset(upload_id: str):
+    """
+    Returns the progress of a resumable upload, in 'Upload-Offset' and 'Upload-Length' headers
+
+    Clients should use the 'Upload-Offset' header to continue an upload after a failed request.
+    """
+
+    return '', HTTPStatus.OK, upload_headers(get_upload(upload_id))
+
+
+@resumable.route('/uploads/<upload_id>', methods=['patch'])
+def continue_upload(upload_id: str):
+    """
+    Continues a resumable upload, with the request body appended from the offset given by an 'Upload-Offset' header
+
+    The offset must match the number of bytes already received. The request body must use the
+    'application/offset+octet-stream' content type. Chunks are not used or stored, and only the offset (and optional
+    checksum) of the upload is kept, so only one buffer is held while receiving each chunk.
+    """
+
+    with time_phase('validate'):
+        if request.mimetype != CHUNK_CONTENT_TYPE:
+            abort(error_response_invalid_header('Content-Type'))
+
+        offset = get_header_int('Upload-Offset')
+        state = get_upload(upload_id)
+        if offset != state.offset:
+            abort(error_response_offset_mismatch(state.offset, offset))
+
+        # Requests with a declared content length are rejected before any of the request body is read. Requests
+        # without (i.e. using chunked transfer encoding) are checked as the request body is streamed.
+        remaining = state.length - state.offset
+        if request.content_length is not None and request.content_length > remaining:
+            abort(error_response_too_large(remaining, request.content_length))
+
+    with time_phase('parse'):
+        received, crc32 = receive_chunk(remaining, state.crc32)
+
+    if not app.extensions['resumable_uploads'].advance(upload_id, offset, offset + received, crc32):
+        # another request continued the upload while this chunk was being received
+        abort(error_response_offset_mismatch(get_upload(upload_id).offset, offset))
+
+    state.offset += received
+    state.crc32 = crc32
+    return '', HTTPStatus.NO_CONTENT, upload_headers(state)
+
+
+@resumable.route('/uploads/<upload_id>/finalize', methods=['post'])
+def finalize_upload(upload_id: str):
+    """
+    Completes a resumable upload, once all of its bytes are received
+
+    Returns the final length, and checksum if calculated, of the upload. The upload is then removed.
+    """
+
+    state = get_upload(upload_id)
+    with time_phase('validate'):
+        if not state.complete:
+            abort(error_response_upload_incomplete(state.offset, state.length))
+
+    app.extensions['resumable_uploads'].delete(upload_id)
+    return '', HTTPStatus.NO_CONTENT, upload_headers(state)
+
+
+@resumable.route('/uploads/<upload_id>', methods=['delete'])
+def delete_upload(upload_id: str):
+    """
+    Abandons a resumable upload
+    """
+
+    if not app.extensions['resumable_uploads'].delete(upload_id):
+        abort(HTTPStatus.NOT_FOUND)
+    return '', HTTPStatus.NO_CONTENT
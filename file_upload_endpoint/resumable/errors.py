@@ -0,0 +1,191 @@
+from http import HTTPStatus
+from uuid import uuid4
+
+from flask import Response
+
+from file_upload_endpoint.meta.responses import ResponseTemplates, error_template, slot, template_response
+from file_upload_endpoint.reporting import log_handled_error
+
+
+def error_invalid_header(header: str) -> dict:
+    """
+    Creates an error for a missing or invalid header in a resumable upload request
+
+    :type header: str
+    :param header: Name of the header
+
+    :rtype: dict
+    :return: Complete JSON-API compatible error object
+    """
+    return {
+        'id': uuid4(),
+        'status': HTTPStatus.BAD_REQUEST,
+        'title': f"[{ header }] header missing or invalid in request",
+        'detail': 'Check the header is included in the request and is valid for resumable uploads'
+    }
+
+
+def error_offset_mismatch(upload_offset: int, request_offset: int) -> dict:
+    """
+    Creates an error for a resumable upload request which doesn't continue from the current offset of the upload
+
+    :type upload_offset: int
+    :param upload_offset: Number of bytes received for the upload
+
+    :type request_offset: int
+    :param request_offset: Offset given in the request
+
+    :rtype: dict
+    :return: Complete JSON-API compatible error object
+    """
+    return {
+        'id': uuid4(),
+        'status': HTTPStatus.CONFLICT,
+        'title': 'Upload offset does not match',
+        'detail': 'Check the current offset of the upload (using a HEAD request) and continue from this offset',
+        'meta': {
+            'upload_offset': upload_offset,
+            'request_offset': request_offset
+        }
+    }
+
+
+def error_upload_incomplete(upload_offset: int, upload_length: int) -> dict:
+    """
+    Creates an error for finalising a resumable upload before all of its bytes are received
+
+    :type upload_offset: int
+    :param upload_offset: Number of bytes received for the upload
+
+    :type upload_length: int
+    :param upload_length: Total size of the upload
+
+    :rtype: dict
+    :return: Complete JSON-API compatible error object
+    """
+    return {
+        'id': uuid4(),
+        'status': HTTPStatus.CONFLICT,
+        'title': 'Upload is incomplete',
+        'detail': 'Check all bytes of the upload have been sent before finalising it',
+        'meta': {
+            'upload_offset': upload_offset,
+            'upload_length': upload_length
+        }
+    }
+
+
+def error_too_many_uploads() -> dict:
+    """
+    Creates an error for starting a resumable upload when the maximum number of uploads are in progress
+
+    :rtype: dict
+    :return: Complete JSON-API compatible error object
+    """
+    return {
+        'id': uuid4(),
+        'status': HTTPStatus.SERVICE_UNAVAILABLE,
+        'title': 'Too many uploads in progress',
+        'detail': 'Try again once other uploads have finished or expired'
+    }
+
+
+def error_response_invalid_header(header: str) -> Response:
+    """
+    Creates an error response for a missing or invalid header in a resumable upload request
+
+    The error is logged and reported to Sentry, as it is handled by this API.
+
+    :type header: str
+    :param header: Name of the header
+
+    :rtype: Response
+    :return: Flask response
+    """
+    log_handled_error('invalid_header', "[%s] header missing or invalid in request", header)
+    return template_response('resumable.invalid_header', HTTPStatus.BAD_REQUEST, id=uuid4(), header=header)
+
+
+def error_response_offset_mismatch(upload_offset: int, request_offset: int) -> Response:
+    """
+    Creates an error response for a resumable upload request which doesn't continue from the current offset
+
+    The error is logged and reported to Sentry, as it is handled by this API.
+
+    :type upload_offset: int
+    :param upload_offset: Number of bytes received for the upload
+
+    :type request_offset: int
+    :param request_offset: Offset given in the request
+
+    :rtype: Response
+    :return: Flask response
+    """
+    log_handled_error(
+        'offset_mismatch',
+        "Upload offset, [%s], does not match request offset, [%s]",
+        upload_offset,
+        request_offset
+    )
+    return template_response(
+        'resumable.offset_mismatch',
+        HTTPStatus.CONFLICT,
+        id=uuid4(),
+        upload_offset=upload_offset,
+        request_offset=request_offset
+    )
+
+
+def error_response_upload_incomplete(upload_offset: int, upload_length: int) -> Response:
+    """
+    Creates an error response for finalising a resumable upload before all of its bytes are received
+
+    The error is logged and reported to Sentry, as it is handled by this API.
+
+    :type upload_offset: int
+    :param upload_offset: Number of bytes received for the upload
+
+    :type upload_length: int
+    :param upload_length: Total size of the upload
+
+    :rtype: Response
+    :return: Flask response
+    """
+    log_handled_error('upload_incomplete', "Upload is incomplete, [%s] of [%s] bytes", upload_offset, upload_length)
+    return template_response(
+        'resumable.upload_incomplete',
+        HTTPStatus.CONFLICT,
+        id=uuid4(),
+        upload_offset=upload_offset,
+        upload_length=upload_length
+    )
+
+
+def error_response_too_many_uploads() -> Response:
+    """
+    Creates an error response for starting a resumable upload when the maximum number of uploads are in progress
+
+    The error is logged and reported to Sentry, as it is handled by this API.
+
+    :rtype: Response
+    :return: Flask response
+    """
+    log_handled_error('too_many_uploads', "Too many uploads in progress")
+    return template_response('resumable.too_many_uploads', HTTPStatus.SERVICE_UNAVAILABLE, id=uuid4())
+
+
+def register_error_templates(templates: ResponseTemplates) -> None:
+    """
+    Registers response templates for errors, which are the same for each request other than their ID and any meta data
+
+    :type templates: ResponseTemplates
+    :param templates: Response templates extension
+    """
+    templates.register('resumable.invalid_header', error_template(error_invalid_header(slot('header'))))
+    templates.register('resumable.offset_mismatch', error_template(
+        error_offset_mismatch(slot('upload_offset'), slot('request_offset'))
+    ))
+    templates.register('resumable.upload_incomplete', error_template(
+        error_upload_incomplete(slot('upload_offset'), slot('upload_length'))
+    ))
+    templates.register('resumable.too_many_uploads', error_template(error_too_many_uploads()))
@@ -0,0 +1,294 @@
+import mmap
+import multiprocessing
+import struct
+import threading
+import time
+
+from typing import Dict, Optional
+from uuid import uuid4
+
+
+class UploadState(object):
+    """
+    Progress of a resumable upload
+
+    :type length: int
+    :param length: total size of the upload (in bytes)
+
+    :type offset: int
+    :param offset: number of bytes received so far
+
+    :type crc32: Optional[int]
+    :param crc32: running CRC32 checksum of the bytes received so far, or None if not tracked
+
+    :type expires_at: float
+    :param expires_at: time (since the epoch) after which the upload is discarded, unless continued
+    """
+
+    __slots__ = ('length', 'offset', 'crc32', 'expires_at')
+
+    def __init__(self, length: int, offset: int = 0, crc32: Optional[int] = None, expires_at: float = 0.0):
+        self.length = length
+        self.offset = offset
+        self.crc32 = crc32
+        self.expires_at = expires_at
+
+    @property
+    def complete(self) -> bool:
+        """
+        Whether all bytes of the upload have been received
+        """
+        return self.offset == self.length
+
+
+class MemoryUploadStore(object):
+    """
+    Resumable upload progress, stored in memory for a single process
+
+    The number of uploads is bounded. Uploads expire if not continued within a time to live, with expired uploads
+    removed when looked up, or when the store is full. Once full (of uploads which haven't expired), new uploads are
+    refused.
+
+    :type max_uploads: int
+    :param max_uploads: maximum number of uploads in progress
+
+    :type ttl: float
+    :param ttl: time uploads are kept after they were last continued (in seconds)
+    """
+
+    def __init__(self, max_uploads: int = 1024, ttl: float = 3600):
+        self.max_uploads = max_uploads
+        self.ttl = ttl
+
+        self._uploads: Dict[str, UploadState] = {}
+        self._lock = threading.Lock()
+
+    def create(self, length: int, checksum: bool = False) -> Optional[str]:
+        """
+        Starts a new upload
+
+        :type length: int
+        :param length: total size of the upload (in bytes)
+
+        :type checksum: bool
+        :param checksum: whether to track a running CRC32 checksum of the upload
+
+        :rtype: Optional[str]
+        :return: upload ID, or None if the store is full
+        """
+        upload_id = uuid4().hex
+        now = time.time()
+        with self._lock:
+            if len(self._uploads) >= self.max_uploads:
+                for expired_id in [key for key, state in self._uploads.items() if state.expires_at <= now]:
+                    del self._uploads[expired_id]
+                if len(self._uploads) >= self.max_uploads:
+                    return None
+
+            self._uploads[upload_id] = UploadState(length, 0, 0 if checksum else None, now + self.ttl)
+        return upload_id
+
+    def get(self, upload_id: str) -> Optional[UploadState]:
+        """
+        Gets the progress of an upload
+
+        :type upload_id: str
+        :param upload_id: upload ID
+
+        :rtype: Optional[UploadState]
+        :return: a copy of the upload's progress, or None if the upload doesn't exist or has expired
+        """
+        with self._lock:
+            state = self._uploads.get(upload_id)
+            if state is None:
+                return None
+            if state.expires_at <= time.time():
+                del self._uploads[upload_id]
+                return None
+            return UploadState(state.length, state.offset, state.crc32, state.expires_at)
+
+    def advance(self, upload_id: str, offset: int, new_offset: int, crc32: Optional[int] = None) -> bool:
+        """
+        Records bytes received for an upload, if its offset hasn't changed since it was read
+
+        Where two requests continue an upload from the same offset concurrently, only the first is recorded.
+
+        :type upload_id: str
+        :param upload_id: upload ID
+
+        :type offset: int
+        :param offset: offset the bytes were received from
+
+        :type new_offset: int
+        :param new_offset: offset after the bytes received
+
+        :type crc32: Optional[int]
+        :param crc32: running CRC32 checksum after the bytes received
+
+        :rtype: bool
+        :return: whether the bytes were recorded
+        """
+        with self._lock:
+            state = self._uploads.get(upload_id)
+            if state is None or state.offset != offset or state.expires_at <= time.time():
+                return False
+
+            state.offset = new_offset
+            if state.crc32 is not None:
+                state.crc32 = crc32
+            state.expires_at = time.time() + self.ttl
+        return True
+
+    def delete(self, upload_id: str) -> bool:
+        """
+        Removes an upload
+
+        :type upload_id: str
+        :param upload_id: upload ID
+
+        :rtype: bool
+        :return: whether the upload existed
+        """
+        with self._lock:
+            return self._uploads.pop(upload_id, None) is not None
+
+
+class SharedUploadStore(object):
+    """
+    Resumable upload progress, stored in shared memory for all worker processes
+
+    Progress is stored in a fixed size table of records, in an anonymous memory map, with a lock shared between
+    processes. This store must be created before worker processes are started (forked), so that they share the same
+    memory. Requests to continue an upload can then be handled by any worker.
+
+    Uploads are found using open addressing (the slot an upload is stored in is chosen by its ID, or the next free
+    slot), so lookups take constant time while the table isn't close to full. Probing stops at the first empty slot.
+    Deleted and expired uploads are kept as markers (so probing continues past them) only while a later slot in the
+    same run is in use, otherwise they are emptied, so deleting uploads doesn't make later lookups slower. Markers are
+    reused by new uploads. Behaviour otherwise matches the `MemoryUploadStore`.
+
+    :type max_uploads: int
+    :param max_uploads: maximum number of uploads in progress (slots in the table)
+
+    :type ttl: float
+    :param ttl: time uploads are kept after they were last continued (in seconds)
+    """
+
+    # upload ID, length, offset, CRC32, flags, expiry time
+    RECORD = struct.Struct('<16sQQIId')
+
+    FLAG_USED = 1
+    FLAG_DELETED = 2
+    FLAG_CHECKSUM = 4
+
+    def __init__(self, max_uploads: int = 1024, ttl: float = 3600):
+        self.max_uploads = max_uploads
+        self.ttl = ttl
+
+        self._table = mmap.mmap(-1, self.RECORD.size * max_uploads)
+        self._lock = multiprocessing.Lock()
+
+    def create(self, length: int, checksum: bool = False) -> Optional[str]:
+        upload_id = uuid4()
+        now = time.time()
+        flags = self.FLAG_USED | (self.FLAG_CHECKSUM if checksum else 0)
+        with self._lock:
+            for slot in self._probe(upload_id.bytes):
+                if not self._occupied(slot, now):
+                    self._write(slot, upload_id.bytes, length, 0, 0, flags, now + self.ttl)
+                    return upload_id.hex
+        return None
+
+    def get(self, upload_id: str) -> Optional[UploadState]:
+        with self._lock:
+            slot = self._find(upload_id)
+            if slot is None:
+                return None
+            _, length, offset, crc32, flags, expires_at = self._read(slot)
+            return UploadState(length, offset, crc32 if flags & self.FLAG_CHECKSUM else None, expires_at)
+
+    def advance(self, upload_id: str, offset: int, new_offset: int, crc32: Optional[int] = None) -> bool:
+        with self._lock:
+            slot = self._find(upload_id)
+            if slot is None:
+                return False
+            key, length, current_offset, current_crc32, flags, _ = self._read(slot)
+            if current_offset != offset:
+                return False
+
+            if flags & self.FLAG_CHECKSUM:
+                current_crc32 = crc32
+            self._write(slot, key, length, new_offset, current_crc32, flags, time.time() + self.ttl)
+        return True
+
+    def delete(self, upload_id: str) -> bool:
+        with self._lock:
+            slot = self._find(upload_id)
+            if slot is None:
+                return False
+            self._remove(slot)
+        return True
+
+    def _probe(self, key: bytes):
+        start = int.from_bytes(key[:8], 'little') % self.max_uploads
+        for i in range(self.max_uploads):
+            yield (start + i) % self.max_uploads
+
+    def _find(self, upload_id: str) -> Optional[int]:
+        try:
+            key = bytes.fromhex(upload_id)
+        except ValueError:
+            return None
+        if len(key) != 16:
+            return None
+
+        now = time.time()
+        for slot in self._probe(key):
+            slot_key, _, _, _, flags, expires_at = self._read(slot)
+            if not flags & self.FLAG_USED:
+                # uploads are stored in the first free slot, so later slots can't contain this upload
+                return None
+            if flags & self.FLAG_DELETED:
+                continue
+            if expires_at <= now:
+                # expired uploads are removed as they are found, so they can be emptied
+                self._remove(slot)
+                if slot_key == key:
+                    return None
+                continue
+            if slot_key == key:
+                return slot
+        return None
+
+    def _occupied(self, slot: int, now: float) -> bool:
+        _, _, _, _, flags, expires_at = self._read(slot)
+        return bool(flags & self.FLAG_USED) and not flags & self.FLAG_DELETED and expires_at > now
+
+    def _remove(self, slot: int) -> None:
+        next_slot = (slot + 1) % self.max_uploads
+        if next_slot != slot and self._read(next_slot)[4] & self.FLAG_USED:
+            # a later upload in the same run may have probed past this slot, so it is kept as a marker
+            key, length, offset, crc32, flags, expires_at = self._read(slot)
+            self._write(slot, key, length, offset, crc32, flags | self.FLAG_DELETED, expires_at)
+            return
+
+        # the run ends after this slot, so it, and any markers before it, can be emptied
+        now = time.time()
+        for _ in range(self.max_uploads):
+            self._write(slot, bytes(16), 0, 0, 0, 0, 0.0)
+            slot = (slot - 1) % self.max_uploads
+            if self._occupied(slot, now) or not self._read(slot)[4] & self.FLAG_USED:
+                return
+
+    def _read(self, slot: int) -> tuple:
+        return self.RECORD.unpack_from(self._table, slot * self.RECORD.size)
+
+    def _write(self, slot: int, *values) -> None:
+        self.RECORD.pack_into(self._table, slot * self.RECORD.size, *values)
+
+
+# Resumable upload stores, selected using the `store` option of the `RESUMABLE_UPLOADS_CONFIG` config option
+UPLOAD_STORES = {
+    'memory': MemoryUploadStore,
+    'shared': SharedUploadStore
+}
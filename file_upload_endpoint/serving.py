@@ -0,0 +1,348 @@
+import gc
+import os
+import signal
+import socket
+import time
+
+from typing import Dict, Optional
+
+from flask import Flask as App
+from waitress.channel import HTTPChannel
+from waitress.parser import HTTPRequestParser
+from waitress.server import create_server as create_waitress_server
+from waitress.task import ErrorTask, WSGITask
+from waitress.utilities import RequestEntityTooLarge
+
+from file_upload_endpoint.meta.errors import error_response_too_large
+from file_upload_endpoint.middleware.health import TASK_DISPATCHER_ENVIRON_KEY
+from file_upload_endpoint.timings import RECEIVE_ENVIRON_KEY
+
+
+class UploadTooLarge(RequestEntityTooLarge):
+    """
+    Waitress error for requests over the maximum content length of a specific route
+
+    :type limit: int
+    :param limit: maximum content length allowed for the route (in bytes)
+    """
+
+    def __init__(self, limit: int):
+        super().__init__(f"exceeds maximum content length of { limit }")
+        self.limit = limit
+
+
+class UploadErrorTask(ErrorTask):
+    """
+    Waitress task for requests rejected by the server before reaching the application
+
+    Requests rejected as too large are returned as JSON-API errors, consistent with those returned by the application,
+    including a Request ID header where enabled. Other errors use the default Waitress response.
+    """
+
+    def execute(self):
+        error = self.request.error
+        if not isinstance(error, RequestEntityTooLarge):
+            return super().execute()
+
+        app = self.channel.app
+        limit = getattr(error, 'limit', app.config['MAX_CONTENT_LENGTH'])
+        # For chunked requests, there is no content length so the amount of the request body read is used instead
+        request_size = self.request.content_length or getattr(self.request, 'body_bytes_received', 0)
+        with app.app_context():
+            body = error_response_too_large(limit, request_size).get_data()
+
+        self.status = f"{ error.code } { error.reason }"
+        self.response_headers.extend([('Content-Length', str(len(body))), ('Content-Type', 'application/json')])
+        request_id = app.extensions.get('request_id')
+        if request_id is not None:
+            # Waitress stores request headers upper cased, with underscores rather than hyphens
+            self.response_headers.append(
+                ('X-Request-ID', request_id.compute_request_id_header(self.request.headers.get('X_REQUEST_ID')))
+            )
+        self.set_close_on_finish()
+        self.content_length = len(body)
+        self.write(body)
+
+
+class UploadHTTPRequestParser(HTTPRequestParser):
+    """
+    Waitress request parser recording how long the request body took to receive
+
+    Waitress receives the whole request body before calling the application, so the application can't time reading
+    it from the client itself.
+    """
+
+    body_started_at = None
+    completed_at = None
+
+    def received(self, data):
+        consumed = super().received(data)
+
+        now = time.perf_counter()
+        if self.body_started_at is None and self.headers_finished:
+            self.body_started_at = now
+        if self.completed and self.completed_at is None:
+            self.completed_at = now
+
+        return consumed
+
+
+class UploadWSGITask(WSGITask):
+    """
+    Waitress task including the time taken to receive the request body, and the server's task dispatcher (for
+    readiness health checks), in the WSGI environment
+    """
+
+    def get_environment(self):
+        environ = super().get_environment()
+        environ[TASK_DISPATCHER_ENVIRON_KEY] = self.channel.server.task_dispatcher
+
+        request = self.request
+        if request.body_started_at is not None and request.completed_at is not None:
+            environ.setdefault(
+                RECEIVE_ENVIRON_KEY,
+                (request.completed_at - request.body_started_at, request.content_length)
+            )
+
+        return environ
+
+
+class UploadHTTPChannel(HTTPChannel):
+    """
+    Waitress channel which avoids requesting bodies for requests that will be rejected as too large
+
+    Clients may send an 'Expect: 100-continue' header to check a request will be accepted before sending its body. By
+    default, Waitress sends a '100 Continue' response once headers are received, even where the request has already
+    been rejected because its content length is too great. Route specific limits can't be checked by the application
+    until Waitress has read the entire request body.
+
+    This channel checks the declared content length against the maximum allowed for the route before inviting the
+    client to continue. If too large, the request is rejected instead, meaning the request body is never sent.
+    """
+
+    parser_class = UploadHTTPRequestParser
+    task_class = UploadWSGITask
+    error_task_class = UploadErrorTask
+    app = None  # type: App
+
+    def send_continue(self):
+        request = self.request
+        route_limits = self.app.config['UPLOAD_ROUTE_MAX_CONTENT_LENGTHS']
+
+        limit = route_limits.get(request.path)
+        if request.error is None and limit is not None and request.content_length > limit:
+            request.error = UploadTooLarge(limit)
+            request.completed = True
+
+        if request.error is not None:
+            return
+
+        super().send_continue()
+
+
+def create_server(app: App, **kwargs):
+    """
+    Creates a Waitress server for the application
+
+    The maximum request body size is set from the application's maximum content length, so that oversized requests
+    are rejected by the server as soon as their headers are received.
+
+    :type app: App
+    :param app: Flask application
+
+    :param kwargs: additional Waitress options (e.g. host, port)
+
+    :return: Waitress server
+    """
+    server = create_waitress_server(
+        app,
+        # Waitress rejects bodies equal to or larger than this value
+        max_request_body_size=app.config['MAX_CONTENT_LENGTH'] + 1,
+        **kwargs
+    )
+    server.channel_class = type('UploadHTTPChannel', (UploadHTTPChannel,), {'app': app})
+
+    return server
+
+
+def create_listening_socket(host: str, port: int, reuse_port: bool = False) -> socket.socket:
+    """
+    Creates a TCP socket bound to an interface and port, which a Waitress server can listen on
+
+    :type host: str
+    :param host: interface to bind to
+
+    :type port: int
+    :param port: port to bind to (0 for any free port)
+
+    :type reuse_port: bool
+    :param reuse_port: whether other sockets can bind to the same port (using `SO_REUSEPORT`)
+
+    :rtype: socket.socket
+    :return: bound socket
+    """
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    return sock
+
+
+class WorkerPool(object):
+    """
+    Runs the application in multiple Waitress worker processes, listening on the same port
+
+    Python threads can't run in parallel, so a single process can use at most one CPU core. Worker processes are
+    forked from this (parent) process, so the application is only created once. To avoid copying memory shared with the
+    parent, the garbage collector is frozen before forking (otherwise objects are written to when they are checked).
+
+    Where supported, each worker listens on its own socket bound to the same port (using `SO_REUSEPORT`), with
+    connections distributed between workers by the kernel. Otherwise workers listen on a single socket, created by the
+    parent.
+
+    Workers which exit unexpectedly are replaced. When the parent is stopped (SIGINT or SIGTERM), workers are stopped.
+
+    :type app: App
+    :param app: Flask application
+
+    :type workers: int
+    :param workers: number of worker processes
+
+    :type host: str
+    :param host: interface to listen on
+
+    :type port: int
+    :param port: port to listen on (0 for any free port)
+
+    :type reuse_port: bool
+    :param reuse_port: whether to use a socket per worker, if supported
+
+    :param kwargs: additional Waitress options (e.g. threads)
+    """
+
+    def __init__(self, app: App, workers: int, host: str, port: int, reuse_port: bool = True, **kwargs):
+        self.app = app
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.reuse_port = reuse_port and hasattr(socket, 'SO_REUSEPORT')
+        self.options = kwargs
+
+        self.socket: Optional[socket.socket] = None
+        self.children: Dict[int, float] = {}
+        self.stopping = False
+
+    def run(self) -> None:
+        """
+        Starts workers, replacing any which exit, until stopped
+        """
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        self.start()
+        self.app.logger.info(
+            "Serving on http://%s:%d using %d workers (%s)",
+            self.host,
+            self.port,
+            self.workers,
+            'SO_REUSEPORT' if self.reuse_port else 'shared socket'
+        )
+
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+
+            started_at = self.children.pop(pid, None)
+            if started_at is None or self.stopping:
+                continue
+
+            self.app.logger.error("Worker [%d] exited unexpectedly with status [%d], replacing", pid, status)
+            # avoid repeatedly forking workers which fail as soon as they start
+            if time.monotonic() - started_at < 1:
+                time.sleep(1)
+            self._spawn()
+
+        self.socket.close()
+
+    def start(self) -> None:
+        """
+        Creates the listening socket and forks workers
+        """
+        # With SO_REUSEPORT, this socket is bound (to reserve the port) but never listened on, so it doesn't receive
+        # connections. Workers each create their own socket for the same port.
+        self.socket = create_listening_socket(self.host, self.port, reuse_port=self.reuse_port)
+        self.port = self.socket.getsockname()[1]
+
+        gc.collect()
+        gc.freeze()
+        for _ in range(self.workers):
+            self._spawn()
+
+    def stop(self) -> None:
+        """
+        Stops all workers
+        """
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _handle_stop(self, signum, frame) -> None:
+        self.stop()
+
+    def _spawn(self) -> None:
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.monotonic()
+            return
+
+        # Worker process, exits (via SystemExit, so exit handlers run) rather than returning to the parent's code
+        self.children = {}
+        signal.signal(signal.SIGTERM, self._handle_worker_stop)
+        signal.signal(signal.SIGINT, self._handle_worker_stop)
+        if self.reuse_port:
+            sock = create_listening_socket(self.host, self.port, reuse_port=True)
+            self.socket.close()
+        else:
+            sock = self.socket
+
+        server = create_server(self.app, sockets=[sock], **self.options)
+        server.run()
+        raise SystemExit(0)
+
+    @staticmethod
+    def _handle_worker_stop(signum, frame) -> None:
+        # workers may be signalled by both the parent and the terminal (process group), exit handlers shouldn't be
+        # interrupted by a second signal
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        raise SystemExit(0)
+
+
+def serve(app: App, workers: int = 1, reuse_port: bool = True, **kwargs) -> None:
+    """
+    Runs the application using a Waitress server, in one or more worker processes
+
+    :type app: App
+    :param app: Flask application
+
+    :type workers: int
+    :param workers: number of worker processes, using a `WorkerPool` if more than one
+
+    :type reuse_port: bool
+    :param reuse_port: whether each worker uses its own socket, if supported (see `WorkerPool`)
+
+    :param kwargs: additional Waitress options (e.g. host, port)
+    """
+    if workers > 1:
+        WorkerPool(app, workers, kwargs.pop('host'), kwargs.pop('port'), reuse_port=reuse_port, **kwargs).run()
+        return
+
+    server = create_server(app, **kwargs)
+    server.print_listen('Serving on http://{}:{}')
+    server.run()
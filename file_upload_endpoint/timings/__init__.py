@@ -0,0 +1,248 @@
+import logging
+import time
+
+from contextlib import contextmanager, nullcontext
+from typing import ContextManager, Dict, Optional, Tuple
+
+from flask import Flask as App, Response, has_request_context, request
+
+# WSGI environment key for the timings of the current request
+ENVIRON_KEY = 'file_upload_endpoint.timings'
+
+# WSGI environment key for the time a server spent receiving the request body before the application was called (in
+# seconds) and the number of bytes received, set by servers which buffer request bodies (see `serving` and `asgi`)
+RECEIVE_ENVIRON_KEY = 'file_upload_endpoint.receive'
+
+PHASES = ('read', 'parse', 'validate', 'respond')
+
+
+class TimedStream(object):
+    """
+    Wrapper for a request body stream (WSGI input), recording the time spent reading from it and the bytes read
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.seconds = 0.0
+        self.bytes = 0
+
+    def read(self, *args) -> bytes:
+        started_at = time.perf_counter()
+        data = self._stream.read(*args)
+        self.seconds += time.perf_counter() - started_at
+        self.bytes += len(data)
+        return data
+
+    def readinto(self, buffer) -> Optional[int]:
+        started_at = time.perf_counter()
+        size = self._stream.readinto(buffer)
+        self.seconds += time.perf_counter() - started_at
+        self.bytes += size or 0
+        return size
+
+    def readline(self, *args) -> bytes:
+        started_at = time.perf_counter()
+        data = self._stream.readline(*args)
+        self.seconds += time.perf_counter() - started_at
+        self.bytes += len(data)
+        return data
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def close(self) -> None:
+        if hasattr(self._stream, 'close'):
+            self._stream.close()
+
+
+class UploadTimings(object):
+    """
+    Time spent in each phase of handling a request
+
+    Phases:
+    * read: reading the request body, from the server (or by the server from the client, where it buffers bodies)
+    * parse: parsing the request body (e.g. multipart/form-data), excluding time spent reading it
+    * validate: checking the request and any uploaded files, excluding time spent reading them
+    * respond: building the response, from the end of the last phase until the response is complete
+
+    Time spent reading the request body within other phases is counted as reading, so slow clients can be told apart
+    from the cost of processing requests.
+
+    :type stream: TimedStream
+    :param stream: request body stream
+
+    :type receive: Optional[Tuple[float, int]]
+    :param receive: time spent by the server receiving the request body (in seconds) and the number of bytes received
+    """
+
+    __slots__ = ('stream', 'receive_seconds', 'receive_bytes', 'started_at', 'marked_at', 'durations')
+
+    def __init__(self, stream: TimedStream, receive: Optional[Tuple[float, int]] = None):
+        self.stream = stream
+        self.receive_seconds, self.receive_bytes = receive or (0.0, 0)
+        self.started_at = self.marked_at = time.perf_counter()
+        self.durations: Dict[str, float] = dict.fromkeys(PHASES[1:], 0.0)
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Times a phase, excluding any time spent reading the request body
+
+        A phase may be timed more than once, with its durations added together.
+
+        :type name: str
+        :param name: phase (e.g. 'parse')
+        """
+        started_at = time.perf_counter()
+        read_seconds = self.stream.seconds
+        try:
+            yield
+        finally:
+            self.marked_at = time.perf_counter()
+            self.durations[name] += self.marked_at - started_at - (self.stream.seconds - read_seconds)
+
+    def finish(self) -> None:
+        """
+        Times the respond phase, once the response is complete
+        """
+        self.durations['respond'] = time.perf_counter() - self.marked_at
+
+    @property
+    def read_seconds(self) -> float:
+        """
+        Time spent reading the request body, by the server and the application
+        """
+        return self.receive_seconds + self.stream.seconds
+
+    @property
+    def bytes_read(self) -> int:
+        """
+        Number of bytes read from the request body
+        """
+        return max(self.receive_bytes, self.stream.bytes)
+
+    @property
+    def bytes_per_second(self) -> Optional[float]:
+        """
+        Rate at which the request body was read, or None if no time was spent reading it
+        """
+        if self.read_seconds <= 0:
+            return None
+        return self.bytes_read / self.read_seconds
+
+    @property
+    def total_seconds(self) -> float:
+        """
+        Time from the server receiving the request body, until the response is complete
+        """
+        return self.receive_seconds + self.marked_at - self.started_at + self.durations['respond']
+
+    def as_dict(self) -> dict:
+        """
+        Timings in milliseconds, with the bytes read and read rate (per second), for structured logging
+
+        :rtype: dict
+        :return: timings
+        """
+        timings = {'read_ms': self.read_seconds * 1000}
+        for name in PHASES[1:]:
+            timings[f"{ name }_ms"] = self.durations[name] * 1000
+        timings['total_ms'] = self.total_seconds * 1000
+        timings['bytes_read'] = self.bytes_read
+        timings['bytes_per_second'] = self.bytes_per_second
+        return timings
+
+    def header(self) -> str:
+        """
+        Formats timings as a Server-Timing header value
+
+        :rtype: str
+        :return: header value
+        """
+        read_description = f"{ self.bytes_read } bytes"
+        if self.bytes_per_second is not None:
+            read_description += f" at { self.bytes_per_second:.0f} bytes/s"
+
+        metrics = [f"read;dur={ self.read_seconds * 1000:.3f};desc=\"{ read_description }\""]
+        for name in PHASES[1:]:
+            metrics.append(f"{ name };dur={ self.durations[name] * 1000:.3f}")
+        metrics.append(f"total;dur={ self.total_seconds * 1000:.3f}")
+        return ', '.join(metrics)
+
+
+class ServerTiming(object):
+    """
+    Flask extension recording how long each phase of handling a request takes
+
+    Timings (see `UploadTimings`) are returned in a `Server-Timing` response header, which browsers show in their
+    developer tools. For requests with a body, timings are also logged (at `log_level`, debug by default, so as not to
+    log every upload in production), with the Request ID of the request.
+
+    To time a phase: `with time_phase('parse'): ...`
+
+    The request body stream is wrapped to time reading it. Where a server buffers request bodies before calling the
+    application, the time it spent receiving the body can be set in the WSGI environment (`RECEIVE_ENVIRON_KEY`).
+
+    This extension should be created before other extensions adding response hooks, so that the respond phase
+    includes them.
+    """
+
+    def __init__(self, app: App, log_level: int = logging.DEBUG):
+        self.logger = app.logger
+        self.log_level = log_level
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.extensions['server_timing'] = self
+
+    @staticmethod
+    def _before_request() -> None:
+        stream = TimedStream(request.environ['wsgi.input'])
+        request.environ['wsgi.input'] = stream
+        request.environ[ENVIRON_KEY] = UploadTimings(stream, request.environ.get(RECEIVE_ENVIRON_KEY))
+
+    def _after_request(self, response: Response) -> Response:
+        timings = request.environ.get(ENVIRON_KEY)
+        if timings is None:
+            return response
+
+        timings.finish()
+        response.headers['Server-Timing'] = timings.header()
+
+        if (timings.bytes_read or request.content_length) and self.logger.isEnabledFor(self.log_level):
+            self.logger.log(
+                self.log_level,
+                "Request timings: %s",
+                response.headers['Server-Timing'],
+                extra={'timings': timings.as_dict()}
+            )
+
+        return response
+
+
+def get_timings() -> Optional[UploadTimings]:
+    """
+    Gets timings for the current request, if timings are enabled
+
+    :rtype: Optional[UploadTimings]
+    :return: timings
+    """
+    if not has_request_context():
+        return None
+    return request.environ.get(ENVIRON_KEY)
+
+
+def time_phase(name: str) -> ContextManager:
+    """
+    Times a phase of the current request, if timings are enabled
+
+    :type name: str
+    :param name: phase (e.g. 'parse')
+
+    :rtype: ContextManager
+    :return: context manager timing the phase
+    """
+    timings = get_timings()
+    if timings is None:
+        return nullcontext()
+    return timings.phase(name)
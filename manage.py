@@ -1,6 +1,13 @@
+import json
 import os
-import unittest
+
+import click
+
 from file_upload_endpoint import create_app
+from file_upload_endpoint.benchmarks import SCENARIOS
+
+# Modules only needed by specific commands are imported within them, so they aren't imported when this module is used
+# as the application's entry point (e.g. by a WSGI server)
 
 app = create_app(os.getenv('FLASK_ENV') or 'default')
 
@@ -15,5 +22,143 @@ if 'PYCHARM_HOSTED' in os.environ:
 @app.cli.command()
 def test():
     """Run integration tests."""
+    import unittest
+
     tests = unittest.TestLoader().discover(os.path.join(os.path.dirname(__file__), 'tests'))
     unittest.TextTestRunner(verbosity=2).run(tests)
+
+
+@app.cli.command()
+@click.option('--host', default='0.0.0.0', help='Interface to listen on.')  # nosec
+@click.option('--port', default=9001, help='Port to listen on.')
+@click.option('--workers', type=int, help='Number of worker processes (default from config).')
+@click.option('--threads', type=int, help='Number of threads per worker (default from config).')
+def serve(host: str, port: int, workers: int, threads: int):
+    """Run application using production web server."""
+    from file_upload_endpoint.serving import serve as serve_app
+
+    options = dict(app.config['SERVER_CONFIG'])
+    if workers is not None:
+        options['workers'] = workers
+    if threads is not None:
+        options['threads'] = threads
+    serve_app(app, host=host, port=port, **options)
+
+
+@app.cli.command('bench-validation')
+@click.option('--number', default=1000, help='Number of validations per run.')
+def bench_validation(number: int):
+    """Compare request validation engines."""
+    from file_upload_endpoint.benchmarks.validation import benchmark_validation
+
+    for result in benchmark_validation(number):
+        click.echo(
+            f"{ result['schema']:<16} { result['engine']:<20} { result['document']:<8} "
+            f"{ result['microseconds_per_validation']:>10.2f} µs"
+        )
+
+
+@app.cli.command('bench-request-id')
+@click.option('--number', default=10000, help='Number of requests per run.')
+def bench_request_id(number: int):
+    """Measure Request ID middleware overhead."""
+    from file_upload_endpoint.benchmarks.request_id import benchmark_request_id
+
+    for result in benchmark_request_id(number):
+        click.echo(
+            f"{ result['generator']:<14} { result['header']:<16} { result['microseconds_per_request']:>8.2f} µs"
+        )
+
+
+@app.cli.command('bench-multipart')
+@click.option('--size', default=1024 * 1024, help='Approximate size of each request body (in bytes).')
+@click.option('--number', default=5, help='Number of times each body is parsed per run.')
+def bench_multipart(size: int, number: int):
+    """Measure multipart parsing cost for adversarial request bodies."""
+    from file_upload_endpoint.benchmarks.multipart import benchmark_multipart
+
+    for result in benchmark_multipart(
+        app.config['MULTIPART_LIMITS'],
+        size=size,
+        chunk_size=app.config['UPLOAD_STREAM_CHUNK_SIZE'],
+        number=number
+    ):
+        click.echo(
+            f"{ result['body']:<16} { result['limits']:<10} { result['parts']:>8} parts "
+            f"{ result['bytes_read']:>10} / { result['body_bytes']:<10} bytes read "
+            f"{ result['milliseconds_per_body']:>10.2f} ms"
+        )
+
+
+@app.cli.command('bench-rate-limit')
+@click.option('--number', default=10000, help='Number of requests per run.')
+def bench_rate_limit(number: int):
+    """Measure rate limit middleware overhead."""
+    from file_upload_endpoint.benchmarks.rate_limit import benchmark_rate_limit
+
+    for result in benchmark_rate_limit(number):
+        click.echo(f"{ result['key']:<18} { result['budget']:<8} { result['microseconds_per_request']:>8.2f} µs")
+
+
+@app.cli.command()
+@click.option('--scenario', 'scenarios', multiple=True, type=click.Choice(SCENARIOS), help='Scenario(s) to run.')
+@click.option('--requests', default=1000, help='Number of requests per scenario.')
+@click.option('--concurrency', default=10, help='Number of concurrent clients.')
+@click.option('--payload-size', default=64 * 1024, help='Size of each uploaded file (in bytes).')
+@click.option('--file-count', default=3, help='Number of files per request for multiple uploads.')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), help='File to write results to as JSON.')
+def bench(scenarios: tuple, requests: int, concurrency: int, payload_size: int, file_count: int, output: str):
+    """Benchmark application over HTTP using production web server."""
+    from file_upload_endpoint.benchmarks.load import benchmark_load
+
+    def progress(result: dict):
+        latency = result['latency_ms']
+        click.echo(
+            f"{ result['scenario']:<36} { result['requests_per_second']:>9.1f} req/s "
+            f"p50 { latency['p50']:>8.2f} ms p95 { latency['p95']:>8.2f} ms p99 { latency['p99']:>8.2f} ms "
+            f"max { latency['max']:>8.2f} ms errors { result['error_rate']:>6.1%}"
+        )
+
+    results = benchmark_load(
+        app,
+        scenarios=list(scenarios),
+        requests=requests,
+        concurrency=concurrency,
+        payload_size=payload_size,
+        file_count=file_count,
+        progress=progress
+    )
+    if results['server_peak_rss_bytes'] is not None:
+        click.echo(f"server peak RSS { results['server_peak_rss_bytes'] / 1024 / 1024:.1f} MB")
+
+    if output:
+        with open(output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+        click.echo(f"results written to { output }")
+
+
+@app.cli.command('startup-profile')
+@click.option('--config', 'config_name', default=os.getenv('FLASK_ENV') or 'default', help='Configuration to use.')
+@click.option('--limit', default=15, help='Number of modules and packages to show in each breakdown.')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), help='File to write results to as JSON.')
+def startup_profile(config_name: str, limit: int, output: str):
+    """Profile application import and creation time by module."""
+    from file_upload_endpoint.benchmarks.startup import profile_startup
+
+    results = profile_startup(config_name, limit=limit)
+    click.echo(f"import { results['import_ms']:>8.1f} ms, create_app() { results['create_app_ms']:>8.1f} ms")
+
+    click.echo('\nImports by package (own time):')
+    for item in results['imports_by_package']:
+        click.echo(f"  { item['package']:<48} { item['ms']:>8.2f} ms")
+    click.echo('\nImports by module (own time):')
+    for item in results['imports_by_module']:
+        click.echo(f"  { item['module']:<48} { item['own_ms']:>8.2f} ms ({ item['phase'] })")
+    click.echo('\ncreate_app() by module (own time, profiled):')
+    for item in results['create_app_by_module']:
+        click.echo(f"  { item['module'][-48:]:<48} { item['ms']:>8.2f} ms")
+
+    if output:
+        with open(output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+        click.echo(f"results written to { output }")
@@ -1,3 +1,5 @@
+import subprocess
+import sys
 import unittest
 
 from flask import current_app
@@ -20,3 +22,17 @@ class AppTestCase(unittest.TestCase):
 
     def test_app_is_testing(self):
         self.assertTrue(current_app.config['TESTING'])
+
+    def test_app_optional_dependencies_imported_lazily(self):
+        # a new interpreter is needed, as these modules have already been imported by other tests
+        script = (
+            "import sys\n"
+            "from file_upload_endpoint import create_app\n"
+            "client = create_app('testing').test_client()\n"
+            "print('sentry_sdk' in sys.modules, 'cerberus' in sys.modules)\n"
+            "client.post('/meta/logging/entries/foo')\n"
+            "print('cerberus' in sys.modules)\n"
+        )
+        output = subprocess.check_output([sys.executable, '-c', script], stderr=subprocess.DEVNULL)  # nosec
+        # Sentry is disabled when testing and Cerberus is only imported once a request is validated
+        self.assertEqual(output.decode().split(), ['False', 'False', 'True'])
@@ -0,0 +1,268 @@
+import asyncio
+import tempfile
+import unittest
+
+from http import HTTPStatus
+from unittest.mock import patch
+
+from flask.testing import FlaskClient
+
+from file_upload_endpoint import create_app
+from file_upload_endpoint.asgi import ASGIApplication
+from tests import test_main, test_meta, test_middleware, test_resumable
+
+
+class ASGITestClient(FlaskClient):
+    """
+    Flask test client which makes requests through the ASGI application, rather than calling the WSGI application
+    """
+
+    chunk_size = 16 * 1024
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.asgi_application = ASGIApplication(self.application)
+
+    def run_wsgi_app(self, environ, buffered=False):
+        application = self.application
+        self.application = self._call_asgi_application
+        try:
+            return super().run_wsgi_app(environ, buffered=buffered)
+        finally:
+            self.application = application
+
+    def _call_asgi_application(self, environ, start_response):
+        headers = [
+            (key[5:].replace('_', '-').lower().encode('latin-1'), value.encode('latin-1'))
+            for key, value in environ.items() if key.startswith('HTTP_')
+        ]
+        for key in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            if environ.get(key):
+                headers.append((key.replace('_', '-').lower().encode('latin-1'), environ[key].encode('latin-1')))
+        scope = {
+            'type': 'http',
+            'http_version': '1.1',
+            'method': environ['REQUEST_METHOD'],
+            'scheme': environ['wsgi.url_scheme'],
+            'path': environ['PATH_INFO'].encode('latin-1').decode('utf-8'),
+            'root_path': environ.get('SCRIPT_NAME', ''),
+            'query_string': environ.get('QUERY_STRING', '').encode('latin-1'),
+            'headers': headers,
+            'server': (environ['SERVER_NAME'], int(environ['SERVER_PORT'])),
+            'client': (environ.get('REMOTE_ADDR', '127.0.0.1'), 0)
+        }
+        body = environ['wsgi.input'].read()
+        messages = []
+
+        async def receive():
+            nonlocal body
+            chunk, body = body[:self.chunk_size], body[self.chunk_size:]
+            return {'type': 'http.request', 'body': chunk, 'more_body': bool(body)}
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(self.asgi_application(scope, receive, send))
+
+        start = messages[0]
+        start_response(
+            f"{ start['status'] } { HTTPStatus(start['status']).phrase }",
+            [(name.decode('latin-1'), value.decode('latin-1')) for name, value in start['headers']]
+        )
+        return [message.get('body', b'') for message in messages[1:]]
+
+
+class ASGIMainBlueprintTestCase(test_main.MainBlueprintTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.test_client_class = ASGITestClient
+        self.client = self.app.test_client()
+
+
+class ASGIMetaBlueprintTestCase(test_meta.MetaBlueprintTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.test_client_class = ASGITestClient
+        self.client = self.app.test_client()
+
+
+class ASGIMiddlewareTestCase(test_middleware.MiddlewareTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.test_client_class = ASGITestClient
+        self.client = self.app.test_client()
+
+
+class ASGIResumableUploadsTestCase(test_resumable.ResumableUploadsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.test_client_class = ASGITestClient
+        self.client = self.app.test_client()
+
+
+class ASGIApplicationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.asgi_application = ASGIApplication(self.app)
+
+    def request(self, path: str, headers: list, chunks: list, disconnect: bool = False) -> tuple:
+        received = []
+        messages = []
+
+        async def receive():
+            if disconnect and not chunks:
+                return {'type': 'http.disconnect'}
+            chunk = chunks.pop(0)
+            received.append(chunk)
+            # simulate a slow client, sending each chunk as it becomes available
+            await asyncio.sleep(0)
+            return {'type': 'http.request', 'body': chunk, 'more_body': bool(chunks) or disconnect}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            'type': 'http',
+            'method': 'POST',
+            'path': path,
+            'headers': [(b'host', b'localhost')] + headers
+        }
+        asyncio.run(self.asgi_application(scope, receive, send))
+        if not messages:
+            return None, None, received
+        return messages[0]['status'], messages[1]['body'], received
+
+    def test_asgi_upload_received_incrementally(self):
+        body = b'--foo\r\nContent-Disposition: form-data; name="file"; filename="foo.txt"\r\n\r\n' + \
+               b'x' * 100 + b'\r\n--foo--\r\n'
+        chunks = [body[i:i + 10] for i in range(0, len(body), 10)]
+        status, _, received = self.request(
+            '/upload-single',
+            [(b'content-type', b'multipart/form-data; boundary=foo')],
+            list(chunks)
+        )
+        self.assertEqual(status, HTTPStatus.NO_CONTENT)
+        self.assertEqual(received, chunks)
+
+    def test_asgi_upload_too_large_stops_receiving(self):
+        chunks = [b'--foo\r\nContent-Disposition: form-data; name="file"; filename="foo.txt"\r\n\r\n'] + \
+                 [b'x' * 1024] * 100
+        status, body, received = self.request(
+            '/upload-single-restricted-size',
+            [(b'content-type', b'multipart/form-data; boundary=foo')],
+            chunks
+        )
+        self.assertEqual(status, HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        self.assertIn(b'"maximum_content_length_allowed":40960', body)
+        # ensure only enough of the request is received to reject it
+        self.assertLess(len(received), 50)
+
+    def test_asgi_declared_too_large_not_received(self):
+        status, _, received = self.request(
+            '/upload-single',
+            [(b'content-type', b'multipart/form-data; boundary=foo'), (b'content-length', b'20000000')],
+            [b'x']
+        )
+        self.assertEqual(status, HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(received, [])
+
+    def test_asgi_refused_upload_not_received(self):
+        admission_control = self.app.extensions['admission_control']
+        admission_control.max_uploads = 1
+        # an upload is being handled
+        admission_control.inflight_uploads = 1
+
+        status, _, received = self.request(
+            '/upload-single',
+            [(b'content-type', b'multipart/form-data; boundary=foo'), (b'content-length', b'1024')],
+            [b'x' * 1024]
+        )
+        self.assertEqual(status, HTTPStatus.SERVICE_UNAVAILABLE)
+        self.assertEqual(received, [])
+        self.assertEqual(admission_control.refused_uploads, 1)
+
+    def test_asgi_rate_limited_upload_not_received(self):
+        rate_limit = self.app.extensions['rate_limit']
+        rate_limit.budgets = [('/upload-', (0.1, 1))]
+        headers = [(b'content-type', b'multipart/form-data; boundary=foo'), (b'content-length', b'1024')]
+
+        status, _, received = self.request('/upload-single', headers, [b'x' * 1024])
+        self.assertEqual(status, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(received, [b'x' * 1024])
+
+        status, _, received = self.request('/upload-single', headers, [b'x' * 1024])
+        self.assertEqual(status, HTTPStatus.TOO_MANY_REQUESTS)
+        self.assertEqual(received, [])
+
+    def test_asgi_upload_spooled_to_disk(self):
+        self.app.extensions['upload_spool'].max_memory_size = 64
+        body = b'--foo\r\nContent-Disposition: form-data; name="file"; filename="foo.txt"\r\n\r\n' + \
+               b'x' * 1000 + b'\r\n--foo--\r\n'
+        chunks = [body[i:i + 100] for i in range(0, len(body), 100)]
+        with patch.object(self.asgi_application.executor, 'submit', wraps=self.asgi_application.executor.submit) \
+                as submit:
+            status, _, _ = self.request(
+                '/upload-single',
+                [(b'content-type', b'multipart/form-data; boundary=foo')],
+                list(chunks)
+            )
+        self.assertEqual(status, HTTPStatus.NO_CONTENT)
+        # writes beyond the spool size are made in the thread pool, as well as dispatching the request
+        self.assertEqual(submit.call_count, len(chunks) + 1)
+
+    def test_asgi_upload_spool(self):
+        spool = self.app.extensions['upload_spool']
+        spool.max_memory_size = 64
+        body = b'--foo\r\nContent-Disposition: form-data; name="file"; filename="foo.txt"\r\n\r\n' + \
+               b'x' * 1000 + b'\r\n--foo--\r\n'
+
+        with tempfile.TemporaryDirectory() as directory, \
+                patch('tempfile.TemporaryFile', wraps=tempfile.TemporaryFile) as temporary_file:
+            spool.directory = directory
+            status, _, _ = self.request(
+                '/upload-single',
+                [(b'content-type', b'multipart/form-data; boundary=foo')],
+                [body[i:i + 100] for i in range(0, len(body), 100)]
+            )
+            self.assertEqual(status, HTTPStatus.NO_CONTENT)
+            self.assertEqual(temporary_file.call_count, 1)
+            self.assertEqual(temporary_file.call_args.kwargs['dir'], directory)
+
+        # request bodies are counted as spooled files, and released once the request ends
+        self.assertEqual(spool.usage(), (0, 0))
+        metrics = self.app.test_client().get('/meta/metrics').get_data(as_text=True).splitlines()
+        self.assertIn('file_upload_endpoint_upload_spills_total 1', metrics)
+
+    def test_asgi_upload_spool_full(self):
+        spool = self.app.extensions['upload_spool']
+        spool.max_memory_size = 64
+        spool.max_disk_size = 512
+        chunks = [b'--foo\r\nContent-Disposition: form-data; name="file"; filename="foo.txt"\r\n\r\n'] + \
+                 [b'x' * 100] * 20
+
+        status, body, received = self.request(
+            '/upload-single',
+            [(b'content-type', b'multipart/form-data; boundary=foo')],
+            list(chunks)
+        )
+        self.assertEqual(status, HTTPStatus.SERVICE_UNAVAILABLE)
+        self.assertIn(b'Temporary storage for uploads is full', body)
+        # the rest of the request body isn't received once the budget would be exceeded
+        self.assertLess(len(received), len(chunks))
+        self.assertEqual(spool.usage(), (0, 0))
+
+    def test_asgi_disconnect_not_dispatched(self):
+        chunks = [b'--foo\r\nContent-Disposition: form-data; name="file"; filename="foo.txt"\r\n\r\n', b'x' * 100]
+        with patch.object(self.asgi_application, '_run_wsgi_app') as run_wsgi_app:
+            status, _, received = self.request(
+                '/upload-single',
+                [(b'content-type', b'multipart/form-data; boundary=foo')],
+                chunks,
+                disconnect=True
+            )
+        self.assertIsNone(status)
+        self.assertEqual(len(received), 2)
+        run_wsgi_app.assert_not_called()
+        # the abandoned upload is no longer counted as in progress
+        admission_control = self.app.extensions['admission_control']
+        self.assertEqual((admission_control.inflight_uploads, admission_control.inflight_bytes), (0, 0))
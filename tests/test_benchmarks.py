@@ -0,0 +1,63 @@
+import threading
+import unittest
+
+from file_upload_endpoint import create_app
+from file_upload_endpoint.benchmarks.load import SCENARIOS, get_scenarios, percentile, run_scenario
+from file_upload_endpoint.benchmarks.startup import parse_import_times, profile_startup
+from file_upload_endpoint.serving import create_server
+
+
+class LoadBenchmarkTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.server = create_server(self.app, host='127.0.0.1', port=0)
+        self.server_thread = threading.Thread(target=self.server.run, daemon=True)
+        self.server_thread.start()
+
+    def tearDown(self):
+        # the server is closed from its own thread, so its sockets aren't closed while being polled
+        self.server.trigger.pull_trigger(lambda: self.server.asyncore.close_all(self.server._map))
+        self.server_thread.join(timeout=5)
+        self.server.task_dispatcher.shutdown()
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([5], 95), 5)
+        self.assertIsNone(percentile([], 50))
+
+    def test_scenarios(self):
+        for scenario in get_scenarios(self.app, SCENARIOS, payload_size=1024, file_count=2):
+            with self.subTest(scenario=scenario.name):
+                result = run_scenario('127.0.0.1', self.server.effective_port, scenario, requests=10, concurrency=2)
+                self.assertEqual(result['requests'], 10)
+                self.assertEqual(result['error_rate'], 0)
+                self.assertLessEqual(result['latency_ms']['p50'], result['latency_ms']['max'])
+
+
+class StartupProfileTestCase(unittest.TestCase):
+    def test_parse_import_times(self):
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       100 |        100 | site\n"
+            "startup-profile: import\n"
+            "import time:       200 |        300 |   flask\n"
+            "startup-profile: create_app\n"
+            "import time:      1500 |       1500 | flask_cors.core\n"
+        )
+        self.assertEqual(parse_import_times(output), [
+            {'module': 'flask', 'phase': 'import', 'own_ms': 0.2, 'cumulative_ms': 0.3},
+            {'module': 'flask_cors.core', 'phase': 'create_app', 'own_ms': 1.5, 'cumulative_ms': 1.5}
+        ])
+
+    def test_profile_startup(self):
+        results = profile_startup('testing', limit=None)
+        self.assertGreater(results['import_ms'], 0)
+        self.assertGreater(results['create_app_ms'], 0)
+        self.assertIn('file_upload_endpoint', [item['package'] for item in results['imports_by_package']])
+        # optional dependencies are imported when the application is created, if enabled
+        self.assertIn(
+            ('flask_cors', 'create_app'),
+            [(item['module'], item['phase']) for item in results['imports_by_module']]
+        )
@@ -0,0 +1,150 @@
+import io
+import json
+import logging
+import threading
+import time
+import unittest
+
+from http import HTTPStatus
+
+from file_upload_endpoint import create_app
+from file_upload_endpoint.logs import BatchStreamHandler, JSONFormatter, LogRateLimiter, QueuedLogging, _queued_loggings
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self, formatter: logging.Formatter = None, delay: float = 0, event: threading.Event = None):
+        super().__init__()
+        self.setFormatter(formatter or JSONFormatter())
+        self.delay = delay
+        self.event = event
+        self.entries = []
+
+    def emit(self, record):
+        if self.event is not None:
+            self.event.wait(timeout=5)
+        time.sleep(self.delay)
+        self.entries.append(self.format(record))
+
+
+class QueuedLoggingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_queued_logging_slow_handler(self):
+        handler = RecordingHandler(delay=0.5)
+        queued_logging = QueuedLogging(self.app, handlers=[handler])
+
+        started_at = time.monotonic()
+        response = self.client.post('/meta/logging/entries/warning', headers={'x-request-id': 'foo'})
+        self.assertEqual(response.status_code, HTTPStatus.ACCEPTED)
+        # ensure the request isn't delayed by the handler
+        self.assertLess(time.monotonic() - started_at, 0.5)
+
+        queued_logging.stop()
+        entries = [json.loads(entry) for entry in handler.entries]
+        entry = [entry for entry in entries if entry['message'].startswith('warning log message')][0]
+        # ensure request information is formatted once the request has finished
+        self.assertEqual(entry['level'], 'WARNING')
+        self.assertEqual(entry['url'], 'http://localhost/meta/logging/entries/warning')
+        self.assertTrue(entry['request_id'].startswith('foo,'))
+
+    def test_queued_logging_overflow_dropped(self):
+        release = threading.Event()
+        handler = RecordingHandler(event=release)
+        queued_logging = QueuedLogging(self.app, handlers=[handler], queue_size=2)
+
+        with self.app.test_request_context('/'):
+            # the first record is taken from the queue by the listener, which then waits for the handler
+            self.app.logger.warning('foo 0')
+            time.sleep(0.1)
+            for i in range(1, 6):
+                self.app.logger.warning('foo %d', i)
+            release.set()
+            time.sleep(0.1)
+            self.app.logger.warning('bar')
+
+        queued_logging.stop()
+        messages = [json.loads(entry)['message'] for entry in handler.entries]
+        self.assertEqual(messages, ['foo 0', 'foo 1', 'foo 2', 'bar', '3 log records dropped, log queue full'])
+
+    def test_queued_logging_replaced(self):
+        first = QueuedLogging(self.app, handlers=[RecordingHandler()])
+        second = QueuedLogging(self.app, handlers=[RecordingHandler()])
+        self.addCleanup(second.stop)
+
+        # the replaced extension's listener is no longer restarted in forked processes, or stopped on exit
+        self.assertNotIn(first, _queued_loggings)
+        self.assertIn(second, _queued_loggings)
+
+    def test_queued_logging_overflow_not_supported(self):
+        with self.assertRaises(ValueError):
+            QueuedLogging(self.app, overflow='foo')
+
+    def test_batch_stream_handler(self):
+        stream = io.StringIO()
+        handler = BatchStreamHandler(stream, batch_size=2)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger = logging.getLogger('test_batch_stream_handler')
+        logger.addHandler(handler)
+        logger.propagate = False
+
+        logger.warning('foo')
+        self.assertEqual(stream.getvalue(), '')
+        logger.warning('bar')
+        self.assertEqual(stream.getvalue(), 'foo\nbar\n')
+        logger.warning('baz')
+        handler.flush()
+        self.assertEqual(stream.getvalue(), 'foo\nbar\nbaz\n')
+
+    def test_json_formatter_outside_request(self):
+        record = logging.makeLogRecord({'msg': 'foo %s', 'args': ('bar',), 'levelname': 'INFO'})
+        entry = json.loads(JSONFormatter().format(record))
+        self.assertEqual(entry['message'], 'foo bar')
+        self.assertIsNone(entry['url'])
+        self.assertIsNone(entry['request_id'])
+
+
+class LogRateLimiterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+        self.rate_limiter = LogRateLimiter(self.app, rate=0, burst=5, summary_interval=3600)
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_log_rate_limited(self):
+        with self.assertLogs(self.app.logger, level='WARNING') as logs:
+            for _ in range(20):
+                self.client.post('/meta/logging/entries/warning')
+            self.rate_limiter.summarise()
+
+        message = 'WARNING:file_upload_endpoint:warning log message - from logging meta endpoint'
+        self.assertEqual(logs.output[:5], [message] * 5)
+        self.assertEqual(logs.output[5:], [
+            'WARNING:file_upload_endpoint:Suppressed 15 similar messages to '
+            '[warning log message - from logging meta endpoint] (route: [/meta/logging/entries/<logging_level>])'
+        ])
+
+    def test_log_rate_limited_grouped_by_template(self):
+        with self.assertLogs(self.app.logger, level='WARNING') as logs:
+            for _ in range(10):
+                self.client.post('/upload-single', data={})
+                self.client.post('/meta/logging/entries/warning')
+
+        self.assertEqual(len(logs.output), 10)
+
+    def test_log_rate_limited_errors_not_limited(self):
+        with self.assertLogs(self.app.logger, level='ERROR') as logs:
+            for _ in range(10):
+                self.client.post('/meta/logging/entries/error')
+
+        self.assertEqual(len(logs.output), 10)
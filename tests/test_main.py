@@ -1,9 +1,16 @@
+import hashlib
 import os
+import tempfile
 import unittest
+import zlib
 
 from http import HTTPStatus
+from io import BytesIO
+from unittest.mock import patch
 
 from file_upload_endpoint import create_app
+from file_upload_endpoint.main.multipart import MultipartReader
+from file_upload_endpoint.main.spooling import UploadSpool
 
 
 class MainBlueprintTestCase(unittest.TestCase):
@@ -31,6 +38,15 @@ class MainBlueprintTestCase(unittest.TestCase):
         self.assertIn('meta', json_response.keys())
         self.assertIn('summary', json_response['meta'].keys())
 
+    def test_index_not_modified(self):
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn('etag', response.headers)
+
+        response = self.client.get('/', headers={'if-none-match': response.headers['etag']})
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(response.data, b'')
+
     def test_upload_single(self):
         with open(os.path.join(os.path.dirname(__file__), 'static', 'uploads', 'valid.png'), 'rb') as file_upload:
             request_data = {
@@ -46,6 +62,52 @@ class MainBlueprintTestCase(unittest.TestCase):
     def test_upload_single_preflight(self):
         self.common_preflight('/upload-single')
 
+    def test_upload_single_checksums(self):
+        with open(os.path.join(os.path.dirname(__file__), 'static', 'uploads', 'valid.png'), 'rb') as file:
+            content = file.read()
+
+        # larger than the read buffer, so checksums are updated from multiple reads
+        content = content * (200000 // len(content) + 1)
+        response = self.client.post(
+            '/upload-single-checksums',
+            content_type='multipart/form-data',
+            data={'file': (BytesIO(content), 'valid.png')}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.get_json(), {'meta': {'file': {
+            'filename': 'valid.png',
+            'size': len(content),
+            'checksums': {
+                'sha256': hashlib.sha256(content).hexdigest(),
+                'md5': hashlib.md5(content).hexdigest(),
+                'crc32': f"{ zlib.crc32(content):08x}"
+            }
+        }}})
+
+    def test_upload_single_checksums_without_usedforsecurity(self):
+        md5 = hashlib.md5
+
+        def md5_without_usedforsecurity(*args):
+            return md5(*args)
+
+        # as with Python versions before 3.9
+        with patch('hashlib.md5', md5_without_usedforsecurity):
+            response = self.client.post(
+                '/upload-single-checksums',
+                content_type='multipart/form-data',
+                data={'file': (BytesIO(b'foo'), 'valid.png')}
+            )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.get_json()['meta']['file']['checksums']['md5'], md5(b'foo').hexdigest())
+
+    def test_upload_single_checksums_no_file(self):
+        response = self.client.post('/upload-single-checksums', content_type='multipart/form-data', data={})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(response.get_json()['errors'][0]['title'], '[file] field missing in request')
+
+    def test_upload_single_checksums_preflight(self):
+        self.common_preflight('/upload-single-checksums')
+
     def test_upload_multiple(self):
         with open(os.path.join(os.path.dirname(__file__), 'static', 'uploads', 'valid.png'), 'rb') as file_upload:
             request_data = {
@@ -100,6 +162,25 @@ class MainBlueprintTestCase(unittest.TestCase):
 
             self.assertDictEqual(json_response['errors'][0], expected_error)
 
+    def test_upload_single_restricted_size_chunked(self):
+        body = b'--foo\r\nContent-Disposition: form-data; name="file"; filename="foo.txt"\r\n\r\n' + \
+               b'x' * 82000 + b'\r\n--foo--\r\n'
+
+        # sent without a content length, as with chunked transfer encoding, the limit is checked in both modes
+        for streaming in (True, False):
+            self.app.config['APP_ENABLE_STREAMING_UPLOADS'] = streaming
+            response = self.client.post(
+                '/upload-single-restricted-size',
+                input_stream=BytesIO(body),
+                content_type='multipart/form-data; boundary=foo',
+                headers={'Transfer-Encoding': 'chunked'},
+                environ_overrides={'wsgi.input_terminated': True}
+            )
+            json_response = response.get_json()
+            self.assertEqual(response.status_code, HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+            self.assertEqual(json_response['errors'][0]['title'], 'Request content length is too great')
+            self.assertEqual(json_response['errors'][0]['meta']['maximum_content_length_allowed'], 40960)
+
     def test_upload_single_restricted_preflight(self):
         self.common_preflight('/upload-single-restricted-size')
 
@@ -137,3 +218,286 @@ class MainBlueprintTestCase(unittest.TestCase):
 
     def test_upload_single_restricted_mime_types_preflight(self):
         self.common_preflight('/upload-single-restricted-mime-types')
+
+    def test_upload_single_no_file(self):
+        response = self.client.post(
+            '/upload-single',
+            content_type='multipart/form-data',
+            data={'foo': 'bar'}
+        )
+        json_response = response.get_json()
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(len(json_response['errors']), 1)
+        self.assertEqual(json_response['errors'][0]['title'], '[file] field missing in request')
+
+    def test_upload_single_no_file_selection(self):
+        response = self.client.post(
+            '/upload-single',
+            content_type='multipart/form-data',
+            data={'file': (BytesIO(b''), '')}
+        )
+        json_response = response.get_json()
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(len(json_response['errors']), 1)
+        self.assertEqual(json_response['errors'][0]['title'], '[file] field value is an empty selection')
+
+    def test_upload_multiple_no_files(self):
+        response = self.client.post(
+            '/upload-multiple',
+            content_type='multipart/form-data',
+            data={'file': (BytesIO(b'foo'), 'foo.txt')}
+        )
+        json_response = response.get_json()
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(len(json_response['errors']), 1)
+        self.assertEqual(json_response['errors'][0]['title'], '[files] field missing in request')
+
+    def test_upload_multiple_no_file_selection(self):
+        response = self.client.post(
+            '/upload-multiple',
+            content_type='multipart/form-data',
+            data={'files[]': [(BytesIO(b'foo'), 'foo.txt'), (BytesIO(b''), '')]}
+        )
+        json_response = response.get_json()
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(len(json_response['errors']), 1)
+        self.assertEqual(json_response['errors'][0]['title'], '[file] field value is an empty selection')
+
+    def test_upload_multiple_too_many_files(self):
+        self.app.config['UPLOAD_MULTIPLE_LIMITS'] = {**self.app.config['UPLOAD_MULTIPLE_LIMITS'], 'max_files': 2}
+
+        response = self.client.post(
+            '/upload-multiple',
+            content_type='multipart/form-data',
+            data={'files[]': [(BytesIO(b'foo'), 'foo.txt'), (BytesIO(b'bar'), 'bar.txt')]}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+
+        response = self.client.post(
+            '/upload-multiple',
+            content_type='multipart/form-data',
+            data={'files[]': [(BytesIO(b'foo'), f"foo-{ i }.txt") for i in range(3)]}
+        )
+        json_response = response.get_json()
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(json_response['errors'][0]['title'], 'Too many files in request')
+        self.assertEqual(json_response['errors'][0]['meta'], {'maximum_files_allowed': 2})
+
+    def test_upload_multiple_file_too_large(self):
+        self.app.config['UPLOAD_MULTIPLE_LIMITS'] = {
+            **self.app.config['UPLOAD_MULTIPLE_LIMITS'],
+            'max_file_size': 100000
+        }
+
+        response = self.client.post(
+            '/upload-multiple',
+            content_type='multipart/form-data',
+            data={'files[]': [(BytesIO(b'x' * 100000), 'foo.txt'), (BytesIO(b'x' * 100001), 'bar.txt')]}
+        )
+        json_response = response.get_json()
+        self.assertEqual(response.status_code, HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(json_response['errors'][0]['title'], 'File size is too great')
+        self.assertEqual(json_response['errors'][0]['meta'], {
+            'maximum_file_size_allowed': 100000,
+            'instance_filename': 'bar.txt',
+            'size_units': 'bytes'
+        })
+
+    def test_upload_multiple_files_too_large(self):
+        self.app.config['UPLOAD_MULTIPLE_LIMITS'] = {
+            **self.app.config['UPLOAD_MULTIPLE_LIMITS'],
+            'max_file_size': 100000,
+            'max_total_size': 150000
+        }
+
+        response = self.client.post(
+            '/upload-multiple',
+            content_type='multipart/form-data',
+            data={'files[]': [(BytesIO(b'x' * 100000), 'foo.txt'), (BytesIO(b'x' * 50001), 'bar.txt')]}
+        )
+        json_response = response.get_json()
+        self.assertEqual(response.status_code, HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(json_response['errors'][0]['title'], 'Total size of files is too great')
+        self.assertEqual(json_response['errors'][0]['meta'], {
+            'maximum_total_size_allowed': 150000,
+            'size_units': 'bytes'
+        })
+
+    def test_upload_multiple_file_too_large_both_modes(self):
+        self.app.config['UPLOAD_MULTIPLE_LIMITS'] = {
+            **self.app.config['UPLOAD_MULTIPLE_LIMITS'],
+            'max_file_size': 100000,
+            'max_total_size': 150000
+        }
+
+        # the second file exceeds both the per-file limit and the remaining total, the per-file limit is reported first
+        titles = {}
+        for streaming in (True, False):
+            self.app.config['APP_ENABLE_STREAMING_UPLOADS'] = streaming
+            response = self.client.post(
+                '/upload-multiple',
+                content_type='multipart/form-data',
+                data={'files[]': [(BytesIO(b'x' * 100000), 'foo.txt'), (BytesIO(b'x' * 100001), 'bar.txt')]}
+            )
+            self.assertEqual(response.status_code, HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+            titles[streaming] = response.get_json()['errors'][0]['title']
+        self.assertEqual(titles, {True: 'File size is too great', False: 'File size is too great'})
+
+    def test_upload_multiple_early_abort(self):
+        if not self.app.config['APP_ENABLE_STREAMING_UPLOADS']:
+            self.skipTest('request.files reads all files before any are checked')
+
+        readers = []
+
+        def create_reader(*args, **kwargs):
+            readers.append(MultipartReader(*args, **kwargs))
+            return readers[-1]
+
+        # files after the first invalid file aren't read
+        with patch('file_upload_endpoint.main.MultipartReader', side_effect=create_reader):
+            response = self.client.post(
+                '/upload-multiple',
+                content_type='multipart/form-data',
+                data={'files[]': [(BytesIO(b''), '')] + [(BytesIO(b'x' * 100000), f"{ i }.txt") for i in range(50)]}
+            )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertLess(readers[0].bytes_read, 200000)
+
+    def test_upload_multipart_limits(self):
+        # when files are buffered, Werkzeug checks the number of parts without saying which limit was exceeded
+        if self.app.config['APP_ENABLE_STREAMING_UPLOADS']:
+            parts_meta = {'limit': 'parts', 'maximum_allowed': self.app.config['MULTIPART_LIMITS']['max_parts']}
+        else:
+            parts_meta = {'limit': 'form', 'maximum_allowed': None}
+
+        data = {'file': (BytesIO(b'foo'), 'foo.txt')}
+        data.update({f"field-{ i }": 'x' for i in range(self.app.config['MULTIPART_LIMITS']['max_parts'])})
+        response = self.client.post('/upload-single', content_type='multipart/form-data', data=data)
+        json_response = response.get_json()
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(
+            json_response['errors'][0]['title'], f"Multipart request exceeds [{ parts_meta['limit'] }] limit"
+        )
+        self.assertEqual(json_response['errors'][0]['meta'], parts_meta)
+
+        response = self.client.post('/upload-single', content_type='multipart/form-data', data={
+            'foo': 'x' * (self.app.config['MULTIPART_LIMITS']['max_field_size'] + 1),
+            'file': (BytesIO(b'foo'), 'foo.txt')
+        })
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(response.get_json()['errors'][0]['meta'], {
+            'limit': 'field_size',
+            'maximum_allowed': self.app.config['MULTIPART_LIMITS']['max_field_size']
+        })
+
+        response = self.client.post(
+            '/upload-multiple',
+            content_type='multipart/form-data',
+            data={'files[]': (BytesIO(b'foo'), 'x' * 256)}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(response.get_json()['errors'][0]['meta']['limit'], 'filename_length')
+
+    def test_upload_single_restricted_mime_types_sniffed(self):
+        self.app.config['APP_ENABLE_MIME_TYPE_SNIFFING'] = True
+
+        # a JPEG file with a generic content type is accepted based on its contents
+        response = self.client.post(
+            '/upload-single-restricted-mime-types',
+            content_type='multipart/form-data',
+            data={
+                'file': (BytesIO(b'\xff\xd8\xff\xe0\x00\x10JFIF' + b'\x00' * 1000), 'foo', 'application/octet-stream')
+            }
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+
+        # a PNG file with an allowed content type is rejected based on its contents
+        with open(os.path.join(os.path.dirname(__file__), 'static', 'uploads', 'valid.png'), 'rb') as file_upload:
+            response = self.client.post(
+                '/upload-single-restricted-mime-types',
+                content_type='multipart/form-data',
+                data={'file': (file_upload, 'valid.jpg', 'image/jpeg')}
+            )
+            json_response = response.get_json()
+            self.assertEqual(response.status_code, HTTPStatus.UNSUPPORTED_MEDIA_TYPE)
+            self.assertEqual(json_response['errors'][0]['meta']['allowed_mime_types'], ['image/jpeg'])
+            self.assertEqual(json_response['errors'][0]['meta']['instance_mime_type'], 'image/png')
+
+        # an unrecognised file is rejected
+        response = self.client.post(
+            '/upload-single-restricted-mime-types',
+            content_type='multipart/form-data',
+            data={'file': (BytesIO(b'foo'), 'foo.jpg', 'image/jpeg')}
+        )
+        json_response = response.get_json()
+        self.assertEqual(response.status_code, HTTPStatus.UNSUPPORTED_MEDIA_TYPE)
+        self.assertEqual(json_response['errors'][0]['meta']['instance_mime_type'], 'application/octet-stream')
+
+
+class MainBlueprintBufferedUploadsTestCase(MainBlueprintTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config['APP_ENABLE_STREAMING_UPLOADS'] = False
+
+    def test_upload_spool_memory_size_not_supported(self):
+        # files would never be spooled to disk
+        with self.assertRaises(ValueError):
+            UploadSpool(self.app, max_memory_size=0)
+
+    def test_upload_spool(self):
+        spool = self.app.extensions['upload_spool']
+        spool.max_memory_size = 1024
+
+        with tempfile.TemporaryDirectory() as directory, \
+                patch('tempfile.TemporaryFile', wraps=tempfile.TemporaryFile) as temporary_file:
+            spool.directory = directory
+
+            # files up to the threshold are held in memory
+            response = self.client.post(
+                '/upload-single',
+                content_type='multipart/form-data',
+                data={'file': (BytesIO(b'x' * 1024), 'small.txt')}
+            )
+            self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+            temporary_file.assert_not_called()
+
+            response = self.client.post(
+                '/upload-single',
+                content_type='multipart/form-data',
+                data={'file': (BytesIO(b'x' * 4096), 'large.txt')}
+            )
+            self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+            self.assertEqual(temporary_file.call_count, 1)
+            self.assertEqual(temporary_file.call_args.kwargs['dir'], directory)
+
+        # bytes are released once the request ends
+        self.assertEqual(spool.usage(), (0, 0))
+
+        metrics = self.client.get('/meta/metrics').get_data(as_text=True).splitlines()
+        self.assertIn('file_upload_endpoint_upload_spills_total 1', metrics)
+        self.assertIn('file_upload_endpoint_upload_spooled_bytes_peak{storage="memory"} 1024', metrics)
+        self.assertIn('file_upload_endpoint_upload_spooled_bytes_peak{storage="disk"} 4096', metrics)
+
+    def test_upload_spool_full(self):
+        spool = self.app.extensions['upload_spool']
+        spool.max_memory_size = 1024
+        spool.max_disk_size = 2048
+
+        response = self.client.post(
+            '/upload-multiple',
+            content_type='multipart/form-data',
+            data={'files[]': [(BytesIO(b'x' * 1500), 'file-1.txt'), (BytesIO(b'x' * 1500), 'file-2.txt')]}
+        )
+        json_response = response.get_json()
+        self.assertEqual(response.status_code, HTTPStatus.SERVICE_UNAVAILABLE)
+        self.assertEqual(json_response['errors'][0]['title'], 'Temporary storage for uploads is full')
+
+        # files discarded by the form parser are also released
+        self.assertEqual(spool.usage(), (0, 0))
+
+        response = self.client.post(
+            '/upload-single',
+            content_type='multipart/form-data',
+            data={'file': (BytesIO(b'x' * 1500), 'file.txt')}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
@@ -95,3 +95,33 @@ class MetaBlueprintTestCase(unittest.TestCase):
                         if f"{ logging_level } log message - from logging meta endpoint" in log_entry:
                             log_found = True
                     self.assertTrue(log_found)
+
+    def test_meta_logging_level_invalid(self):
+        expected_error = {
+            'detail': 'Value for parameter [logging_level] invalid, check your request against the allowed values and '
+                      'try again',
+            'id': 'a611b89f-f1bb-43c5-8efa-913c83c9109e',
+            'status': 400,
+            'title': 'Request validation error',
+            'meta': {
+                'parameter': 'logging_level',
+                'invalid_value': 'foo',
+                'allowed_values': ['debug', 'info', 'warning', 'error', 'critical']
+            }
+        }
+
+        # repeated to ensure reused validators don't retain state between requests
+        for _ in range(2):
+            response = self.client.post('/meta/logging/entries/foo')
+            json_response = response.get_json()
+            self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+            self.assertEqual(len(json_response['errors']), 1)
+
+            # Overwrite dynamic error ID with static value to allow comparision
+            if 'id' in json_response['errors'][0].keys():
+                json_response['errors'][0]['id'] = 'a611b89f-f1bb-43c5-8efa-913c83c9109e'
+
+            self.assertDictEqual(json_response['errors'][0], expected_error)
+
+        response = self.client.post('/meta/logging/entries/debug')
+        self.assertEqual(response.status_code, HTTPStatus.ACCEPTED)
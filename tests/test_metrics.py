@@ -0,0 +1,134 @@
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+from http import HTTPStatus
+
+from file_upload_endpoint import create_app
+from file_upload_endpoint.metrics import Metrics
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def get_metrics(self) -> list:
+        response = self.client.get('/meta/metrics')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.content_type, 'text/plain; version=0.0.4; charset=utf-8')
+        return response.get_data(as_text=True).splitlines()
+
+    def test_metrics_requests(self):
+        self.client.get('/meta/health/canary')
+        self.client.get('/meta/health/canary')
+        self.client.post('/upload-single', content_type='multipart/form-data', data={})
+        self.client.get('/foo')
+
+        metrics = self.get_metrics()
+        self.assertIn(
+            'file_upload_endpoint_requests_total{route="/meta/health/canary",method="GET",status="204"} 2', metrics
+        )
+        self.assertIn(
+            'file_upload_endpoint_requests_total{route="/upload-single",method="POST",status="400"} 1', metrics
+        )
+        self.assertIn('file_upload_endpoint_requests_total{route="<unmatched>",method="GET",status="404"} 1', metrics)
+        self.assertIn(
+            'file_upload_endpoint_request_duration_seconds_bucket{route="/meta/health/canary",le="+Inf"} 2', metrics
+        )
+        self.assertIn('file_upload_endpoint_request_duration_seconds_count{route="/meta/health/canary"} 2', metrics)
+        self.assertIn('file_upload_endpoint_handled_errors_total{error="no_file"} 1', metrics)
+
+    def test_metrics_request_bytes_chunked(self):
+        body = b'--foo\r\nContent-Disposition: form-data; name="file"; filename="foo.txt"\r\n\r\n' + \
+               b'x' * 100 + b'\r\n--foo--\r\n'
+        # sent without a content length, as with chunked transfer encoding
+        self.client.post(
+            '/upload-single',
+            input_stream=io.BytesIO(body),
+            content_type='multipart/form-data; boundary=foo',
+            headers={'Transfer-Encoding': 'chunked'},
+            environ_overrides={'wsgi.input_terminated': True}
+        )
+
+        metrics = self.get_metrics()
+        self.assertIn(f"file_upload_endpoint_request_bytes_total{{route=\"/upload-single\"}} { len(body) }", metrics)
+
+    def test_metrics_threads(self):
+        metrics = self.app.extensions['metrics']
+
+        def record():
+            for _ in range(100):
+                metrics.record_request('/foo', 'GET', 200, 0.001, 10)
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['requests'][json.dumps(['/foo', 'GET', 200])], 400)
+        self.assertEqual(snapshot['request_bytes']['/foo'], 4000)
+        self.assertEqual(snapshot['latencies']['/foo'][2], 400)
+
+    def test_metrics_processes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            metrics = Metrics(self.app, directory=directory)
+
+            # metrics written by another worker process
+            other = Metrics(self.app, directory=directory)
+            other.record_request('/meta/health/canary', 'GET', 204, 0.001, 0)
+            other.record_handled_error('no_file')
+            with open(os.path.join(directory, 'metrics-1.json'), 'w') as metrics_file:
+                json.dump(other.snapshot(), metrics_file)
+
+            metrics.record_request('/meta/health/canary', 'GET', 204, 0.001, 0)
+            self.app.extensions['metrics'] = metrics
+            lines = metrics.render().splitlines()
+            self.assertIn(
+                'file_upload_endpoint_requests_total{route="/meta/health/canary",method="GET",status="204"} 2', lines
+            )
+            self.assertIn('file_upload_endpoint_handled_errors_total{error="no_file"} 1', lines)
+
+    def test_metrics_stale_files_removed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            process = subprocess.Popen([sys.executable, '-c', 'pass'])
+            process.wait()
+            stale = os.path.join(directory, f"metrics-{ process.pid }.json")
+            running = os.path.join(directory, f"metrics-{ os.getpid() }.json")
+            for path in (stale, running):
+                with open(path, 'w') as metrics_file:
+                    json.dump({}, metrics_file)
+
+            Metrics(self.app, directory=directory)
+            self.assertFalse(os.path.exists(stale))
+            self.assertTrue(os.path.exists(running))
+
+    def test_metrics_spooled_bytes(self):
+        metrics = self.app.extensions['metrics']
+
+        def record():
+            metrics.record_spooled_bytes(100, 0)
+            metrics.record_spooled_bytes(50, 2000, spill=True)
+
+        thread = threading.Thread(target=record)
+        thread.start()
+        thread.join()
+        metrics.record_spooled_bytes(300, 1000, spill=True)
+
+        # spills are counted, and peaks are the greatest recorded by any thread
+        lines = metrics.render().splitlines()
+        self.assertIn('file_upload_endpoint_upload_spills_total 2', lines)
+        self.assertIn('file_upload_endpoint_upload_spooled_bytes_peak{storage="memory"} 300', lines)
+        self.assertIn('file_upload_endpoint_upload_spooled_bytes_peak{storage="disk"} 2000', lines)
@@ -1,9 +1,17 @@
+import os
+import time
 import unittest
 
+from contextlib import contextmanager
+from unittest.mock import patch
+
 from http import HTTPStatus
 from uuid import UUID, uuid4
 
+from config import config
 from file_upload_endpoint import create_app
+from file_upload_endpoint.middleware.rate_limit import SharedTokenBuckets, client_ip_key
+from file_upload_endpoint.middleware.request_id import TimeOrderedRequestIDGenerator
 
 
 class MiddlewareTestCase(unittest.TestCase):
@@ -16,6 +24,13 @@ class MiddlewareTestCase(unittest.TestCase):
     def tearDown(self):
         self.app_context.pop()
 
+    @contextmanager
+    def assert_dispatched(self, app, dispatched: bool = True):
+        # checks whether requests reach the Flask application, or are answered by middleware
+        with patch.object(app, 'full_dispatch_request', wraps=app.full_dispatch_request) as full_dispatch_request:
+            yield
+        self.assertEqual(full_dispatch_request.called, dispatched)
+
     def test_request_id_not_client_value(self):
         # canary health check used as a stable test endpoint
         response = self.client.get('/meta/health/canary')
@@ -152,3 +167,354 @@ class MiddlewareTestCase(unittest.TestCase):
         self.assertEqual(request_id_header_values[0], request_ids[0])
         # ensure the second is the value we provided in the request
         self.assertEqual(request_id_header_values[1], request_ids[1])
+
+    def test_request_id_single_unique_value_uuid_without_hyphens(self):
+        request_id = uuid4().hex
+
+        # canary health check used as a stable test endpoint
+        response = self.client.get(
+            '/meta/health/canary',
+            headers={
+                'x-request-id': request_id
+            }
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        # ensure the value we provided is returned as is
+        self.assertEqual(response.headers['X-Request-ID'], request_id)
+
+    def test_request_id_error_response(self):
+        response = self.client.get('/foo')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertEqual(len(response.headers.getlist('X-Request-ID')), 1)
+
+    def test_request_id_time_ordered_generator(self):
+        generator = TimeOrderedRequestIDGenerator()
+        request_ids = [generator() for _ in range(3)]
+        # ensure request IDs are ordered and unique
+        self.assertEqual(request_ids, sorted(set(request_ids)))
+        # ensure request IDs are formatted as UUIDs
+        for request_id in request_ids:
+            try:
+                UUID(request_id)
+            except ValueError:
+                self.fail("Request ID should be formatted as a UUID")
+
+        with patch.object(config['testing'], 'REQUEST_ID_GENERATOR', 'time-ordered'):
+            client = create_app('testing').test_client()
+        request_ids = [client.get('/meta/health/canary').headers['X-Request-ID'] for _ in range(2)]
+        # ensure request IDs share the same per-process prefix
+        self.assertNotEqual(request_ids[0], request_ids[1])
+        self.assertEqual(request_ids[0][:24], request_ids[1][:24])
+
+    def test_cors_preflight_fast_path(self):
+        with self.assert_dispatched(self.app, False):
+            response = self.client.options('/upload-single', headers={
+                'origin': 'https://style-kit.web.bas.ac.uk',
+                'access-control-request-method': 'POST',
+                'access-control-request-headers': 'x-requested-with'
+            })
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.headers['Access-Control-Allow-Origin'], 'https://style-kit.web.bas.ac.uk')
+        self.assertEqual(response.headers['Access-Control-Allow-Methods'], 'DELETE, GET, HEAD, OPTIONS, PATCH, POST')
+        self.assertEqual(response.headers['Access-Control-Allow-Headers'], 'x-requested-with')
+        self.assertEqual(response.headers['Access-Control-Max-Age'], '7200')
+        self.assertEqual(response.headers['Vary'], 'Origin')
+        self.assertEqual(['OPTIONS', 'POST'], sorted(response.headers['Allow'].split(', ')))
+        # responses made by middleware still include a Request ID
+        UUID(response.headers['X-Request-ID'])
+
+    def test_cors_preflight_fast_path_matches_flask_cors(self):
+        headers = {
+            'origin': 'http://localhost:9000',
+            'access-control-request-method': 'POST',
+            'access-control-request-headers': 'cache-control'
+        }
+        with patch.object(config['testing'], 'APP_ENABLE_FAST_PREFLIGHT', False):
+            client = create_app('testing').test_client()
+
+        for path in ['/upload-single', '/upload-multiple', '/meta/health/canary']:
+            with self.subTest(path=path):
+                response = self.client.options(path, headers=headers)
+                expected = client.options(path, headers=headers)
+                self.assertEqual(response.status_code, expected.status_code)
+                for header in ['Access-Control-Allow-Origin', 'Access-Control-Allow-Methods',
+                               'Access-Control-Allow-Headers', 'Access-Control-Max-Age']:
+                    self.assertEqual(response.headers.get(header), expected.headers.get(header))
+                # Flask doesn't order allowed methods
+                self.assertEqual(
+                    sorted(response.headers.get('Allow', '').split(', ')),
+                    sorted(expected.headers.get('Allow', '').split(', '))
+                )
+
+    def test_cors_preflight_disallowed_origin(self):
+        # ensure the request is passed to the Flask application
+        with self.assert_dispatched(self.app):
+            response = self.client.options('/upload-single', headers={
+                'origin': 'https://example.com',
+                'access-control-request-method': 'POST'
+            })
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotIn('Access-Control-Allow-Origin', response.headers)
+
+    def test_cors_preflight_not_covered(self):
+        # routes handling OPTIONS requests themselves, and non-preflight OPTIONS requests, are passed to the application
+        with self.assert_dispatched(self.app):
+            self.client.options('/meta/health/canary', headers={
+                'origin': 'https://style-kit.web.bas.ac.uk',
+                'access-control-request-method': 'GET'
+            })
+        with self.assert_dispatched(self.app):
+            self.client.options('/upload-single', headers={'origin': 'https://style-kit.web.bas.ac.uk'})
+
+    def test_cors_preflight_disabled(self):
+        with patch.object(config['testing'], 'APP_ENABLE_FAST_PREFLIGHT', False):
+            app = create_app('testing')
+        self.assertNotIn('cors_preflight', app.extensions)
+
+        response = app.test_client().options('/upload-single', headers={
+            'origin': 'https://style-kit.web.bas.ac.uk',
+            'access-control-request-method': 'POST'
+        })
+        self.assertEqual(response.headers['Access-Control-Allow-Origin'], 'https://style-kit.web.bas.ac.uk')
+
+    def test_health_checks_fast_canary(self):
+        with patch.object(config['testing'], 'APP_ENABLE_FAST_CANARY', True):
+            app = create_app('testing')
+        client = app.test_client()
+
+        for method in ['get', 'head', 'options']:
+            with self.subTest(method=method):
+                with self.assert_dispatched(app, False):
+                    response = getattr(client, method)('/meta/health/canary')
+                self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+                UUID(response.headers['X-Request-ID'])
+
+        # cross-origin requests are passed to the application, for CORS headers
+        with self.assert_dispatched(app):
+            response = client.get('/meta/health/canary', headers={'origin': 'https://style-kit.web.bas.ac.uk'})
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        self.assertEqual(response.headers['Access-Control-Allow-Origin'], 'https://style-kit.web.bas.ac.uk')
+
+    def test_health_checks_readiness(self):
+        with self.assert_dispatched(self.app, False):
+            response = self.client.get('/meta/health/ready')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.headers['Cache-Control'], 'no-store')
+        self.assertIn('X-Request-ID', response.headers)
+        # without a task dispatcher (i.e. not using Waitress), only request bodies are checked
+        self.assertEqual(response.get_json(), {'ready': True, 'checks': {'inflight_bytes': {
+            'value': 0,
+            'limit': self.app.config['HEALTH_CHECKS_CONFIG']['max_inflight_bytes'],
+            'ready': True
+        }}})
+
+    def test_health_checks_readiness_saturated(self):
+        class Task(object):
+            def __init__(self, content_length):
+                self.request = type('Request', (), {'content_length': content_length})
+
+        class Channel(object):
+            # newer versions of Waitress queue connections, with requests waiting to be handled
+            def __init__(self, *content_lengths):
+                self.request = None
+                self.requests = [type('Request', (), {'content_length': length}) for length in content_lengths]
+
+        class TaskDispatcher(object):
+            threads = {0, 1, 2, 3}
+            queue = [Task(100), Task(None), Channel(20, 30)]
+
+        health_checks = self.app.extensions['health_checks']
+        health_checks.max_inflight_bytes = 1000
+        health_checks.max_queue_depth = 1
+
+        readiness = health_checks.readiness(TaskDispatcher())
+        self.assertFalse(readiness['ready'])
+        self.assertEqual(readiness['checks']['busy_threads'], {'value': 0, 'limit': 3, 'ready': True})
+        self.assertEqual(readiness['checks']['queue_depth'], {'value': 3, 'limit': 1, 'ready': False})
+        self.assertEqual(readiness['checks']['inflight_bytes'], {'value': 150, 'limit': 1000, 'ready': True})
+
+        # requests being handled by the application are counted until it responds
+        health_checks.inflight_requests = 3
+        health_checks.inflight_bytes = 1001
+        health_checks.max_queue_depth = None
+        readiness = health_checks.readiness(TaskDispatcher())
+        self.assertEqual(readiness['checks']['busy_threads'], {'value': 3, 'limit': 3, 'ready': False})
+        self.assertFalse(readiness['checks']['inflight_bytes']['ready'])
+        self.assertTrue(readiness['checks']['queue_depth']['ready'])
+
+        response = self.client.get('/meta/health/ready')
+        self.assertEqual(response.status_code, HTTPStatus.SERVICE_UNAVAILABLE)
+        self.assertFalse(response.get_json()['checks']['inflight_bytes']['ready'])
+
+    def test_health_checks_inflight_requests(self):
+        health_checks = self.app.extensions['health_checks']
+        inflight = []
+
+        @self.app.route('/test/inflight', methods=['post'])
+        def inflight_request():
+            inflight.append((health_checks.inflight_requests, health_checks.inflight_bytes))
+            return '', HTTPStatus.NO_CONTENT
+
+        self.client.post('/test/inflight', data=b'x' * 100)
+        self.assertEqual(inflight, [(1, 100)])
+        self.assertEqual((health_checks.inflight_requests, health_checks.inflight_bytes), (0, 0))
+
+    def test_admission_control_refused(self):
+        admission_control = self.app.extensions['admission_control']
+        admission_control.max_uploads = 1
+        # an upload is being handled
+        admission_control.inflight_uploads = 1
+
+        response = self.client.post('/upload-single', data=b'x' * 100)
+        self.assertEqual(response.status_code, HTTPStatus.SERVICE_UNAVAILABLE)
+        # without any uploads completed recently, clients are asked to wait for the maximum time
+        self.assertEqual(response.headers['Retry-After'], str(admission_control.max_retry_after))
+        self.assertEqual(response.headers['Cache-Control'], 'no-store')
+        self.assertNotIn('Access-Control-Allow-Origin', response.headers)
+        error = response.get_json()['errors'][0]
+        self.assertEqual(error['status'], 503)
+        self.assertEqual(error['title'], 'Server is at capacity for uploads')
+        self.assertEqual(error['meta'], {
+            'retry_after': admission_control.max_retry_after,
+            'retry_after_units': 'seconds'
+        })
+        UUID(error['id'])
+        self.assertEqual(admission_control.refused_uploads, 1)
+        self.assertEqual((admission_control.inflight_uploads, admission_control.inflight_bytes), (1, 0))
+
+        # allowed origins can read the error
+        response = self.client.post('/upload-single', headers={'Origin': 'http://localhost:9000'})
+        self.assertEqual(response.status_code, HTTPStatus.SERVICE_UNAVAILABLE)
+        self.assertEqual(response.headers['Access-Control-Allow-Origin'], 'http://localhost:9000')
+        self.assertEqual(response.headers['Access-Control-Expose-Headers'], 'Retry-After')
+
+        # other requests, and meta routes, are not refused
+        self.assertEqual(self.client.get('/').status_code, HTTPStatus.OK)
+        self.assertEqual(self.client.options('/upload-single').status_code, HTTPStatus.OK)
+        self.assertEqual(self.client.post('/meta/health/canary').status_code, HTTPStatus.METHOD_NOT_ALLOWED)
+
+    def test_admission_control_inflight_uploads(self):
+        admission_control = self.app.extensions['admission_control']
+        inflight = []
+
+        @self.app.route('/test/inflight', methods=['post'])
+        def inflight_upload():
+            inflight.append((admission_control.inflight_uploads, admission_control.inflight_bytes))
+            return '', HTTPStatus.NO_CONTENT
+
+        # an upload larger than the in-flight bytes limit is accepted when no other uploads are being handled
+        admission_control.max_inflight_bytes = 10
+        self.client.post('/test/inflight', data=b'x' * 100)
+        self.assertEqual(inflight, [(1, 100)])
+        self.assertEqual((admission_control.inflight_uploads, admission_control.inflight_bytes), (0, 0))
+        self.assertEqual(admission_control.drain_rate(), (1 / admission_control.window, 100 / admission_control.window))
+
+    def test_admission_control_retry_after(self):
+        admission_control = self.app.extensions['admission_control']
+        admission_control.max_uploads = 2
+        admission_control.max_inflight_bytes = 1000
+        admission_control.inflight_uploads = 1
+        admission_control.inflight_bytes = 800
+
+        # 20 uploads (2000 bytes) completed over a 10 second window, i.e. 2 uploads (200 bytes) per second
+        admission_control._drained = [(int(time.monotonic()), 20, 2000)] + [(0, 0, 0)] * 9
+        self.assertIsNone(admission_control._admit(200, 0))
+        # 300 bytes more than allowed (including queued requests), 1.5 seconds at 200 bytes per second
+        self.assertEqual(admission_control._admit(200, 300), 2)
+        admission_control.inflight_uploads = 2
+        # 1 upload more than allowed, 0.5 seconds at 2 uploads per second, rounded up
+        self.assertEqual(admission_control._admit(0, 0), 1)
+        # at most the maximum wait is given
+        admission_control.inflight_bytes = 1000000
+        self.assertEqual(admission_control._admit(0, 0), admission_control.max_retry_after)
+
+        # completed uploads older than the window are not counted
+        admission_control._drained = [(int(time.monotonic()) - admission_control.window, 20, 2000)] + [(0, 0, 0)] * 9
+        self.assertEqual(admission_control.drain_rate(), (0, 0))
+
+    def test_admission_control_disabled(self):
+        with patch.object(config['testing'], 'APP_ENABLE_ADMISSION_CONTROL', False):
+            app = create_app('testing')
+        self.assertNotIn('admission_control', app.extensions)
+
+    def test_rate_limit(self):
+        rate_limit = self.app.extensions['rate_limit']
+        rate_limit.budgets = [('/upload-', (0.1, 2))]
+        rate_limit.trusted_proxies = 1
+        headers = {'X-Forwarded-For': '192.0.2.1'}
+
+        for _ in range(2):
+            response = self.client.post('/upload-single', headers=headers)
+            self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+        response = self.client.post('/upload-multiple', headers={**headers, 'Origin': 'http://localhost:9000'})
+        self.assertEqual(response.status_code, HTTPStatus.TOO_MANY_REQUESTS)
+        # a token is added every 10 seconds
+        self.assertEqual(response.headers['Retry-After'], '10')
+        self.assertEqual(response.headers['Cache-Control'], 'no-store')
+        self.assertEqual(response.headers['Access-Control-Allow-Origin'], 'http://localhost:9000')
+        self.assertEqual(response.headers['Access-Control-Expose-Headers'], 'Retry-After')
+        self.assertIn('X-Request-ID', response.headers)
+        error = response.get_json()['errors'][0]
+        self.assertEqual(error['status'], 429)
+        self.assertEqual(error['title'], 'Too many requests')
+        self.assertEqual(error['meta'], {'retry_after': 10, 'retry_after_units': 'seconds'})
+        UUID(error['id'])
+
+        # other clients, routes without a budget, and preflight requests are not limited
+        response = self.client.post('/upload-single', headers={'X-Forwarded-For': '192.0.2.2'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(self.client.get('/', headers=headers).status_code, HTTPStatus.OK)
+        self.assertEqual(self.client.options('/upload-single', headers=headers).status_code, HTTPStatus.OK)
+
+    def test_rate_limit_exempt_paths(self):
+        rate_limit = self.app.extensions['rate_limit']
+        rate_limit.budgets = [('/meta/', (0.1, 1))]
+
+        for _ in range(3):
+            self.assertEqual(self.client.get('/meta/health/canary').status_code, HTTPStatus.NO_CONTENT)
+        self.assertEqual(self.client.get('/meta/metrics').status_code, HTTPStatus.OK)
+        self.assertEqual(self.client.get('/meta/metrics').status_code, HTTPStatus.TOO_MANY_REQUESTS)
+
+    def test_rate_limit_keys(self):
+        environ = {'REMOTE_ADDR': '10.0.0.1', 'HTTP_X_FORWARDED_FOR': '203.0.113.1, 192.0.2.1, 10.0.0.2'}
+        self.assertEqual(client_ip_key(environ), '10.0.0.1')
+        self.assertEqual(client_ip_key(environ, trusted_proxies=1), '10.0.0.2')
+        self.assertEqual(client_ip_key(environ, trusted_proxies=2), '192.0.2.1')
+        # without enough forwarded addresses, the address of the connection is used
+        self.assertEqual(client_ip_key(environ, trusted_proxies=4), '10.0.0.1')
+        self.assertEqual(client_ip_key({}), '')
+        # the Request ID, which clients can choose freely, isn't used
+        self.assertEqual(client_ip_key({**environ, 'HTTP_X_REQUEST_ID': 'client-id'}), '10.0.0.1')
+
+    def test_rate_limit_disabled(self):
+        with patch.object(config['testing'], 'APP_ENABLE_RATE_LIMITS', False):
+            app = create_app('testing')
+        self.assertNotIn('rate_limit', app.extensions)
+
+    def test_shared_token_buckets(self):
+        buckets = SharedTokenBuckets(slots=16, stripes=4)
+
+        with patch('file_upload_endpoint.middleware.rate_limit.time.monotonic', return_value=100.0):
+            self.assertEqual([buckets.take('foo', 2, 3) for _ in range(3)], [0, 0, 0])
+            self.assertEqual(buckets.take('foo', 2, 3), 0.5)
+            # buckets are separate for each key
+            self.assertEqual(buckets.take('bar', 2, 3), 0)
+
+        # tokens are added over time, up to the burst
+        with patch('file_upload_endpoint.middleware.rate_limit.time.monotonic', return_value=101.0):
+            self.assertEqual([buckets.take('foo', 2, 3) for _ in range(3)], [0, 0, 0.5])
+        with patch('file_upload_endpoint.middleware.rate_limit.time.monotonic', return_value=1000.0):
+            self.assertEqual([buckets.take('foo', 2, 3) for _ in range(4)], [0, 0, 0, 0.5])
+
+    def test_shared_token_buckets_forked(self):
+        buckets = SharedTokenBuckets()
+        buckets.take('foo', 0.001, 2)
+
+        # tokens taken by another worker process are seen by this process
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0 if buckets.take('foo', 0.001, 2) == 0 else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        self.assertGreater(buckets.take('foo', 0.001, 2), 0)
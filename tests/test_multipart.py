@@ -0,0 +1,139 @@
+import unittest
+
+from io import BytesIO
+
+from file_upload_endpoint.main.multipart import MultipartError, MultipartLimitError, MultipartPartTooLargeError, \
+    MultipartReader, get_multipart_boundary
+
+
+class MultipartReaderTestCase(unittest.TestCase):
+    boundary = b'----test-boundary'
+
+    def make_body(self, parts: list) -> bytes:
+        body = b'preamble\r\n'
+        for headers, content in parts:
+            body += b'--' + self.boundary + b'\r\n' + headers + b'\r\n\r\n' + content + b'\r\n'
+        return body + b'--' + self.boundary + b'--\r\nepilogue'
+
+    def test_multipart_boundary(self):
+        self.assertEqual(get_multipart_boundary('multipart/form-data; boundary=foo'), b'foo')
+        self.assertEqual(get_multipart_boundary(f"multipart/form-data; boundary={ 'x' * 72 }"), b'x' * 72)
+        self.assertIsNone(get_multipart_boundary(f"multipart/form-data; boundary={ 'x' * 201 }"))
+        self.assertIsNone(get_multipart_boundary('application/x-www-form-urlencoded'))
+        self.assertIsNone(get_multipart_boundary('multipart/form-data'))
+        self.assertIsNone(get_multipart_boundary(None))
+
+    def test_multipart_parts(self):
+        content = b'\r\n--' + self.boundary[:-1] + b'x' * 1000
+        body = self.make_body([
+            (b'Content-Disposition: form-data; name="foo"', b'bar'),
+            (b'Content-Disposition: form-data; name="file"; filename="foo.txt"\r\nContent-Type: text/plain', content),
+            (b'Content-Disposition: form-data; name="empty"; filename=""', b'')
+        ])
+
+        # small chunk sizes ensure delimiters are split across chunks
+        for chunk_size in [1, 7, 64, 64 * 1024]:
+            with self.subTest(chunk_size=chunk_size):
+                reader = MultipartReader(BytesIO(body), self.boundary, chunk_size=chunk_size)
+                parts = []
+                for part in reader:
+                    parts.append((part.name, part.filename, part.content_type, part.read(), part.size))
+
+                self.assertEqual(parts, [
+                    ('foo', None, None, b'bar', 3),
+                    ('file', 'foo.txt', 'text/plain', content, len(content)),
+                    ('empty', '', None, b'', 0)
+                ])
+                self.assertEqual(reader.bytes_read, len(body))
+
+    def test_multipart_parts_drained(self):
+        body = self.make_body([
+            (b'Content-Disposition: form-data; name="file"; filename="foo.txt"', b'x' * 100000),
+            (b'Content-Disposition: form-data; name="foo"', b'bar')
+        ])
+        reader = MultipartReader(BytesIO(body), self.boundary, chunk_size=1024)
+        parts = iter(reader)
+
+        file = next(parts)
+        self.assertEqual(file.read(10), b'x' * 10)
+        self.assertEqual(file.drain(), 100000)
+        self.assertEqual(next(parts).read(), b'bar')
+
+    def test_multipart_parts_drained_limit(self):
+        body = self.make_body([
+            (b'Content-Disposition: form-data; name="file"; filename="foo.txt"', b'x' * 100000),
+            (b'Content-Disposition: form-data; name="foo"', b'bar')
+        ])
+        reader = MultipartReader(BytesIO(body), self.boundary, chunk_size=1024)
+        file = next(iter(reader))
+
+        with self.assertRaises(MultipartPartTooLargeError) as context:
+            file.drain(limit=10000)
+        self.assertEqual(context.exception.limit, 10000)
+        self.assertGreater(context.exception.size, 10000)
+        # reading stops within a chunk of the limit, rather than at the end of the part
+        self.assertLess(reader.bytes_read, 10000 + 2 * 1024)
+
+        reader = MultipartReader(BytesIO(body), self.boundary, chunk_size=1024)
+        self.assertEqual(next(iter(reader)).drain(limit=100000), 100000)
+
+    def test_multipart_parts_readinto(self):
+        content = b'\r\n--' + self.boundary[:-1] + bytes(range(256)) * 40
+        body = self.make_body([
+            (b'Content-Disposition: form-data; name="file"; filename="foo.txt"', content),
+            (b'Content-Disposition: form-data; name="foo"', b'bar')
+        ])
+
+        for chunk_size, buffer_size in [(7, 5), (1024, 4096), (4096, 1024)]:
+            with self.subTest(chunk_size=chunk_size, buffer_size=buffer_size):
+                reader = MultipartReader(BytesIO(body), self.boundary, chunk_size=chunk_size)
+                parts = iter(reader)
+                file = next(parts)
+
+                buffer = bytearray(buffer_size)
+                received = bytearray()
+                while True:
+                    size = file.readinto(buffer)
+                    if not size:
+                        break
+                    self.assertLessEqual(size, buffer_size)
+                    received += buffer[:size]
+
+                self.assertEqual(bytes(received), content)
+                self.assertEqual(file.size, len(content))
+                self.assertEqual(next(parts).read(), b'bar')
+
+    def test_multipart_limits(self):
+        file_headers = b'Content-Disposition: form-data; name="file"; filename="foo.txt"'
+        field_headers = b'Content-Disposition: form-data; name="foo"'
+
+        for limits, parts, expected_limit in [
+            ({'max_parts': 2}, [(field_headers, b'bar')] * 3, 'parts'),
+            ({'max_part_header_size': 100}, [(field_headers + b'\r\nX-Foo: ' + b'x' * 99, b'bar')], 'part_header_size'),
+            ({'max_part_header_size': 100}, [(field_headers + b'\r\nX-Foo: x' * 20, b'bar')], 'part_header_size'),
+            ({'max_field_size': 100}, [(field_headers, b'x' * 101)], 'field_size'),
+            ({'max_filename_length': 6}, [(file_headers, b'bar')], 'filename_length')
+        ]:
+            with self.subTest(limits=limits):
+                reader = MultipartReader(BytesIO(self.make_body(parts)), self.boundary, chunk_size=64, **limits)
+                with self.assertRaises(MultipartLimitError) as context:
+                    for part in reader:
+                        part.drain()
+                self.assertEqual(context.exception.limit, expected_limit)
+                self.assertEqual(context.exception.maximum, list(limits.values())[0])
+
+        # parts within limits are accepted, with the field size limit not applying to files
+        limits = {'max_parts': 2, 'max_part_header_size': 100, 'max_field_size': 3, 'max_filename_length': 7}
+        body = self.make_body([(field_headers, b'bar'), (file_headers, b'x' * 1000)])
+        reader = MultipartReader(BytesIO(body), self.boundary, chunk_size=64, **limits)
+        self.assertEqual([part.drain() for part in reader], [3, 1000])
+        self.assertEqual(reader.parts_count, 2)
+
+    def test_multipart_truncated(self):
+        body = self.make_body([(b'Content-Disposition: form-data; name="foo"', b'bar')])
+        for length in [0, 20, len(body) - 30]:
+            with self.subTest(length=length):
+                reader = MultipartReader(BytesIO(body[:length]), self.boundary)
+                with self.assertRaises(MultipartError):
+                    for part in reader:
+                        part.drain()
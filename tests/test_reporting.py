@@ -0,0 +1,82 @@
+import subprocess
+import sys
+import unittest
+
+from unittest import mock
+
+from file_upload_endpoint import create_app
+from file_upload_endpoint.reporting import HandledErrorReporter, report_handled_error
+
+
+class HandledErrorReporterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.reporter = HandledErrorReporter(self.app, queue_size=10, sample_rates={'sampled': 0})
+
+        # reports are flushed manually, rather than by the background worker, to give predictable results
+        worker_patcher = mock.patch.object(self.reporter, '_start_worker')
+        worker_patcher.start()
+        self.addCleanup(worker_patcher.stop)
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_handled_errors_aggregated(self):
+        with mock.patch('sentry_sdk.capture_message') as capture_message:
+            for _ in range(5):
+                report_handled_error('no_file', 'foo')
+            report_handled_error('no_file', 'bar')
+            capture_message.assert_not_called()
+
+            self.reporter.flush()
+            self.assertEqual(sorted(call.args[0] for call in capture_message.call_args_list), ['bar', 'foo'])
+
+    def test_handled_errors_grouped_by_template(self):
+        message = 'Request content length, [%s], is too great'
+        scope = mock.MagicMock()
+        with mock.patch('sentry_sdk.capture_message') as capture_message, \
+                mock.patch('sentry_sdk.new_scope') as new_scope, \
+                mock.patch('file_upload_endpoint.reporting.MAX_REPORTED_ARGS', 5):
+            new_scope.return_value.__enter__.return_value = scope
+            for size in range(1, 9):
+                report_handled_error('too_large', message, size)
+
+            self.reporter.flush()
+            capture_message.assert_called_once_with(message)
+            self.assertEqual(scope.fingerprint, ['handled-error', 'too_large', message])
+            extras = {call.args[0]: call.args[1] for call in scope.set_extra.call_args_list}
+            self.assertEqual(extras['count'], 8)
+            self.assertEqual(extras['args'], [[1], [2], [3], [4], [5]])
+
+    def test_handled_errors_sampled(self):
+        with mock.patch('sentry_sdk.capture_message') as capture_message:
+            report_handled_error('sampled', 'foo')
+            self.reporter.flush()
+            capture_message.assert_not_called()
+
+    def test_handled_errors_dropped(self):
+        for _ in range(15):
+            report_handled_error('no_file', 'foo')
+        self.assertEqual(self.reporter.dropped, 5)
+
+    def test_handled_errors_flushed_at_exit(self):
+        # a new interpreter is needed to exit, where reports from the last window are sent before Sentry is closed
+        script = (
+            "from sentry_sdk.transport import Transport\n"
+            "from config import config\n"
+            "from file_upload_endpoint import create_app\n"
+            "from file_upload_endpoint.reporting import report_handled_error\n"
+            "class PrintTransport(Transport):\n"
+            "    def capture_envelope(self, envelope):\n"
+            "        if envelope.get_event() is not None:\n"
+            "            print(envelope.get_event()['message'], flush=True)\n"
+            "config['testing'].APP_ENABLE_SENTRY = True\n"
+            "config['testing'].SENTRY_CONFIG = {'dsn': 'https://key@sentry.invalid/1', 'transport': PrintTransport}\n"
+            "app = create_app('testing')\n"
+            "with app.app_context():\n"
+            "    report_handled_error('no_file', 'foo')\n"
+        )
+        output = subprocess.check_output([sys.executable, '-c', script], stderr=subprocess.DEVNULL)  # nosec
+        self.assertEqual(output.decode().split(), ['foo'])
@@ -0,0 +1,250 @@
+import os
+import unittest
+import zlib
+
+from http import HTTPStatus
+from unittest.mock import patch
+
+from config import config
+from file_upload_endpoint import create_app
+from file_upload_endpoint.resumable.store import MemoryUploadStore, SharedUploadStore
+
+
+class ResumableUploadsTestCase(unittest.TestCase):
+    store = 'memory'
+
+    def setUp(self):
+        resumable_config = {**config['testing'].RESUMABLE_UPLOADS_CONFIG, 'store': self.store}
+        with patch.object(config['testing'], 'RESUMABLE_UPLOADS_CONFIG', resumable_config):
+            self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def create_upload(self, length: int, headers: dict = None) -> str:
+        response = self.client.post('/uploads', headers={'Upload-Length': str(length), **(headers or {})})
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertEqual(response.headers['Upload-Offset'], '0')
+        return response.headers['Location']
+
+    def send_chunk(self, location: str, offset: int, chunk: bytes):
+        return self.client.patch(location, data=chunk, headers={
+            'Content-Type': 'application/offset+octet-stream',
+            'Upload-Offset': str(offset)
+        })
+
+    def test_resumable_upload(self):
+        content = os.urandom(100000)
+        location = self.create_upload(len(content), headers={'Upload-Checksum-Algorithm': 'crc32'})
+
+        for offset in range(0, len(content), 30000):
+            response = self.send_chunk(location, offset, content[offset:offset + 30000])
+            self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+            self.assertEqual(int(response.headers['Upload-Offset']), min(offset + 30000, len(content)))
+
+            response = self.client.head(location)
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            self.assertEqual(int(response.headers['Upload-Offset']), min(offset + 30000, len(content)))
+            self.assertEqual(int(response.headers['Upload-Length']), len(content))
+            self.assertEqual(response.headers['Cache-Control'], 'no-store')
+
+        response = self.client.post(f"{ location }/finalize")
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        self.assertEqual(response.headers['Upload-Checksum'], f"crc32 { zlib.crc32(content):08x}")
+
+        # finalised uploads are removed
+        self.assertEqual(self.client.head(location).status_code, HTTPStatus.NOT_FOUND)
+
+    def test_resumable_upload_no_checksum(self):
+        location = self.create_upload(3)
+        response = self.send_chunk(location, 0, b'foo')
+        self.assertNotIn('Upload-Checksum', response.headers)
+        self.assertEqual(self.client.post(f"{ location }/finalize").status_code, HTTPStatus.NO_CONTENT)
+
+    def test_resumable_upload_empty(self):
+        location = self.create_upload(0)
+        self.assertEqual(self.client.post(f"{ location }/finalize").status_code, HTTPStatus.NO_CONTENT)
+
+    def test_resumable_upload_invalid_headers(self):
+        for headers, header in [
+            ({}, 'Upload-Length'),
+            ({'Upload-Length': '-1'}, 'Upload-Length'),
+            ({'Upload-Length': '10', 'Upload-Checksum-Algorithm': 'sha1'}, 'Upload-Checksum-Algorithm')
+        ]:
+            with self.subTest(headers=headers):
+                response = self.client.post('/uploads', headers=headers)
+                self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+                self.assertEqual(
+                    response.get_json()['errors'][0]['title'],
+                    f"[{ header }] header missing or invalid in request"
+                )
+
+        location = self.create_upload(10)
+        response = self.client.patch(location, data=b'foo', headers={'Upload-Offset': '0'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        response = self.client.patch(location, data=b'foo', headers={
+            'Content-Type': 'application/offset+octet-stream'
+        })
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_resumable_upload_too_large(self):
+        response = self.client.post('/uploads', headers={
+            'Upload-Length': str(self.app.config['RESUMABLE_UPLOADS_CONFIG']['max_length'] + 1)
+        })
+        self.assertEqual(response.status_code, HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+
+        location = self.create_upload(10)
+        self.send_chunk(location, 0, b'x' * 8)
+        response = self.send_chunk(location, 8, b'x' * 3)
+        self.assertEqual(response.status_code, HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(response.get_json()['errors'][0]['meta']['maximum_content_length_allowed'], 2)
+        self.assertEqual(self.client.head(location).headers['Upload-Offset'], '8')
+
+    def test_resumable_upload_offset_mismatch(self):
+        location = self.create_upload(10)
+        self.send_chunk(location, 0, b'x' * 4)
+
+        # e.g. a chunk sent again after a response was lost
+        response = self.send_chunk(location, 0, b'x' * 4)
+        self.assertEqual(response.status_code, HTTPStatus.CONFLICT)
+        self.assertEqual(response.get_json()['errors'][0]['meta'], {'upload_offset': 4, 'request_offset': 0})
+
+    def test_resumable_upload_incomplete(self):
+        location = self.create_upload(10)
+        self.send_chunk(location, 0, b'x' * 4)
+
+        response = self.client.post(f"{ location }/finalize")
+        self.assertEqual(response.status_code, HTTPStatus.CONFLICT)
+        self.assertEqual(response.get_json()['errors'][0]['meta'], {'upload_offset': 4, 'upload_length': 10})
+
+    def test_resumable_upload_not_found(self):
+        for path in ['/uploads/foo', f"/uploads/{ 'a' * 32 }"]:
+            with self.subTest(path=path):
+                self.assertEqual(self.client.head(path).status_code, HTTPStatus.NOT_FOUND)
+                self.assertEqual(self.send_chunk(path, 0, b'foo').status_code, HTTPStatus.NOT_FOUND)
+                self.assertEqual(self.client.post(f"{ path }/finalize").status_code, HTTPStatus.NOT_FOUND)
+                self.assertEqual(self.client.delete(path).status_code, HTTPStatus.NOT_FOUND)
+
+    def test_resumable_upload_delete(self):
+        location = self.create_upload(10)
+        self.assertEqual(self.client.delete(location).status_code, HTTPStatus.NO_CONTENT)
+        self.assertEqual(self.client.head(location).status_code, HTTPStatus.NOT_FOUND)
+
+    def test_resumable_upload_too_many_uploads(self):
+        resumable_config = {**config['testing'].RESUMABLE_UPLOADS_CONFIG, 'store': self.store, 'max_uploads': 1}
+        with patch.object(config['testing'], 'RESUMABLE_UPLOADS_CONFIG', resumable_config):
+            client = create_app('testing').test_client()
+
+        self.assertEqual(client.post('/uploads', headers={'Upload-Length': '10'}).status_code, HTTPStatus.CREATED)
+        response = client.post('/uploads', headers={'Upload-Length': '10'})
+        self.assertEqual(response.status_code, HTTPStatus.SERVICE_UNAVAILABLE)
+        self.assertEqual(response.get_json()['errors'][0]['title'], 'Too many uploads in progress')
+
+    def test_resumable_upload_script_name(self):
+        response = self.client.post('/uploads', headers={'Upload-Length': '10'}, base_url='http://localhost/foo')
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertTrue(response.headers['Location'].startswith('/foo/uploads/'))
+
+    def test_resumable_upload_disabled(self):
+        with patch.object(config['testing'], 'APP_ENABLE_RESUMABLE_UPLOADS', False):
+            app = create_app('testing')
+        self.assertNotIn('resumable_uploads', app.extensions)
+        self.assertEqual(app.test_client().post('/uploads').status_code, HTTPStatus.NOT_FOUND)
+
+
+class SharedResumableUploadsTestCase(ResumableUploadsTestCase):
+    store = 'shared'
+
+
+class UploadStoreTestCase(unittest.TestCase):
+    def common_store(self, store):
+        upload_id = store.create(100, checksum=True)
+        self.assertEqual(store.get(upload_id).offset, 0)
+        self.assertEqual(store.get(upload_id).crc32, 0)
+
+        self.assertTrue(store.advance(upload_id, 0, 10, 123))
+        # only one of two concurrent requests continuing from the same offset is recorded
+        self.assertFalse(store.advance(upload_id, 0, 10, 123))
+        state = store.get(upload_id)
+        self.assertEqual((state.length, state.offset, state.crc32, state.complete), (100, 10, 123, False))
+
+        self.assertTrue(store.delete(upload_id))
+        self.assertFalse(store.delete(upload_id))
+        self.assertIsNone(store.get(upload_id))
+
+    def common_store_bounded(self, store):
+        upload_ids = [store.create(10) for _ in range(4)]
+        self.assertNotIn(None, upload_ids)
+        self.assertEqual(len(set(upload_ids)), 4)
+        # the store is full
+        self.assertIsNone(store.create(10))
+
+        # deleted uploads free space for new uploads, without affecting other uploads
+        store.delete(upload_ids[0])
+        upload_id = store.create(10)
+        self.assertIsNotNone(upload_id)
+        for upload_id in upload_ids[1:] + [upload_id]:
+            self.assertIsNotNone(store.get(upload_id))
+
+    def common_store_expiry(self, store):
+        upload_id = store.create(10)
+        self.assertIsNone(store.get(upload_id))
+        self.assertFalse(store.advance(upload_id, 0, 5))
+
+        # expired uploads free space for new uploads
+        self.assertIsNotNone(store.create(10))
+
+    def test_memory_store(self):
+        self.common_store(MemoryUploadStore())
+
+    def test_memory_store_bounded(self):
+        self.common_store_bounded(MemoryUploadStore(max_uploads=4))
+
+    def test_memory_store_expiry(self):
+        self.common_store_expiry(MemoryUploadStore(max_uploads=1, ttl=0))
+
+    def test_shared_store(self):
+        self.common_store(SharedUploadStore())
+
+    def test_shared_store_bounded(self):
+        self.common_store_bounded(SharedUploadStore(max_uploads=4))
+
+    def test_shared_store_expiry(self):
+        self.common_store_expiry(SharedUploadStore(max_uploads=1, ttl=0))
+
+    def test_shared_store_churn(self):
+        store = SharedUploadStore(max_uploads=8)
+        for _ in range(100):
+            upload_ids = [store.create(10) for _ in range(6)]
+            for upload_id in upload_ids:
+                self.assertIsNotNone(store.get(upload_id))
+            for upload_id in upload_ids:
+                self.assertTrue(store.delete(upload_id))
+
+        # deleted uploads don't leave markers once no other uploads follow them, so lookups stop at an empty slot
+        self.assertEqual([store._read(slot)[4] for slot in range(8)], [0] * 8)
+
+        upload_ids = [store.create(10) for _ in range(4)]
+        store.ttl = 0
+        expired_ids = [store.create(10) for _ in range(4)]
+        for upload_id in expired_ids:
+            self.assertIsNone(store.get(upload_id))
+        for upload_id in upload_ids:
+            self.assertIsNotNone(store.get(upload_id))
+            self.assertTrue(store.delete(upload_id))
+        self.assertEqual([store._read(slot)[4] for slot in range(8)], [0] * 8)
+
+    def test_shared_store_forked(self):
+        store = SharedUploadStore()
+        upload_id = store.create(10)
+
+        # progress recorded by another worker process is seen by this process
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0 if store.advance(upload_id, 0, 5) else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        self.assertEqual(store.get(upload_id).offset, 5)
@@ -0,0 +1,176 @@
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import unittest
+
+from http import HTTPStatus
+from http.client import HTTPConnection
+from unittest.mock import patch
+
+from file_upload_endpoint import create_app
+from file_upload_endpoint.benchmarks.load import get_free_port, start_server
+from file_upload_endpoint.serving import create_server
+
+
+class ServingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.server = create_server(self.app, host='127.0.0.1', port=0)
+        self.server_thread = threading.Thread(target=self.server.run, daemon=True)
+        self.server_thread.start()
+
+    def tearDown(self):
+        # the server is closed from its own thread, so its sockets aren't closed while being polled
+        self.server.trigger.pull_trigger(lambda: self.server.asyncore.close_all(self.server._map))
+        self.server_thread.join(timeout=5)
+        self.server.task_dispatcher.shutdown()
+
+    def send_request(self, path: str, headers: dict, body: bytes = b'') -> bytes:
+        request = f"POST { path } HTTP/1.1\r\nHost: localhost\r\n"
+        for name, value in headers.items():
+            request += f"{ name }: { value }\r\n"
+
+        with socket.create_connection(('127.0.0.1', self.server.effective_port), timeout=5) as connection:
+            connection.sendall(request.encode() + b'\r\n' + body)
+            response = b''
+            while True:
+                data = connection.recv(4096)
+                if not data:
+                    return response
+                response += data
+
+    def common_expect_continue_rejected(self, path: str, content_length: int, maximum_content_length: int):
+        response = self.send_request(path, {
+            'Content-Type': 'multipart/form-data; boundary=foo',
+            'Content-Length': content_length,
+            'Expect': '100-continue'
+        })
+        status_line, _, body = response.partition(b'\r\n')
+        body = json.loads(body.partition(b'\r\n\r\n')[2])
+
+        # the request should be rejected without the client being invited to send the request body
+        self.assertEqual(status_line, b'HTTP/1.1 413 Request Entity Too Large')
+        self.assertIn(b'\r\nx-request-id: ', response.lower())
+        self.assertEqual(body['errors'][0]['status'], HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(body['errors'][0]['meta']['maximum_content_length_allowed'], maximum_content_length)
+        self.assertEqual(body['errors'][0]['meta']['request_content_length'], content_length)
+
+    def test_expect_continue_maximum_content_length(self):
+        self.common_expect_continue_rejected(
+            '/upload-single',
+            1024 * 1024 * 1024,
+            self.app.config['MAX_CONTENT_LENGTH']
+        )
+
+    def test_expect_continue_route_maximum_content_length(self):
+        self.common_expect_continue_rejected(
+            '/upload-single-restricted-size',
+            1024 * 1024,
+            self.app.config['UPLOAD_ROUTE_MAX_CONTENT_LENGTHS']['/upload-single-restricted-size']
+        )
+
+    def test_chunked_route_maximum_content_length(self):
+        body = b'--foo\r\nContent-Disposition: form-data; name="file"; filename="foo.txt"\r\n\r\n' + b'x' * 50000
+        chunked_body = f"{ len(body):x}\r\n".encode() + body + b'\r\n0\r\n\r\n'
+        response = self.send_request('/upload-single-restricted-size', {
+            'Content-Type': 'multipart/form-data; boundary=foo',
+            'Transfer-Encoding': 'chunked',
+            'Connection': 'close'
+        }, chunked_body)
+
+        self.assertTrue(response.startswith(b'HTTP/1.1 413'))
+        self.assertIn(b'Request content length is too great', response)
+
+    def test_server_timing_includes_receive(self):
+        body = b'--foo\r\nContent-Disposition: form-data; name="file"; filename="foo.txt"\r\n\r\nfoo\r\n--foo--\r\n'
+        request = (
+            f"POST /upload-single HTTP/1.1\r\nHost: localhost\r\nContent-Type: multipart/form-data; boundary=foo\r\n"
+            f"Content-Length: { len(body) }\r\nConnection: close\r\n\r\n"
+        ).encode()
+
+        with socket.create_connection(('127.0.0.1', self.server.effective_port), timeout=5) as connection:
+            connection.sendall(request + body[:10])
+            # a slow client, the server receives the request body before calling the application
+            time.sleep(0.2)
+            connection.sendall(body[10:])
+            response = b''
+            while True:
+                data = connection.recv(4096)
+                if not data:
+                    break
+                response += data
+
+        self.assertTrue(response.startswith(b'HTTP/1.1 204'))
+        header = [line for line in response.split(b'\r\n') if line.startswith(b'Server-Timing: ')][0].decode()
+        read_duration = float(header.split('read;dur=', 1)[1].split(';', 1)[0])
+        self.assertGreaterEqual(read_duration, 200)
+
+    def test_readiness_busy_threads(self):
+        release = threading.Event()
+
+        @self.app.route('/test/blocking')
+        def blocking():
+            release.wait(timeout=5)
+            return '', HTTPStatus.NO_CONTENT
+
+        server = create_server(self.app, host='127.0.0.1', port=0, threads=2)
+        server_thread = threading.Thread(target=server.run, daemon=True)
+        server_thread.start()
+        try:
+            connection = HTTPConnection('127.0.0.1', server.effective_port, timeout=5)
+            connection.request('GET', '/meta/health/ready')
+            response = connection.getresponse()
+            readiness = json.loads(response.read())
+            self.assertEqual(response.status, HTTPStatus.OK)
+            self.assertEqual(readiness['checks']['busy_threads'], {'value': 0, 'limit': 1, 'ready': True})
+            self.assertEqual(readiness['checks']['queue_depth']['value'], 0)
+
+            # a request holding the only other thread
+            blocked_connection = HTTPConnection('127.0.0.1', server.effective_port, timeout=5)
+            blocked_connection.request('GET', '/test/blocking')
+            while self.app.extensions['health_checks'].inflight_requests < 1:
+                time.sleep(0.01)
+
+            connection.request('GET', '/meta/health/ready')
+            response = connection.getresponse()
+            readiness = json.loads(response.read())
+            self.assertEqual(response.status, HTTPStatus.SERVICE_UNAVAILABLE)
+            self.assertEqual(readiness['checks']['busy_threads'], {'value': 1, 'limit': 1, 'ready': False})
+
+            release.set()
+            self.assertEqual(blocked_connection.getresponse().status, HTTPStatus.NO_CONTENT)
+            connection.close()
+            blocked_connection.close()
+        finally:
+            release.set()
+            server.trigger.pull_trigger(lambda: server.asyncore.close_all(server._map))
+            server_thread.join(timeout=5)
+            server.task_dispatcher.shutdown()
+
+
+class WorkerPoolTestCase(unittest.TestCase):
+    def common_workers(self, reuse_port: str):
+        port = get_free_port('127.0.0.1')
+        command = [sys.executable, '-m', 'flask', 'serve', '--host', '127.0.0.1', '--port', str(port), '--workers', '2']
+        with patch.dict(os.environ, {'APP_SERVER_REUSE_PORT': reuse_port}):
+            server = start_server('127.0.0.1', port, command)
+
+        try:
+            for _ in range(10):
+                connection = HTTPConnection('127.0.0.1', port, timeout=5)
+                connection.request('GET', '/meta/health/canary')
+                self.assertEqual(connection.getresponse().status, HTTPStatus.NO_CONTENT)
+                connection.close()
+        finally:
+            server.terminate()
+            # workers are stopped with the parent process
+            self.assertEqual(server.wait(timeout=10), 0)
+
+    def test_workers_reuse_port(self):
+        self.common_workers('true')
+
+    def test_workers_shared_socket(self):
+        self.common_workers('false')
@@ -0,0 +1,120 @@
+import io
+import json
+import time
+import unittest
+
+from http import HTTPStatus
+from unittest.mock import patch
+
+from config import config
+from file_upload_endpoint import create_app
+from file_upload_endpoint.logs import QueuedLogging
+from file_upload_endpoint.timings import RECEIVE_ENVIRON_KEY
+from tests.test_logs import RecordingHandler
+
+
+class SlowStream(io.BytesIO):
+    def __init__(self, content: bytes, delay: float):
+        super().__init__(content)
+        self.delay = delay
+
+    def read(self, *args) -> bytes:
+        time.sleep(self.delay)
+        return super().read(*args)
+
+    def readinto(self, buffer) -> int:
+        time.sleep(self.delay)
+        return super().readinto(buffer)
+
+
+def parse_server_timing(header: str) -> dict:
+    metrics = {}
+    for metric in header.split(', '):
+        name, *params = metric.split(';')
+        metrics[name] = dict(param.split('=', 1) for param in params)
+    return metrics
+
+
+class ServerTimingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+
+        self.body = b'--foo\r\nContent-Disposition: form-data; name="file"; filename="foo.txt"\r\n\r\n' + \
+            b'x' * 1024 + b'\r\n--foo--\r\n'
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def post_upload(self, stream: io.BytesIO, **kwargs):
+        return self.client.post(
+            '/upload-single',
+            input_stream=stream,
+            content_type='multipart/form-data; boundary=foo',
+            content_length=len(self.body),
+            **kwargs
+        )
+
+    def test_server_timing_header(self):
+        response = self.post_upload(io.BytesIO(self.body))
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+
+        metrics = parse_server_timing(response.headers['Server-Timing'])
+        self.assertEqual(list(metrics.keys()), ['read', 'parse', 'validate', 'respond', 'total'])
+        self.assertTrue(metrics['read']['desc'].startswith(f"\"{ len(self.body) } bytes at "))
+        for name in ['parse', 'validate', 'respond']:
+            self.assertGreaterEqual(float(metrics[name]['dur']), 0)
+            self.assertLessEqual(float(metrics[name]['dur']), float(metrics['total']['dur']))
+
+    def test_server_timing_slow_read(self):
+        response = self.post_upload(SlowStream(self.body, delay=0.05))
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+
+        # time spent waiting for the request body is counted as reading, not parsing
+        metrics = parse_server_timing(response.headers['Server-Timing'])
+        self.assertGreaterEqual(float(metrics['read']['dur']), 50)
+        self.assertLess(float(metrics['parse']['dur']), 50)
+
+    def test_server_timing_server_receive(self):
+        response = self.post_upload(io.BytesIO(self.body), environ_overrides={
+            RECEIVE_ENVIRON_KEY: (0.5, len(self.body))
+        })
+
+        metrics = parse_server_timing(response.headers['Server-Timing'])
+        self.assertGreaterEqual(float(metrics['read']['dur']), 500)
+        self.assertGreaterEqual(float(metrics['total']['dur']), 500)
+
+    def test_server_timing_validation_error(self):
+        response = self.client.post('/upload-single', content_type='multipart/form-data', data={})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn('validate;dur=', response.headers['Server-Timing'])
+
+    def test_server_timing_logged(self):
+        handler = RecordingHandler()
+        queued_logging = QueuedLogging(self.app, handlers=[handler])
+
+        self.post_upload(io.BytesIO(self.body), headers={'x-request-id': 'foo'})
+        self.client.get('/meta/health/canary')
+
+        queued_logging.stop()
+        entries = [json.loads(entry) for entry in handler.entries]
+        entries = [entry for entry in entries if 'timings' in entry]
+        # only requests with a body are logged
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['level'], 'DEBUG')
+        self.assertEqual(entries[0]['url'], 'http://localhost/upload-single')
+        self.assertTrue(entries[0]['request_id'].startswith('foo,'))
+        self.assertEqual(entries[0]['timings']['bytes_read'], len(self.body))
+        self.assertEqual(
+            sorted(entries[0]['timings'].keys()),
+            ['bytes_per_second', 'bytes_read', 'parse_ms', 'read_ms', 'respond_ms', 'total_ms', 'validate_ms']
+        )
+
+    def test_server_timing_disabled(self):
+        with patch.object(config['testing'], 'APP_ENABLE_SERVER_TIMING', False):
+            app = create_app('testing')
+
+        response = app.test_client().get('/meta/health/canary')
+        self.assertNotIn('Server-Timing', response.headers)
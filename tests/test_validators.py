@@ -0,0 +1,68 @@
+import itertools
+import unittest
+
+from http import HTTPStatus
+
+from cerberus import Validator
+
+from file_upload_endpoint import create_app
+from file_upload_endpoint.meta.validators import FastValidator, compile_validate_function
+
+
+class FastValidatorTestCase(unittest.TestCase):
+    schema = {
+        'string': {'type': 'string', 'required': True, 'allowed': ['foo', 'bar']},
+        'integer': {'type': 'integer', 'min': 1, 'max': 10},
+        'pattern': {'type': 'string', 'regex': '[a-z]+', 'minlength': 2, 'maxlength': 5, 'nullable': True},
+        'mixed': {'type': ['integer', 'string']},
+        'number': {'type': 'number', 'required': True, 'max': 5.5}
+    }
+    values = [None, 'foo', 'baz', 'a', 'abcdefg', 'A1', 0, 5, 11, True, 2.5, 6.0, [1]]
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    @staticmethod
+    def get_errors(validator, schema: dict) -> dict:
+        errors = {}
+        for field in schema.keys():
+            if field in validator.document_error_tree:
+                errors[field] = [(e.rule, e.constraint, e.value) for e in validator.document_error_tree[field]]
+        return errors
+
+    def test_fast_validator_matches_cerberus(self):
+        cerberus_validator = Validator(self.schema)
+        fast_validator = FastValidator(self.schema, compile_validate_function(self.schema))
+
+        for values in itertools.product(self.values, repeat=2):
+            for fields in itertools.permutations(list(self.schema.keys()) + ['unknown'], 2):
+                document = dict(zip(fields, values))
+                with self.subTest(document=document):
+                    self.assertEqual(cerberus_validator.validate(document), fast_validator.validate(document))
+                    self.assertEqual(
+                        self.get_errors(cerberus_validator, self.schema),
+                        self.get_errors(fast_validator, self.schema)
+                    )
+
+    def test_fast_validator_unsupported_rule(self):
+        self.assertIsNone(compile_validate_function({'foo': {'type': 'string', 'coerce': str}}))
+        self.assertIsNone(compile_validate_function({'foo': {'allowed': ['bar']}}))
+
+    def test_fast_validator_logging_level(self):
+        self.app.config['APP_ENABLE_FAST_VALIDATION'] = True
+
+        response = self.client.post('/meta/logging/entries/foo')
+        json_response = response.get_json()
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(json_response['errors'][0]['meta']['allowed_values'], [
+            'debug', 'info', 'warning', 'error', 'critical'
+        ])
+
+        response = self.client.post('/meta/logging/entries/debug')
+        self.assertEqual(response.status_code, HTTPStatus.ACCEPTED)